@@ -1,35 +1,42 @@
 from django.contrib import admin
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Product, PriceHistory
+
+from mini_market.images import pick_variant
+
+from . import moderation, snapshot
+from .cache import bump_version
+from .services import refresh_category_stats
+from .models import Category, PriceCandle, PriceHistory, Product
 
 # ---- Category ----
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ("name",)
-    list_display = ("name",)
+    list_display = ("name", "approved_count", "total_stock", "min_price", "max_price")
+    readonly_fields = ("approved_count", "total_stock", "min_price", "max_price")
     ordering = ("name",)
 
 # ---- Actions ----
 @admin.action(description="Одобрить выбранные товары")
 def approve_products(modeladmin, request, queryset):
-    queryset.update(is_approved=True)
+    # updated_at — по нему changed_since в API отдаёт одобренные товары
+    queryset.update(is_approved=True, updated_at=timezone.now())
+    bump_version()
+    refresh_category_stats(queryset.values_list("category_id", flat=True).distinct())
+    snapshot.rebuild_on_commit()
 
 @admin.action(description="Утвердить и присвоить pending_owner")
 def approve_and_assign(modeladmin, request, queryset):
-    for obj in queryset.select_related("pending_owner"):
-        if obj.pending_owner:
-            obj.created_by = obj.pending_owner
-            obj.pending_owner = None
-            obj.is_approved = True
-            obj.save(update_fields=["created_by", "pending_owner", "is_approved"])
+    n = moderation.approve_pending(queryset.filter(pending_owner__isnull=False))
+    modeladmin.message_user(request, f"Одобрено заявок: {n}.")
 
 @admin.action(description="Отклонить изменения (снять с модерации)")
 def reject_changes(modeladmin, request, queryset):
-    for obj in queryset:
-        obj.pending_owner = None
-        obj.is_approved = False
-        obj.save(update_fields=["pending_owner", "is_approved"])
+    n = moderation.reject_pending(queryset)
+    modeladmin.message_user(request, f"Снято с модерации: {n}.")
 
 # ---- Product ----
 @admin.register(Product)
@@ -45,7 +52,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_select_related = ("category", "created_by", "pending_owner")
     autocomplete_fields = ("category", "created_by", "pending_owner")
     actions = [approve_products, approve_and_assign, reject_changes]
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("created_at", "updated_at", "pending_changes")
 
     fieldsets = (
         (None, {
@@ -56,7 +63,7 @@ class ProductAdmin(admin.ModelAdmin):
             "classes": ("collapse",),
         }),
         ("Модерация", {
-            "fields": ("is_approved", "created_by", "pending_owner"),
+            "fields": ("is_approved", "created_by", "pending_owner", "pending_changes"),
         }),
         ("Служебные поля", {
             "fields": ("min_price", "max_price", "next_change_at", "created_at", "updated_at"),
@@ -66,9 +73,10 @@ class ProductAdmin(admin.ModelAdmin):
 
     def thumb(self, obj):
         if obj.image:
+            variant = pick_variant(obj.image_variants, obj.image.name, 40)
             return format_html(
                 '<img src="{}" style="height:40px;width:40px;object-fit:cover;border-radius:6px;">',
-                obj.image.url,
+                default_storage.url(variant["jpeg"]) if variant else obj.image.url,
             )
         return "—"
     thumb.short_description = "Фото"
@@ -81,3 +89,13 @@ class PriceHistoryAdmin(admin.ModelAdmin):
     date_hierarchy = "changed_at"
     search_fields = ("product__title",)
     list_select_related = ("product",)
+    show_full_result_count = False  # без COUNT(*) по всей таблице при фильтрах
+
+# ---- PriceCandle ----
+@admin.register(PriceCandle)
+class PriceCandleAdmin(admin.ModelAdmin):
+    list_display = ("product", "resolution", "bucket", "open", "high", "low", "close", "changes")
+    list_filter = ("resolution",)
+    date_hierarchy = "bucket"
+    search_fields = ("product__title",)
+    list_select_related = ("product",)
@@ -0,0 +1,213 @@
+"""
+Read-only JSON API каталога: /api/v1/...
+
+- ?ids=1,2,3 — пачка товаров одним запросом;
+- ?fields=id,price,stock — только нужные поля (из БД читаются только их колонки);
+- ?cursor=... — курсорная пагинация по id (ответ содержит next);
+- ?changed_since=ISO — только товары, изменённые с этого момента: updated_at,
+  запись в PriceHistory (тик) или сделка (сток). Клиент передаёт server_time
+  из прошлого ответа и получает дельту вместо всего каталога;
+- ETag по содержимому ответа, повторный запрос с If-None-Match — 304.
+
+Видимость та же, что в каталоге (ProductQuerySet.visible_to).
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Q
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from mini_market.pagination import CursorPaginator, InvalidCursor
+from trade.models import Transaction
+
+from . import cache as catalog_cache, snapshot
+from .models import PriceHistory, Product
+
+API_MAX_IDS = 100
+MAX_ID = 2 ** 63 - 1  # больше BIGINT — БД падает с OverflowError
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 200
+
+# поле ответа → (колонки модели, как достать значение)
+PRODUCT_FIELDS = {
+    "id": (("id",), lambda p: p.id),
+    "slug": (("slug",), lambda p: p.slug),
+    "title": (("title",), lambda p: p.title),
+    "category": (("category__slug",), lambda p: p.category.slug),
+    "price": (("price",), lambda p: p.price),
+    "stock": (("stock",), lambda p: p.stock),
+    "min_price": (("min_price",), lambda p: p.min_price),
+    "max_price": (("max_price",), lambda p: p.max_price),
+    "is_approved": (("is_approved",), lambda p: p.is_approved),
+    "updated_at": (("updated_at",), lambda p: p.updated_at),
+    "url": (("slug",), lambda p: p.get_absolute_url()),
+}
+DEFAULT_FIELDS = ("id", "slug", "title", "category", "price", "stock", "updated_at")
+SNAPSHOT_FIELDS = {"id", "price", "stock"}  # отдаются из снимка цен без запросов к БД
+
+
+class ApiError(Exception):
+    pass
+
+
+def _error(message: str, status: int = 400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _dumps(payload) -> bytes:
+    return json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+def _json_response(request, payload: dict):
+    """JSON с ETag по содержимому (без server_time); совпавший If-None-Match — 304 без тела."""
+    body = _dumps(payload)
+    stable = {k: v for k, v in payload.items() if k != "server_time"}
+    etag = f'"{hashlib.sha256(_dumps(stable)).hexdigest()[:32]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    patch_cache_control(response, private=request.user.is_authenticated, no_cache=True)
+    patch_vary_headers(response, ["Cookie"])
+    return response
+
+
+def _parse_fields(request):
+    raw = request.GET.get("fields")
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(PRODUCT_FIELDS)}")
+    return fields
+
+
+def _parse_ids(request):
+    raw = request.GET.get("ids")
+    if not raw:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(x) for x in raw.split(",") if x.strip()))
+    except ValueError:
+        raise ApiError("ids: ожидаются числа через запятую")
+    if any(not 1 <= i <= MAX_ID for i in ids):
+        raise ApiError(f"ids: допустимы числа от 1 до {MAX_ID}")
+    if len(ids) > API_MAX_IDS:
+        raise ApiError(f"ids: не больше {API_MAX_IDS} за запрос")
+    return ids
+
+
+def _parse_limit(request):
+    try:
+        limit = int(request.GET.get("limit", API_DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("limit: ожидается число")
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def _parse_since(request):
+    raw = request.GET.get("changed_since")
+    if not raw:
+        return None
+    try:
+        moment = parse_datetime(raw.replace(" ", "+"))  # «+» из query string приходит пробелом
+    except ValueError:  # формат верный, но время несуществующее: 2024-13-45T00:00:00
+        moment = None
+    if moment is None:
+        raise ApiError("changed_since: ожидается ISO-время, например server_time из прошлого ответа")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def _changed_since(qs, since):
+    ticks = PriceHistory.objects.filter(product=OuterRef("pk"), changed_at__gte=since)
+    trades = Transaction.objects.filter(product=OuterRef("pk"), created_at__gte=since)
+    return qs.filter(Q(updated_at__gte=since) | Exists(ticks) | Exists(trades))
+
+
+def _serialize(products, fields):
+    getters = [(name, PRODUCT_FIELDS[name][1]) for name in fields]
+    return [{name: get(p) for name, get in getters} for p in products]
+
+
+def _products_queryset(request, fields):
+    columns = {"id"}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    qs = Product.objects.visible_to(request.user)
+    if any(c.startswith("category__") for c in columns):
+        qs = qs.select_related("category")
+    return qs.only(*columns)
+
+
+@require_GET
+def products(request):
+    """Список товаров: ids / category / changed_since / fields / cursor / limit."""
+    server_time = timezone.now()
+    try:
+        fields = _parse_fields(request)
+        ids = _parse_ids(request)
+        since = _parse_since(request)
+        limit = _parse_limit(request)
+    except ApiError as e:
+        return _error(str(e))
+
+    if ids and set(fields) <= SNAPSHOT_FIELDS and since is None and not request.GET.get("category"):
+        # одобренные товары видны всем — если снимок знает их все, БД не нужна
+        snap = snapshot.read(ids)
+        if all(i in snap and snap[i][2] for i in ids):
+            values = {"id": lambda i: i, "price": lambda i: snap[i][0], "stock": lambda i: snap[i][1]}
+            return _json_response(request, {
+                "results": [{name: values[name](i) for name in fields} for i in sorted(ids)],
+                "missing": [],
+                "server_time": server_time,
+            })
+
+    qs = _products_queryset(request, fields)
+    if request.GET.get("category"):
+        qs = qs.filter(category__slug=request.GET["category"])
+    if since is not None:
+        qs = _changed_since(qs, since)
+
+    if ids is not None:
+        rows = list(qs.filter(id__in=ids).order_by("id"))
+        found = {p.id for p in rows}
+        return _json_response(request, {
+            "results": _serialize(rows, fields),
+            "missing": [i for i in ids if i not in found],
+            "server_time": server_time,
+        })
+
+    paginator = CursorPaginator(qs, limit, ("id",))
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        return _error("cursor: неверный курсор")
+    return _json_response(request, {
+        "results": _serialize(page.object_list, fields),
+        "next": page.next_cursor,
+        "server_time": server_time,
+    })
+
+
+@require_GET
+def product_detail(request, slug):
+    try:
+        fields = _parse_fields(request)
+    except ApiError as e:
+        return _error(str(e))
+    product = get_object_or_404(_products_queryset(request, fields), slug=slug)
+    return _json_response(request, _serialize([product], fields)[0])
+
+
+@require_GET
+def categories(request):
+    """Категории со счётчиками (из кэша навигации каталога)."""
+    version = catalog_cache.get_version(catalog_cache.CATEGORIES)
+    return _json_response(request, {"results": catalog_cache.category_nav(version)})
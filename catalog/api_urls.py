@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import api
+
+app_name = "api"
+urlpatterns = [
+    path("products/", api.products, name="products"),
+    path("products/<slug:slug>/", api.product_detail, name="product"),
+    path("categories/", api.categories, name="categories"),
+]
@@ -0,0 +1,71 @@
+"""
+Кэш листинга каталога.
+
+Ключи включают версию каталога (CatalogVersion в БД, общая для всех процессов),
+поэтому инвалидация — это просто bump_version(): старые записи больше не читаются
+и сами истекают по таймауту. Работает с locmem- и file-бэкендами кэша.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Category, CatalogVersion
+
+CATALOG = "catalog"
+CATEGORIES = "categories"  # навигация по категориям со счётчиками
+
+# поля товара, которые видны в листинге: только их изменение сбрасывает кэш
+LISTING_FIELDS = {
+    "title", "slug", "category", "category_id", "price", "image",
+    "is_approved", "created_by", "created_by_id",
+}
+
+
+def get_version(name: str = CATALOG) -> int:
+    return (CatalogVersion.objects
+            .filter(name=name)
+            .values_list("version", flat=True)
+            .first()) or 0
+
+
+def get_versions(*names: str) -> dict:
+    """Несколько версий одним запросом; отсутствующие — 0."""
+    found = dict(CatalogVersion.objects.filter(name__in=names).values_list("name", "version"))
+    return {name: found.get(name, 0) for name in names}
+
+
+def bump_version(name: str = CATALOG) -> None:
+    now = timezone.now()
+    updated = CatalogVersion.objects.filter(name=name).update(version=F("version") + 1, updated_at=now)
+    if not updated:
+        CatalogVersion.objects.get_or_create(name=name, defaults={"version": 1, "updated_at": now})
+
+
+def visibility_class(user) -> str:
+    """Кому что видно: аноним — только одобренное, пользователь — ещё свои черновики, staff — всё."""
+    if not user.is_authenticated:
+        return "anon"
+    if user.is_staff:
+        return "staff"
+    return f"user:{user.pk}"
+
+
+def listing_cache_key(request, version: int) -> str:
+    params = sorted((k, tuple(v)) for k, v in request.GET.lists())
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f"catalog:listing:{version}:{visibility_class(request.user)}:{digest}"
+
+
+def category_nav(version: int) -> list[dict]:
+    """Категории со счётчиками для навигации, из кэша версии CATEGORIES."""
+    key = f"catalog:nav:{version}"
+    nav = cache.get(key)
+    if nav is None:
+        nav = list(Category.objects.values(
+            "slug", "name", "approved_count", "total_stock", "min_price", "max_price"
+        ))
+        cache.set(key, nav, settings.CATALOG_CACHE_TIMEOUT)
+    return nav
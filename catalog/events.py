@@ -0,0 +1,196 @@
+"""
+Живая лента цен и остатков (Server-Sent Events).
+
+Тик и сделки пишут MarketEvent в своей транзакции (outbox) — так событие не
+появится раньше коммита и не потеряется, в каком бы процессе ни случилось.
+В каждом процессе ASGI один EventHub опрашивает таблицу по возрастанию id
+(один запрос на всех подписчиков процесса) и раскладывает события по очередям
+подписчиков с фильтром по товарам/категориям. Переподключившийся клиент
+присылает Last-Event-ID и сначала получает пропущенное из таблицы.
+"""
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MarketEvent
+
+EVENT_FIELDS = ("id", "kind", "product_id", "category_id", "price", "stock")
+HEARTBEAT_SECONDS = 15  # комментарий-пинг, чтобы прокси не закрывали тихое соединение
+BACKFILL_LIMIT = 1000  # больше пропущено — клиенту проще перезагрузить страницу
+QUEUE_SIZE = 1000
+PRUNE_EVERY = 60  # секунд между чистками outbox
+# id выдаются при вставке, а видны после коммита: транзакция с меньшим id может
+# закоммититься позже. Хаб перечитывает последние LATE_WINDOW id и не шлёт дважды.
+LATE_WINDOW = 200
+
+
+# --- запись ---
+
+def publish(kind: str, products, stock=None) -> int:
+    """
+    Кладёт в outbox событие kind по каждому одобренному товару из products
+    (нужны id, category_id, price, stock, is_approved). stock — {id: остаток},
+    если у объектов он ещё не посчитан (F-выражение после сделки).
+    """
+    rows = [
+        MarketEvent(kind=kind, product_id=p.id, category_id=p.category_id, price=p.price,
+                    stock=stock[p.id] if stock is not None else p.stock)
+        for p in products if p.is_approved
+    ]
+    MarketEvent.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def publish_prices(products) -> int:
+    return publish(MarketEvent.PRICE, products)
+
+
+def publish_stock(product, stock: int) -> int:
+    return publish(MarketEvent.STOCK, [product], {product.id: stock})
+
+
+def prune_events(now=None, minutes: int | None = None) -> int:
+    """
+    Удаляет события старше minutes (по умолчанию MARKET_EVENTS_RETENTION_MINUTES).
+    Хаб чистит outbox, только пока есть подписчики, поэтому чистят и планировщик
+    тиков, и команда prune_market_events.
+    """
+    minutes = settings.MARKET_EVENTS_RETENTION_MINUTES if minutes is None else minutes
+    cutoff = (now or timezone.now()) - timedelta(minutes=minutes)
+    deleted, _ = MarketEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+# --- чтение ---
+
+def events_after(last_id: int, product_ids=None, category_ids=None, limit: int = BACKFILL_LIMIT) -> list:
+    qs = MarketEvent.objects.filter(id__gt=last_id)
+    if product_ids or category_ids:
+        qs = qs.filter(_scope_q(product_ids, category_ids))
+    return list(qs.order_by("id").values(*EVENT_FIELDS)[:limit])
+
+
+def _scope_q(product_ids, category_ids):
+    q = Q()
+    if product_ids:
+        q |= Q(product_id__in=product_ids)
+    if category_ids:
+        q |= Q(category_id__in=category_ids)
+    return q
+
+
+def latest_id() -> int:
+    return MarketEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def format_sse(event: dict) -> str:
+    data = {
+        "product": event["product_id"], "category": event["category_id"],
+        "price": str(event["price"]), "stock": event["stock"],
+    }
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(data)}\n\n"
+
+
+def _poll(last_id: int, prune: bool) -> list:
+    # вне цикла запрос/ответ Django сам соединения не закрывает
+    close_old_connections()
+    if prune:
+        prune_events()
+    return events_after(last_id, limit=QUEUE_SIZE)
+
+
+@dataclass(eq=False)
+class Subscription:
+    product_ids: frozenset = frozenset()
+    category_ids: frozenset = frozenset()
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(QUEUE_SIZE))
+    overflow: bool = False
+
+    def matches(self, event: dict) -> bool:
+        if not self.product_ids and not self.category_ids:
+            return True
+        return event["product_id"] in self.product_ids or event["category_id"] in self.category_ids
+
+
+class EventHub:
+    """Один опрос outbox на процесс, раздача по очередям подписчиков."""
+
+    def __init__(self):
+        self.subscribers: set[Subscription] = set()
+        self.last_id = None
+        self._delivered = set()
+        self._floor = 0
+        self._task = None
+        self._loop = None
+
+    async def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # всё, что было до старта, новым подписчикам не шлём (пропущенное — через Last-Event-ID)
+            self.last_id = self._floor = await sync_to_async(latest_id)()
+            self._delivered = set()
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        last_prune = 0.0
+        loop = asyncio.get_running_loop()
+        while self.subscribers:
+            prune = loop.time() - last_prune > PRUNE_EVERY
+            rows = await sync_to_async(_poll)(max(self.last_id - LATE_WINDOW, 0), prune)
+            if prune:
+                last_prune = loop.time()
+            fresh = [e for e in rows if e["id"] not in self._delivered and e["id"] > self._floor]
+            for event in fresh:
+                for sub in list(self.subscribers):
+                    if sub.matches(event):
+                        try:
+                            sub.queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            sub.overflow = True  # клиент не успевает — пусть переподключится
+            if rows:
+                self.last_id = max(self.last_id, rows[-1]["id"])
+            self._delivered.update(e["id"] for e in fresh)
+            self._delivered = {i for i in self._delivered if i > self.last_id - LATE_WINDOW}
+            if len(rows) < QUEUE_SIZE:
+                await asyncio.sleep(settings.MARKET_EVENTS_POLL_SECONDS)
+
+    async def stream(self, product_ids=(), category_ids=(), last_event_id=None):
+        """Асинхронный генератор текста SSE для одного клиента."""
+        sub = Subscription(frozenset(product_ids), frozenset(category_ids))
+        self.subscribers.add(sub)
+        try:
+            await self._ensure_running()
+            yield f"retry: {int(settings.MARKET_EVENTS_POLL_SECONDS * 2000)}\n\n"
+            seen = 0
+            if last_event_id is not None:
+                missed = await sync_to_async(events_after)(
+                    last_event_id, sub.product_ids, sub.category_ids, BACKFILL_LIMIT
+                )
+                if len(missed) >= BACKFILL_LIMIT:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                for event in missed:
+                    yield format_sse(event)
+                seen = missed[-1]["id"] if missed else last_event_id
+            while not sub.overflow:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event["id"] > seen:  # уже отдано из пропущенных
+                    yield format_sse(event)
+            yield "event: reset\ndata: {}\n\n"
+        finally:
+            self.subscribers.discard(sub)
+
+
+hub = EventHub()
@@ -0,0 +1,30 @@
+from mini_market.exports import Dataset, register
+
+from .models import PriceHistory, Product
+
+register(Dataset(
+    name="products",
+    description="Товары каталога",
+    get_queryset=lambda: Product.objects.all(),
+    columns=[
+        ("id", "id"), ("slug", "slug"), ("title", "title"), ("category", "category__slug"),
+        ("price", "price"), ("stock", "stock"), ("min_price", "min_price"), ("max_price", "max_price"),
+        ("is_approved", "is_approved"), ("created_by", "created_by__username"),
+        ("created_at", "created_at"), ("updated_at", "updated_at"),
+    ],
+    date_field="updated_at",
+    category_field="category__slug",
+))
+
+register(Dataset(
+    name="price_history",
+    description="История цен",
+    get_queryset=lambda: PriceHistory.objects.all(),
+    columns=[
+        ("id", "id"), ("product_id", "product_id"), ("product", "product__slug"),
+        ("old_price", "old_price"), ("new_price", "new_price"),
+        ("changed_at", "changed_at"), ("reason", "reason"),
+    ],
+    date_field="changed_at",
+    category_field="product__category__slug",
+))
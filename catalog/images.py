@@ -0,0 +1,52 @@
+"""
+Варианты картинок товаров: после загрузки image в фоне собираются
+WebP/JPEG-копии размеров PRODUCT_IMAGE_SIZES; шаблонный тег product_image
+отдаёт подходящую, а пока копий нет — оригинал.
+"""
+import logging
+
+from django.conf import settings
+
+from mini_market.background import run_after_commit
+from mini_market.images import build_variants
+
+from .cache import bump_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def variants_ready(product) -> bool:
+    return bool(product.image) and product.image_variants.get("source") == product.image.name
+
+
+def build_product_variants(product_id: int, force: bool = False) -> bool:
+    """Собирает варианты картинки товара. Возвращает True, если описание обновилось."""
+    product = Product.objects.filter(pk=product_id).only("id", "image", "image_variants").first()
+    if product is None or not product.image:
+        return False
+    if variants_ready(product) and not force:
+        return False
+    try:
+        variants = build_variants(product.image, "products", settings.PRODUCT_IMAGE_SIZES)
+    except (OSError, ValueError):
+        # битый или не найденный файл — оставляем оригинал
+        logger.warning("Не удалось собрать варианты картинки товара %s", product_id, exc_info=True)
+        return False
+    # картинку могли заменить, пока мы считали, — тогда описание уже не про неё
+    updated = Product.objects.filter(pk=product_id, image=product.image.name).update(image_variants=variants)
+    return bool(updated)
+
+
+def _build_and_invalidate(product_id: int):
+    if build_product_variants(product_id):
+        bump_version()  # листинг кэширует готовый HTML с адресами картинок
+
+
+def schedule_product_variants(product) -> None:
+    """После коммита поставить сборку вариантов в фон (если картинка новая)."""
+    if product.image and not variants_ready(product):
+        run_after_commit(_build_and_invalidate, product.pk)
+    elif not product.image and product.image_variants:
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        product.image_variants = {}
@@ -0,0 +1,245 @@
+"""
+Потоковый импорт каталога из JSON-фикстуры (как seed_catalog.json) или JSONL.
+
+Файл читается по кусочкам, записи группируются в пачки и пишутся
+bulk_create(update_conflicts=True) — память ограничена размером пачки.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import search, snapshot
+from .cache import bump_version
+from .models import Category, Product
+from .services import refresh_category_stats
+from .slugs import assign_slugs
+
+# при повторном импорте обновляем то же, что обновлял need.py;
+# min/max цены и описание берутся из файла только для новых товаров
+PRODUCT_UPDATE_FIELDS = ["title", "slug", "category", "price", "stock", "next_change_at"]
+PRODUCT_INSERT_ONLY = ("min_price", "max_price", "description")
+
+
+class CatalogImportError(ValueError):
+    """Ошибка в данных импорта (с номером записи)."""
+
+
+def iter_json_array(fp, read_size: int = 1 << 16):
+    """Отдаёт элементы JSON-массива верхнего уровня по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(read_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+    def next_char(advance=True):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                c = buf[pos]
+                if advance:
+                    pos += 1
+                return c
+            if eof:
+                raise ValueError("Неожиданный конец JSON")
+            fill()
+
+    if next_char() != "[":
+        raise ValueError("Ожидался JSON-массив")
+    if next_char(advance=False) == "]":
+        return
+    while True:
+        next_char(advance=False)
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # значение, упёршееся в конец буфера, может быть обрезано
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield obj
+        c = next_char()
+        if c == "]":
+            return
+        if c != ",":
+            raise ValueError(f"Ожидалась ',' или ']', получено {c!r}")
+
+
+def iter_jsonl(fp):
+    for line in fp:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_records(path: str, fmt: str | None = None):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "json")
+    with open(path, "r", encoding="utf-8") as fp:
+        yield from (iter_jsonl(fp) if fmt == "jsonl" else iter_json_array(fp))
+
+
+@dataclass
+class ImportStats:
+    records: int = 0
+    categories: int = 0
+    products: int = 0
+    seconds: float = 0.0
+    category_ids: set = field(default_factory=set)
+
+    @property
+    def per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else float(self.records)
+
+
+def _upsert(model, objs, update_fields):
+    """Записи с pk сопоставляются по id, без pk — по slug."""
+    with_pk = [o for o in objs if o.pk is not None]
+    without_pk = [o for o in objs if o.pk is None]
+    for batch, unique in ((with_pk, ["id"]), (without_pk, ["slug"])):
+        if batch:
+            model.objects.bulk_create(
+                batch, update_conflicts=True, unique_fields=unique, update_fields=update_fields
+            )
+
+
+class CatalogImporter:
+    """
+    batch_size — записей в одной транзакции; dry_run — только проверить данные;
+    checkpoint — файл, куда после каждой пачки пишется число обработанных записей
+    (для продолжения с места остановки); on_batch(ImportStats) — прогресс.
+    """
+
+    def __init__(self, batch_size: int = 1000, dry_run: bool = False,
+                 checkpoint: str | None = None, on_batch=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.on_batch = on_batch
+        self.stats = ImportStats()
+        self.categories: dict = {}  # pk или slug из файла → id категории
+        self._cat_batch: list[Category] = []
+        self._prod_batch: list[Product] = []
+        self._started = 0.0
+
+    def load_checkpoint(self) -> int:
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint, encoding="utf-8") as f:
+            return int(json.load(f)["records"])
+
+    def _save_checkpoint(self):
+        if not self.checkpoint or self.dry_run:
+            return
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"records": self.stats.records}, f)
+        os.replace(tmp, self.checkpoint)
+
+    def run(self, records, skip: int = 0) -> ImportStats:
+        self._started = time.perf_counter()
+        for cid, slug in Category.objects.values_list("id", "slug"):
+            self.categories[cid] = cid
+            self.categories[slug] = cid
+
+        for index, rec in enumerate(records):
+            if index < skip:
+                continue
+            try:
+                self._add(rec)
+            except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+                raise CatalogImportError(f"Запись №{index + 1}: {e!r}") from e
+            self.stats.records = index + 1
+            if len(self._cat_batch) + len(self._prod_batch) >= self.batch_size:
+                self._flush()
+        self._flush()
+        self._finish()
+        if self.checkpoint and not self.dry_run and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return self.stats
+
+    def _add(self, rec: dict):
+        model, pk, fields = rec["model"], rec.get("pk"), rec["fields"]
+        if model == "catalog.category":
+            # bulk_create не вызывает Category.save — slug считаем сами
+            slug = fields.get("slug") or slugify(fields["name"])[:140]
+            self._cat_batch.append(Category(id=pk, name=fields["name"], slug=slug))
+            if pk is not None:
+                self.categories[pk] = pk
+            self.categories[slug] = pk  # без pk id станет известен после вставки
+        elif model == "catalog.product":
+            ref = fields["category"]
+            if ref not in self.categories:
+                raise ValueError(f"неизвестная категория {ref!r}")
+            p = Product(
+                id=pk,
+                title=fields["title"],
+                slug=fields.get("slug") or "",
+                price=Decimal(str(fields["price"])),
+                stock=int(fields["stock"]),
+                next_change_at=timezone.now() + timedelta(days=2),
+            )
+            for name in PRODUCT_INSERT_ONLY:
+                if name in fields:
+                    setattr(p, name, Decimal(str(fields[name])) if name.endswith("price") else fields[name])
+            p._category_ref = ref
+            self._prod_batch.append(p)
+        else:
+            raise ValueError(f"неподдерживаемая модель {model!r}")
+
+    def _flush(self):
+        if not self._cat_batch and not self._prod_batch:
+            return
+        cats, prods = self._cat_batch, self._prod_batch
+        self._cat_batch, self._prod_batch = [], []
+        if not self.dry_run:
+            with transaction.atomic():
+                _upsert(Category, cats, ["name", "slug"])
+                for c in cats:
+                    self.categories[c.slug] = c.id
+                if prods:
+                    # без slug в файле существующий товар сохраняет свой
+                    known = dict(Product.objects
+                                 .filter(pk__in=[p.pk for p in prods if p.pk and not p.slug])
+                                 .values_list("id", "slug"))
+                    for p in prods:
+                        p.category_id = self.categories[p._category_ref]
+                        p.slug = p.slug or known.get(p.pk, "")
+                    assign_slugs(prods)
+                    _upsert(Product, prods, PRODUCT_UPDATE_FIELDS)
+                    search.reindex_products([p.id for p in prods])
+        self.stats.categories += len(cats)
+        self.stats.products += len(prods)
+        self.stats.category_ids.update(p.category_id for p in prods if p.category_id)
+        self.stats.seconds = time.perf_counter() - self._started
+        self._save_checkpoint()
+        if self.on_batch:
+            self.on_batch(self.stats)
+
+    def _finish(self):
+        if self.dry_run:
+            return
+        # явные pk не двигают последовательности PostgreSQL — выравниваем их
+        sql = connection.ops.sequence_reset_sql(no_style(), [Category, Product])
+        if sql:
+            with connection.cursor() as cur:
+                for stmt in sql:
+                    cur.execute(stmt)
+        refresh_category_stats(self.stats.category_ids)
+        bump_version()
+        snapshot.rebuild_on_commit()
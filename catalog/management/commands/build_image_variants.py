@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import bump_version
+from catalog.images import build_product_variants
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = "Собирает уменьшенные копии (WebP/JPEG) картинок товаров, у которых их ещё нет."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true",
+                            help="Пересобрать описание вариантов у всех товаров с картинкой.")
+
+    def handle(self, *args, **opts):
+        ids = Product.objects.exclude(image="").exclude(image__isnull=True).values_list("id", flat=True)
+        built = checked = 0
+        for pk in ids.order_by("id").iterator(chunk_size=500):
+            checked += 1
+            if build_product_variants(pk, force=opts["force"]):
+                built += 1
+                if built % 100 == 0:
+                    self.stdout.write(f"Собрано: {built} (проверено {checked})")
+        if built:
+            bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Готово: собрано {built} из {checked} товаров с картинкой."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import snapshot
+
+
+class Command(BaseCommand):
+    help = "Переписывает mmap-снимок цен и остатков (PRICE_SNAPSHOT_PATH) из БД."
+
+    def handle(self, *args, **opts):
+        if not snapshot.enabled():
+            raise CommandError("Снимок выключен: задайте PRICE_SNAPSHOT_PATH.")
+        count = snapshot.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"В снимке {count} товаров, поколение {snapshot.generation()}."
+        ))
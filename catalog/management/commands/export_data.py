@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mini_market.exports import DATASETS, ExportError, export_stream, get_dataset, parse_bound
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка товаров, истории цен или сделок в CSV/JSONL (память не зависит от объёма)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", help=f"Набор: {', '.join(sorted(DATASETS))}.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Сжать выгрузку gzip.")
+        parser.add_argument("--from", dest="date_from", help="С даты/времени (ISO), включительно.")
+        parser.add_argument("--to", dest="date_to", help="По дату (ISO) включительно или до времени.")
+        parser.add_argument("--category", help="slug категории.")
+        parser.add_argument("--output", "-o", help="Файл (по умолчанию — stdout).")
+
+    def handle(self, *args, **opts):
+        try:
+            stream = export_stream(
+                get_dataset(opts["dataset"]), opts["format"], opts["gzip"],
+                date_from=parse_bound(opts["date_from"]),
+                date_to=parse_bound(opts["date_to"], end=True),
+                category=opts["category"],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        out = open(opts["output"], "wb") if opts["output"] else sys.stdout.buffer
+        try:
+            for chunk in stream:
+                out.write(chunk)
+        finally:
+            if opts["output"]:
+                out.close()
+            else:
+                out.flush()
@@ -0,0 +1,55 @@
+import base64
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from catalog.models import Category, Product
+from catalog.qr import generate_qrcodes
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует QR-коды товаров пачками (пулом процессов). Коды хранятся по хэшу ссылки "
+        "и пересчитываются только при смене slug. --labels печатает этикетки категории одним файлом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--category", help="slug категории (по умолчанию — все товары).")
+        parser.add_argument("--workers", type=int, default=1, help="Процессов для кодирования.")
+        parser.add_argument("--force", action="store_true", help="Перекодировать даже готовые коды.")
+        parser.add_argument("--labels", metavar="FILE.html",
+                            help="Сохранить страницу этикеток для печати (название, цена, QR).")
+
+    def handle(self, *args, **opts):
+        products = Product.objects.all()
+        category = None
+        if opts["category"]:
+            category = Category.objects.filter(slug=opts["category"]).first()
+            if category is None:
+                raise CommandError(f"Категория {opts['category']!r} не найдена.")
+            products = products.filter(category=category)
+
+        started = time.perf_counter()
+        updated = generate_qrcodes(
+            products, workers=opts["workers"], force=opts["force"],
+            on_chunk=lambda n: self.stdout.write(f"Обновлено кодов: {n}"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"QR-коды: обновлено {updated} за {time.perf_counter() - started:.2f} с."
+        ))
+
+        if opts["labels"]:
+            self._write_labels(opts["labels"], products, category)
+
+    def _write_labels(self, path, products, category):
+        labels = []
+        for p in products.order_by("title", "id").only("title", "price", "qrcode").iterator():
+            with default_storage.open(p.qrcode.name, "rb") as f:
+                png = base64.b64encode(f.read()).decode()
+            labels.append({"title": p.title, "price": p.price, "qr": f"data:image/png;base64,{png}"})
+        html = render_to_string("catalog/qr_labels.html", {"labels": labels, "category": category})
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        self.stdout.write(self.style.SUCCESS(f"Этикетки ({len(labels)} шт.) сохранены в {path}."))
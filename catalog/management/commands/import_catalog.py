@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, CatalogImportError, iter_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоково импортирует категории и товары из JSON-фикстуры или JSONL "
+        "(пачками через bulk_create с upsert). Заменяет need.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл, например seed_catalog.json.")
+        parser.add_argument("--format", choices=["json", "jsonl"], default=None,
+                            help="Формат файла (по умолчанию — по расширению).")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Записей в одной транзакции.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только разобрать и проверить данные, ничего не записывая.")
+        parser.add_argument("--resume", action="store_true",
+                            help="Продолжить с записи, сохранённой в контрольной точке.")
+        parser.add_argument("--checkpoint", default=None,
+                            help="Файл контрольной точки (по умолчанию <path>.checkpoint).")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+
+        def report(stats):
+            self.stdout.write(
+                f"Записей: {stats.records} (категорий {stats.categories}, товаров {stats.products}), "
+                f"{stats.per_second:.0f} зап/с"
+            )
+
+        importer = CatalogImporter(
+            batch_size=opts["batch_size"],
+            dry_run=opts["dry_run"],
+            checkpoint=opts["checkpoint"] or f"{opts['path']}.checkpoint",
+            on_batch=report,
+        )
+        skip = importer.load_checkpoint() if opts["resume"] else 0
+        if skip:
+            self.stdout.write(f"Продолжаем с записи №{skip + 1}.")
+
+        try:
+            stats = importer.run(iter_records(opts["path"], opts["format"]), skip=skip)
+        except FileNotFoundError as e:
+            raise CommandError(f"Файл не найден: {e.filename}")
+        except CatalogImportError as e:
+            raise CommandError(str(e))
+        except ValueError as e:  # битый JSON
+            raise CommandError(f"Ошибка разбора файла: {e}")
+
+        prefix = "Проверка завершена" if opts["dry_run"] else "Импорт завершён"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: категорий {stats.categories}, товаров {stats.products} "
+            f"за {stats.seconds:.1f} с ({stats.per_second:.0f} зап/с)."
+        ))
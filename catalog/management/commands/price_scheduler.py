@@ -0,0 +1,83 @@
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from catalog.events import PRUNE_EVERY, prune_events
+from catalog.scheduler import PRICE_SCHEDULER_LEASE, acquire_lease, next_due_at, release_lease
+from catalog.services import run_price_tick_bulk
+
+
+class Command(BaseCommand):
+    help = (
+        "Планировщик тиков цен: спит до ближайшего next_change_at и обновляет только "
+        "наступившие товары. Одновременно работает только один экземпляр."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-sleep", type=float, default=60.0,
+                            help="Максимальная пауза между проверками, секунд")
+        parser.add_argument("--lease-ttl", type=float, default=None,
+                            help="Срок аренды блокировки, секунд (по умолчанию 3 × max-sleep)")
+        parser.add_argument("--chunk-size", type=int, default=None,
+                            help="Товаров в одной пачке тика")
+        parser.add_argument("--once", action="store_true",
+                            help="Обработать наступившие товары и выйти (для cron)")
+
+    def handle(self, *args, **opts):
+        max_sleep = opts["max_sleep"]
+        ttl = timedelta(seconds=opts["lease_ttl"] or max_sleep * 3)
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        if not acquire_lease(PRICE_SCHEDULER_LEASE, owner, ttl):
+            raise CommandError("Планировщик уже запущен в другом процессе.")
+
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Получен сигнал остановки, завершаем после текущей пачки…")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        def renew(stats):
+            # длинный тик не должен терять аренду
+            acquire_lease(PRICE_SCHEDULER_LEASE, owner, ttl)
+
+        self.stdout.write(f"Планировщик запущен ({owner}).")
+        last_prune = 0.0
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                if not acquire_lease(PRICE_SCHEDULER_LEASE, owner, ttl):
+                    raise CommandError("Аренда планировщика перехвачена другим процессом.")
+                if time.monotonic() - last_prune > PRUNE_EVERY:
+                    # тики пишут outbox живой ленты и без подписчиков — чистим его здесь
+                    prune_events()
+                    last_prune = time.monotonic()
+
+                now = timezone.now()
+                due = next_due_at()
+                if due is not None and due <= now:
+                    changed = run_price_tick_bulk(
+                        now=now, chunk_size=opts["chunk_size"], on_chunk=renew, stop=stop,
+                    )
+                    self.stdout.write(f"{now:%Y-%m-%d %H:%M:%S}: цены обновлены у {changed} товаров.")
+                    if opts["once"]:
+                        break
+                    continue
+                if opts["once"]:
+                    break
+
+                wait = max_sleep if due is None else min(max_sleep, (due - now).total_seconds())
+                stop.wait(max(wait, 0.0))
+        finally:
+            release_lease(PRICE_SCHEDULER_LEASE, owner)
+            self.stdout.write("Планировщик остановлен.")
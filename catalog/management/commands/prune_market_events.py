@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.events import prune_events
+
+
+class Command(BaseCommand):
+    help = "Удаляет события живой ленты (outbox MarketEvent) старше срока хранения."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, default=None,
+                            help="Сколько минут хранить события (по умолчанию MARKET_EVENTS_RETENTION_MINUTES).")
+
+    def handle(self, *args, **opts):
+        if opts["minutes"] is not None and opts["minutes"] < 0:
+            raise CommandError("--minutes не может быть отрицательным.")
+        deleted = prune_events(minutes=opts["minutes"])
+        self.stdout.write(self.style.SUCCESS(f"Удалено событий: {deleted}"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.retention import compact_database, prune_price_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Срок хранения истории цен: сырые строки старше N дней сворачиваются в суточные "
+        "свечи и удаляются небольшими пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="Сколько дней хранить сырую историю (по умолчанию PRICE_HISTORY_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Строк в одной транзакции удаления.")
+        parser.add_argument("--pause", type=float, default=0.0,
+                            help="Пауза между пачками, секунд (меньше нагрузка на БД).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только посчитать, сколько строк будет удалено.")
+        parser.add_argument("--vacuum", action="store_true",
+                            help="После удаления выполнить VACUUM, чтобы вернуть место на диске.")
+
+    def handle(self, *args, **opts):
+        if opts["days"] is not None and opts["days"] < 0:
+            raise CommandError("--days не может быть отрицательным.")
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+
+        def report(deleted):
+            self.stdout.write(f"Удалено строк истории: {deleted}")
+
+        stats = prune_price_history(
+            days=opts["days"], batch_size=opts["batch_size"], pause=opts["pause"],
+            dry_run=opts["dry_run"], on_batch=report,
+        )
+        verb = "Будет удалено" if opts["dry_run"] else "Удалено"
+        self.stdout.write(
+            f"Граница: {stats.cutoff:%Y-%m-%d %H:%M}. Досоздано суточных свечей: {stats.candles_written}."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {stats.history_deleted} строк истории (≈{stats.bytes_estimated / 1024:.0f} КиБ), "
+            f"{stats.candles_deleted} часовых свечей за {stats.seconds:.1f} с."
+        ))
+        if opts["vacuum"] and not opts["dry_run"]:
+            compact_database()
+            self.stdout.write("VACUUM выполнен.")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.candles import rebuild_candles
+
+
+class Command(BaseCommand):
+    help = "Пересобирает часовые и суточные свечи цен из PriceHistory (потоково, пачками)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", dest="products",
+                            help="id товара (можно несколько раз); по умолчанию — все товары.")
+        parser.add_argument("--chunk-size", type=int, default=5000,
+                            help="Строк истории за одно чтение и свечей в одной вставке.")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+
+        def report(created):
+            self.stdout.write(f"Свечей записано: {created}")
+
+        created = rebuild_candles(opts["products"], chunk_size=opts["chunk_size"], on_chunk=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: {created} свечей за {time.perf_counter() - started:.2f} с."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.services import refresh_category_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики всех категорий (товары, остаток, мин./макс. цена)."
+
+    def handle(self, *args, **opts):
+        count = refresh_category_stats()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано категорий: {count}."))
@@ -0,0 +1,42 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from catalog.services import run_price_tick_bulk, run_price_tick_parallel
+
+
+class Command(BaseCommand):
+    help = "Пакетный тик цен: обновляет цены у товаров, у которых наступил next_change_at."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=None,
+                            help="Товаров в одной пачке (по умолчанию PRICE_TICK_CHUNK_SIZE)")
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Зерно генератора случайных чисел (для воспроизводимости)")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Процессов для параллельного тика (на SQLite части идут по очереди)")
+        parser.add_argument("--partition-by", choices=["id", "category"], default="id",
+                            help="Как делить товары между процессами")
+
+    def handle(self, *args, **opts):
+        if opts["workers"] > 1:
+            def report_partition(index, changed, seconds):
+                self.stdout.write(f"часть {index + 1}: изменено {changed}, {seconds:.3f} с")
+
+            changed = run_price_tick_parallel(
+                workers=opts["workers"], partition_by=opts["partition_by"],
+                chunk_size=opts["chunk_size"], seed=opts["seed"], on_partition=report_partition,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Цены обновлены у {changed} товаров."))
+            return
+
+        rng = random.Random(opts["seed"]) if opts["seed"] is not None else random
+
+        def report(stats):
+            self.stdout.write(
+                f"пачка {stats.number}: {stats.processed} товаров, изменено {stats.changed}, "
+                f"{stats.seconds:.3f} с, {stats.per_second:.0f} товаров/с"
+            )
+
+        changed = run_price_tick_bulk(chunk_size=opts["chunk_size"], rng=rng, on_chunk=report)
+        self.stdout.write(self.style.SUCCESS(f"Цены обновлены у {changed} товаров."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:37
+
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_qrcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, default='', max_length=128)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='next_change_at',
+            field=models.DateTimeField(db_index=True, default=catalog.models.default_next_change),
+        ),
+    ]
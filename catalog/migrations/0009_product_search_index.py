@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_product_fts USING fts5("
+            "title, description, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO catalog_product_fts(rowid, title, description, category) "
+            "SELECT p.id, replace(replace(p.title, 'ё', 'е'), 'Ё', 'Е'), "
+            "replace(replace(p.description, 'ё', 'е'), 'Ё', 'Е'), "
+            "replace(replace(c.name, 'ё', 'е'), 'Ё', 'Е') "
+            "FROM catalog_product p JOIN catalog_category c ON c.id = p.category_id"
+        )
+    elif conn.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS catalog_product_search_idx ON catalog_product USING GIN "
+            "(to_tsvector('russian', coalesce(catalog_product.title, '') || ' ' "
+            "|| coalesce(catalog_product.description, '')))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS catalog_product_title_trgm_idx ON catalog_product "
+            "USING GIN (title gin_trgm_ops)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS catalog_product_fts")
+    elif conn.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS catalog_product_search_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS catalog_product_title_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_scheduler_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fill_category_stats(apps, schema_editor):
+    Category = apps.get_model("catalog", "Category")
+    Product = apps.get_model("catalog", "Product")
+    stats = {
+        row["category_id"]: row
+        for row in Product.objects.filter(is_approved=True).values("category_id").annotate(
+            n=Count("id"), stock=Sum("stock"), lo=Min("price"), hi=Max("price")
+        )
+    }
+    cats = list(Category.objects.all())
+    for c in cats:
+        row = stats.get(c.id, {})
+        c.approved_count = row.get("n") or 0
+        c.total_stock = row.get("stock") or 0
+        c.min_price = row.get("lo")
+        c.max_price = row.get("hi")
+    Category.objects.bulk_update(cats, ["approved_count", "total_stock", "min_price", "max_price"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='approved_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_stock',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
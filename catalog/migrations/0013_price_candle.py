@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_category_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=8)),
+                ('bucket', models.DateTimeField(help_text='Начало интервала')),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('changes', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='catalog.product')),
+            ],
+            options={
+                'ordering': ['product', 'resolution', 'bucket'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'resolution', 'bucket'), name='price_candle_bucket_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0015_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='pending_changes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_approved', False), ('pending_owner__isnull', False), _connector='OR'), fields=['-last_edited_at', '-id'], name='product_moderation_idx'),
+        ),
+    ]
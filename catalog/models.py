@@ -2,7 +2,7 @@ from decimal import Decimal
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
@@ -17,6 +17,12 @@ class Category(models.Model):
     name = models.CharField(max_length=120, unique=True)
     slug = models.SlugField(max_length=140, unique=True, blank=True)
 
+    # денормализованные счётчики по одобренным товарам (см. services.refresh_category_stats)
+    approved_count = models.PositiveIntegerField(default=0, editable=False)
+    total_stock = models.PositiveBigIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ["name"]
 
@@ -32,6 +38,19 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+SLUG_SAVE_RETRIES = 5
+
+
+class ProductQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Аноним видит только одобренное, пользователь — ещё свои карточки, staff — всё."""
+        if not user.is_authenticated:
+            return self.filter(is_approved=True)
+        if user.is_staff:
+            return self
+        return self.filter(models.Q(is_approved=True) | models.Q(created_by=user))
+
+
 class Product(models.Model):
     title = models.CharField(max_length=160)
     slug = models.SlugField(max_length=180, unique=True, blank=True)
@@ -45,10 +64,12 @@ class Product(models.Model):
     # «тик цен»
     min_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("1.00"))
     max_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("10000.00"))
-    next_change_at = models.DateTimeField(default=default_next_change)
+    next_change_at = models.DateTimeField(default=default_next_change, db_index=True)
 
     # контент от детей
     image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # уменьшенные копии image (см. catalog/images.py), собираются в фоне
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     qrcode = models.ImageField(upload_to="products/", blank=True, null=True)
     description = models.TextField(blank=True, default="")
     ascii_art = models.TextField(blank=True, default="")
@@ -74,9 +95,23 @@ class Product(models.Model):
         on_delete=models.SET_NULL, related_name="product_edits"
     )
     last_edited_at = models.DateTimeField(auto_now=True)
+    # что поменял pending_owner: {"поле": {"old": ..., "new": ...}} — для очереди модерации
+    pending_changes = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ["title"]
+        indexes = [
+            # курсорная пагинация каталога и «Моих заявок»
+            models.Index(fields=["title", "id"], name="product_title_id_idx"),
+            models.Index(fields=["created_by", "-updated_at", "-id"], name="product_author_updated_idx"),
+            # очередь модерации: индексируются только ожидающие проверки карточки
+            models.Index(
+                fields=["-last_edited_at", "-id"], name="product_moderation_idx",
+                condition=models.Q(is_approved=False) | models.Q(pending_owner__isnull=False),
+            ),
+        ]
         permissions = [
             ("can_tick_prices", "Can run price tick for products"),
         ]
@@ -84,20 +119,34 @@ class Product(models.Model):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        # запоминаем исходную категорию: при переносе товара пересчитываются обе
+        obj._loaded_category_id = obj.__dict__.get("category_id")
+        return obj
+
     def get_absolute_url(self):
         return reverse("catalog:detail", kwargs={"slug": self.slug})
 
     def save(self, *args, **kwargs):
-        # надёжно генерируем уникальный slug
-        if not self.slug:
-            base = slugify(self.title)[:170] or "item"
-            cand = base
-            i = 2
-            while Product.objects.filter(slug=cand).exclude(pk=self.pk).exists():
-                cand = f"{base}-{i}"
-                i += 1
-            self.slug = cand
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        # надёжно генерируем уникальный slug: один префиксный запрос,
+        # а если параллельное создание заняло тот же slug — пробуем ещё раз
+        from .slugs import allocate_slug
+
+        for attempt in range(SLUG_SAVE_RETRIES):
+            self.slug = allocate_slug(self.title, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                conflict = Product.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                self.slug = ""
+                if not conflict or attempt == SLUG_SAVE_RETRIES - 1:
+                    raise
 
     @property
     def image_src(self) -> str:
@@ -111,8 +160,91 @@ class PriceHistory(models.Model):
     product = models.ForeignKey("catalog.Product", on_delete=models.CASCADE, related_name="price_history")
     old_price = models.DecimalField(max_digits=10, decimal_places=2)
     new_price = models.DecimalField(max_digits=10, decimal_places=2)
-    changed_at = models.DateTimeField(auto_now_add=True)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
     reason = models.CharField(max_length=32, default="tick")
 
     class Meta:
         ordering = ["-changed_at"]
+        indexes = [
+            # история одного товара по времени (и сборка его свечей)
+            models.Index(fields=["product", "changed_at"], name="pricehistory_product_time_idx"),
+        ]
+
+
+class SchedulerLease(models.Model):
+    """
+    Аренда для фоновых процессов, которые должны работать в единственном экземпляре
+    (например, планировщик тиков). Владелец продлевает expires_at, пока жив.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    owner = models.CharField(max_length=128, blank=True, default="")
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} ({self.owner or '—'} до {self.expires_at})"
+
+
+class CatalogVersion(models.Model):
+    """
+    Счётчики версий для инвалидации кэшей каталога: любое изменение,
+    видимое в листинге, увеличивает version, и старые ключи кэша перестают читаться.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class PriceCandle(models.Model):
+    """
+    Свеча цены товара за час или сутки (open/high/low/close и число изменений).
+    Ведётся тиком инкрементально, пересобирается командой rebuild_candles.
+    """
+    HOUR = "hour"
+    DAY = "day"
+    RESOLUTIONS = [(HOUR, "Час"), (DAY, "Сутки")]
+
+    product = models.ForeignKey("catalog.Product", on_delete=models.CASCADE, related_name="candles")
+    resolution = models.CharField(max_length=8, choices=RESOLUTIONS)
+    bucket = models.DateTimeField(help_text="Начало интервала")
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    changes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["product", "resolution", "bucket"]
+        constraints = [
+            # заодно служит индексом для выборки диапазона свечей товара
+            models.UniqueConstraint(fields=["product", "resolution", "bucket"], name="price_candle_bucket_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.resolution} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class MarketEvent(models.Model):
+    """
+    Исходящая очередь (outbox) изменений цены и остатка для живой ленты (SSE).
+    Пишется в той же транзакции, что тик или сделка, — каждый процесс-воркер
+    читает её по возрастанию id и раздаёт своим подписчикам. Старые записи чистятся.
+    """
+    PRICE = "price"
+    STOCK = "stock"
+    KINDS = [(PRICE, "Цена"), (STOCK, "Остаток")]
+
+    kind = models.CharField(max_length=8, choices=KINDS)
+    product = models.ForeignKey("catalog.Product", on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey("catalog.Category", on_delete=models.CASCADE, related_name="+")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.product_id}"
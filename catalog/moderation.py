@@ -0,0 +1,71 @@
+"""
+Модерация товаров пачками.
+
+Одобрение и отклонение — один UPDATE на весь набор, без загрузки объектов и без
+save() на каждую строку; кэш каталога и счётчики категорий сбрасываются один раз
+на действие. Очередь модерации — товары с is_approved=False или с pending_owner
+(по ним построен частичный индекс product_moderation_idx).
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import snapshot
+from .cache import bump_version
+from .models import Product
+from .services import refresh_category_stats
+
+PENDING = Q(is_approved=False) | Q(pending_owner__isnull=False)
+
+
+def moderation_queue():
+    """Ожидающие проверки товары, свежие правки сверху."""
+    return (Product.objects.filter(PENDING)
+            .select_related("category", "pending_owner", "created_by")
+            .order_by("-last_edited_at", "-id"))
+
+
+def record_pending_changes(product, form) -> None:
+    """
+    Запоминает в product.pending_changes, что поменяла форма заявки:
+    {"поле": {"old": было, "new": стало}}. При повторной правке «old» остаётся
+    исходным — модератор видит разницу с одобренной версией.
+    """
+    changes = dict(product.pending_changes or {})
+    for name in form.changed_data:
+        old, new = form.initial.get(name), form.cleaned_data.get(name)
+        if hasattr(old, "name") or hasattr(new, "name"):  # файлы — по имени
+            old = getattr(old, "name", old) or ""
+            new = getattr(product, name).name or ""
+        previous = changes.get(name)
+        changes[name] = {"old": previous["old"] if previous else old, "new": new}
+    product.pending_changes = {k: v for k, v in changes.items() if v["old"] != v["new"]}
+
+
+def _apply(queryset, **values) -> int:
+    with transaction.atomic():
+        category_ids = set(queryset.order_by().values_list("category_id", flat=True).distinct())
+        changed = queryset.order_by().update(
+            pending_changes={}, updated_at=timezone.now(), **values
+        )
+    if changed:
+        # UPDATE не шлёт сигналов — кэш и счётчики сбрасываем сами, один раз
+        bump_version()
+        refresh_category_stats(category_ids)
+        snapshot.rebuild_on_commit()  # флаг «одобрен» в снимке цен
+    return changed
+
+
+def approve_pending(queryset) -> int:
+    """
+    Одобряет товары queryset; где есть заявка, автором становится pending_owner.
+    Возвращает число товаров.
+    """
+    return _apply(queryset, created_by=Coalesce(F("pending_owner"), F("created_by")),
+                  pending_owner=None, is_approved=True)
+
+
+def reject_pending(queryset) -> int:
+    """Снимает товары queryset с модерации: заявка отклоняется, товар скрыт."""
+    return _apply(queryset, pending_owner=None, is_approved=False)
@@ -0,0 +1,128 @@
+"""
+QR-коды со ссылкой на карточку товара.
+
+PNG хранятся по хэшу закодированной ссылки (qrcodes/<хэш>.png): одинаковая
+ссылка никогда не кодируется второй раз, а Product.qrcode устаревает только при
+смене slug (или SITE_URL). Кодирование — чистая работа процессора, поэтому
+команда generate_qrcodes раздаёт его пулу процессов; запись файлов и БД остаётся
+в основном процессе. SVG-вариант отдаётся вьюхой и кэшируется.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from qrcode.image.svg import SvgPathImage
+
+QR_FOLDER = "qrcodes"
+QR_BOX_SIZE = 8  # px на модуль PNG
+
+
+def product_url(slug: str) -> str:
+    return settings.SITE_URL.rstrip("/") + reverse("catalog:detail", kwargs={"slug": slug})
+
+
+def qr_hash(data: str) -> str:
+    return hashlib.sha256(data.encode()).hexdigest()[:24]
+
+
+def qr_name(data: str) -> str:
+    return f"{QR_FOLDER}/{qr_hash(data)}.png"
+
+
+def encode_png(data: str) -> bytes:
+    """PNG с QR-кодом строки data (вызывается и в процессах пула)."""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=QR_BOX_SIZE, border=2)
+    qr.add_data(data)
+    buf = BytesIO()
+    qr.make_image().save(buf)
+    return buf.getvalue()
+
+
+def encode_svg(data: str) -> bytes:
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2,
+                       image_factory=SvgPathImage)
+    qr.add_data(data)
+    buf = BytesIO()
+    qr.make_image().save(buf)
+    return buf.getvalue()
+
+
+def cached_svg(data: str) -> bytes:
+    """SVG по ссылке: кодируется один раз, дальше берётся из кэша."""
+    key = f"catalog:qr-svg:{qr_hash(data)}"
+    svg = cache.get(key)
+    if svg is None:
+        svg = encode_svg(data)
+        cache.set(key, svg, None)
+    return svg
+
+
+def _encode_item(item):
+    # модуль не импортирует модели на верхнем уровне — процессу пула не нужен django.setup()
+    data, name = item
+    return name, encode_png(data)
+
+
+def generate_qrcodes(queryset=None, workers: int = 1, force: bool = False,
+                     chunk_size: int = 200, on_chunk=None) -> int:
+    """
+    Проставляет Product.qrcode товарам queryset (по умолчанию — всем), у которых
+    код отсутствует или закодирована старая ссылка. PNG, уже лежащие в хранилище,
+    не пересчитываются (force — пересчитать и перезаписать). Возвращает число
+    обновлённых товаров.
+    """
+    from .models import Product
+
+    queryset = (queryset if queryset is not None else Product.objects.all()).only("id", "slug", "qrcode")
+    updated = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        batch = []
+        for product in queryset.order_by("id").iterator(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                updated += _process_batch(batch, pool, force)
+                batch = []
+                if on_chunk:
+                    on_chunk(updated)
+        if batch:
+            updated += _process_batch(batch, pool, force)
+            if on_chunk:
+                on_chunk(updated)
+    finally:
+        if pool:
+            pool.shutdown()
+    return updated
+
+
+def _process_batch(products, pool, force: bool) -> int:
+    stale = []
+    for p in products:
+        name = qr_name(product_url(p.slug))
+        if force or p.qrcode.name != name:
+            p.qrcode.name = name
+            stale.append(p)
+
+    # одна ссылка — один файл; уже готовые файлы не кодируем повторно
+    todo = {}
+    for p in stale:
+        if force or not default_storage.exists(p.qrcode.name):
+            todo.setdefault(p.qrcode.name, product_url(p.slug))
+    items = [(data, name) for name, data in todo.items()]
+    results = pool.map(_encode_item, items, chunksize=16) if pool else map(_encode_item, items)
+    for name, png in results:
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(png))
+
+    if stale:
+        from .models import Product
+
+        Product.objects.bulk_update(stale, ["qrcode"])
+    return len(stale)
@@ -0,0 +1,161 @@
+"""
+Срок хранения истории цен.
+
+Сырые строки PriceHistory храним PRICE_HISTORY_RETENTION_DAYS дней. Всё, что
+старше, остаётся только в суточных свечах (первая/последняя/мин./макс. цена и
+число изменений): сначала проверяем, что свечи покрывают удаляемые дни, затем
+удаляем сырые строки и часовые свечи небольшими пачками — каждая пачка в своей
+короткой транзакции, чтобы не держать долгих блокировок.
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .candles import CandleAccumulator, bucket_start
+from .models import PriceCandle, PriceHistory
+
+ROW_BYTES_FALLBACK = 64  # грубая оценка строки PriceHistory, если БД не сообщает размер
+
+
+@dataclass
+class RetentionStats:
+    cutoff: object = None
+    candles_written: int = 0
+    history_deleted: int = 0
+    candles_deleted: int = 0
+    bytes_estimated: int = 0
+    seconds: float = 0.0
+
+
+def retention_cutoff(days: int | None = None, now=None):
+    """Граница хранения, выровненная на начало суток: удаляются только целые дни."""
+    days = settings.PRICE_HISTORY_RETENTION_DAYS if days is None else days
+    return bucket_start((now or timezone.now()) - timezone.timedelta(days=days), PriceCandle.DAY)
+
+
+def history_row_bytes() -> int:
+    """Средний размер строки PriceHistory на диске (с индексами), по данным БД."""
+    table = PriceHistory._meta.db_table
+    with connection.cursor() as cur:
+        try:
+            if connection.vendor == "postgresql":
+                cur.execute(
+                    "SELECT pg_total_relation_size(%s::regclass), GREATEST(reltuples, 1) "
+                    "FROM pg_class WHERE oid = %s::regclass", [table, table],
+                )
+            elif connection.vendor == "sqlite":
+                # dbstat есть не во всякой сборке SQLite
+                cur.execute(
+                    f"SELECT (SELECT SUM(pgsize) FROM dbstat WHERE name = %s), "
+                    f"(SELECT MAX(COUNT(*), 1) FROM {table})", [table],
+                )
+            else:
+                return ROW_BYTES_FALLBACK
+            size, rows = cur.fetchone()
+        except Exception:
+            return ROW_BYTES_FALLBACK
+    return int(size / rows) if size else ROW_BYTES_FALLBACK
+
+
+def ensure_daily_candles(cutoff, chunk_size: int = 5000) -> int:
+    """
+    Досоздаёт суточные свечи за дни до cutoff, которые не покрыты (свечи нет
+    или в ней меньше изменений, чем сырых строк) — например, для истории,
+    записанной до появления свечей. Уже сжатые дни не трогает.
+    Возвращает число записанных свечей.
+    """
+    written = 0
+    acc = CandleAccumulator(resolutions=(PriceCandle.DAY,))
+
+    def reconcile():
+        nonlocal written, acc
+        if not acc.items:
+            return
+        existing = {
+            (c.product_id, c.bucket): c
+            for c in PriceCandle.objects.filter(
+                resolution=PriceCandle.DAY, bucket__lt=cutoff,
+                product_id__in={k[0] for k in acc.items},
+            )
+        }
+        to_create, to_update = [], []
+        for (product_id, _, bucket), new in acc.items.items():
+            old = existing.get((product_id, bucket))
+            if old is None:
+                to_create.append(new)
+            elif old.changes < new.changes:
+                new.pk = old.pk
+                to_update.append(new)
+        with transaction.atomic():
+            PriceCandle.objects.bulk_create(to_create)
+            PriceCandle.objects.bulk_update(to_update, ["open", "high", "low", "close", "changes"])
+        written += len(to_create) + len(to_update)
+        acc = CandleAccumulator(resolutions=(PriceCandle.DAY,))
+
+    rows = (PriceHistory.objects
+            .filter(changed_at__lt=cutoff)
+            .order_by("product_id", "changed_at", "id")
+            .values_list("product_id", "old_price", "new_price", "changed_at"))
+    current = None
+    for product_id, old_price, new_price, changed_at in rows.iterator(chunk_size=chunk_size):
+        # сверяем пачками, но не разрывая товар: его день должен собраться целиком
+        if product_id != current and len(acc.items) >= chunk_size:
+            reconcile()
+        current = product_id
+        acc.add(product_id, old_price, new_price, changed_at)
+    reconcile()
+    return written
+
+
+def delete_in_batches(queryset, batch_size: int, pause: float = 0.0, on_batch=None) -> int:
+    """Удаляет строки queryset пачками по batch_size id, каждая пачка — отдельная транзакция."""
+    model = queryset.model
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += model.objects.filter(id__in=ids).delete()[0]
+        if on_batch:
+            on_batch(deleted)
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def prune_price_history(days: int | None = None, batch_size: int = 1000, pause: float = 0.0,
+                        now=None, dry_run: bool = False, on_batch=None) -> RetentionStats:
+    """
+    Применяет срок хранения: досоздаёт суточные свечи, затем пачками удаляет
+    сырую историю и часовые свечи старше границы. dry_run только считает строки.
+    on_batch(deleted) вызывается после каждой пачки удаления истории.
+    """
+    started = time.perf_counter()
+    stats = RetentionStats(cutoff=retention_cutoff(days, now))
+    old_history = PriceHistory.objects.filter(changed_at__lt=stats.cutoff)
+    old_hours = PriceCandle.objects.filter(resolution=PriceCandle.HOUR, bucket__lt=stats.cutoff)
+    row_bytes = history_row_bytes()
+
+    if dry_run:
+        stats.history_deleted = old_history.count()
+        stats.candles_deleted = old_hours.count()
+    else:
+        stats.candles_written = ensure_daily_candles(stats.cutoff)
+        stats.history_deleted = delete_in_batches(old_history, batch_size, pause, on_batch)
+        stats.candles_deleted = delete_in_batches(old_hours, batch_size, pause)
+    stats.bytes_estimated = stats.history_deleted * row_bytes
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def compact_database():
+    """Возвращает освобождённое место системе (VACUUM); на больших базах — долго."""
+    with connection.cursor() as cur:
+        if connection.vendor == "postgresql":
+            cur.execute(f"VACUUM ANALYZE {PriceHistory._meta.db_table}")
+        elif connection.vendor == "sqlite":
+            cur.execute("VACUUM")
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, SchedulerLease
+
+PRICE_SCHEDULER_LEASE = "price-scheduler"
+
+
+def next_due_at():
+    """Ближайший next_change_at (MIN по индексу) или None, если товаров нет."""
+    return (Product.objects
+            .order_by("next_change_at")
+            .values_list("next_change_at", flat=True)
+            .first())
+
+
+def acquire_lease(name: str, owner: str, ttl: timedelta, now=None) -> bool:
+    """
+    Берёт или продлевает аренду name для owner.
+    Успех, если аренда свободна, просрочена или уже принадлежит owner.
+    """
+    now = now or timezone.now()
+    SchedulerLease.objects.get_or_create(name=name, defaults={"expires_at": now})
+    updated = (SchedulerLease.objects
+               .filter(name=name)
+               .filter(Q(owner=owner) | Q(owner="") | Q(expires_at__lte=now))
+               .update(owner=owner, expires_at=now + ttl))
+    return updated == 1
+
+
+def release_lease(name: str, owner: str) -> None:
+    SchedulerLease.objects.filter(name=name, owner=owner).update(owner="", expires_at=timezone.now())
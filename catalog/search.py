@@ -0,0 +1,160 @@
+"""
+Полнотекстовый поиск по товарам (название, описание, категория).
+
+SQLite: FTS5-таблица catalog_product_fts (rowid = id товара), синхронизируется сигналами.
+PostgreSQL: GIN-индексы по to_tsvector('russian', …) и по триграммам названия —
+синхронизация не нужна, индекс считает сама СУБД.
+Для остальных СУБД — запасной вариант через icontains.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "catalog_product_fts"
+
+# окончания для лёгкого стемминга русских слов: «игрушки» и «игрушка» → «игрушк*»
+_RU_ENDINGS = sorted({
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ете", "ите",
+    "ая", "яя", "ое", "ее", "ие", "ые", "ой", "ей", "ий", "ый", "ом", "ем", "ам", "ям",
+    "ах", "ях", "ую", "юю", "ов", "ев", "ия", "ья", "ье", "ию", "ью",
+    "а", "я", "о", "е", "и", "ы", "у", "ю", "ь", "й",
+}, key=len, reverse=True)
+_CYRILLIC = re.compile(r"[а-я]")
+_WORD = re.compile(r"\w+")
+
+# SQL: нормализуем «ё» так же, как и запрос
+_FTS_SELECT = f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, description, category)
+    SELECT p.id,
+           replace(replace(p.title, 'ё', 'е'), 'Ё', 'Е'),
+           replace(replace(p.description, 'ё', 'е'), 'Ё', 'Е'),
+           replace(replace(c.name, 'ё', 'е'), 'Ё', 'Е')
+    FROM catalog_product p JOIN catalog_category c ON c.id = p.category_id
+"""
+
+_PG_DOCUMENT = (
+    "to_tsvector('russian', coalesce(catalog_product.title, '') || ' ' "
+    "|| coalesce(catalog_product.description, ''))"
+)
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def stem(word: str) -> str:
+    """
+    Отрезает самое длинное русское окончание. Основа — не короче 3 букв
+    (для однобуквенных окончаний — 2, чтобы «юла» находила «юлу»).
+    """
+    if not _CYRILLIC.search(word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= (2 if len(ending) == 1 else 3):
+            return word[: -len(ending)]
+    return word
+
+
+def query_terms(q: str) -> list[str]:
+    return [stem(w) for w in _WORD.findall(normalize(q or ""))]
+
+
+def search_products(qs, q: str):
+    """
+    Фильтрует qs по поисковому запросу и сортирует по релевантности
+    (совпадение в названии весит больше, чем в категории и описании).
+    """
+    terms = query_terms(q)
+    if not terms:
+        return qs
+    if connection.vendor == "sqlite":
+        return _search_sqlite(qs, terms)
+    if connection.vendor == "postgresql":
+        return _search_postgres(qs, q, terms)
+    cond = Q()
+    for t in terms:
+        cond &= Q(title__icontains=t) | Q(description__icontains=t) | Q(category__name__icontains=t)
+    return qs.filter(cond)
+
+
+def _search_sqlite(qs, terms):
+    match = " ".join(f'"{t}"*' for t in terms)
+    # фильтры qs (видимость, категория) — в том же запросе до LIMIT, иначе чужие
+    # черновики и другие категории занимают места лучших SEARCH_MAX_RESULTS
+    scope_sql, scope_params = qs.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({scope_sql}) "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 3.0) LIMIT %s",
+            [match, *scope_params, settings.SEARCH_MAX_RESULTS],
+        )
+        ids = [row[0] for row in cur.fetchall()]
+    if not ids:
+        return qs.none()
+    rank = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(ids)], output_field=IntegerField())
+    return qs.filter(pk__in=ids).annotate(search_rank=rank).order_by("search_rank")
+
+
+def _search_postgres(qs, q, terms):
+    from .models import Category
+
+    tsquery = " & ".join(f"{t}:*" for t in terms)
+    matches = RawSQL(
+        f"{_PG_DOCUMENT} @@ to_tsquery('russian', %s) OR catalog_product.title %% %s",
+        [tsquery, q],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank_cd({_PG_DOCUMENT}, to_tsquery('russian', %s)) + similarity(catalog_product.title, %s)",
+        [tsquery, q],
+        output_field=FloatField(),
+    )
+    in_category = Category.objects.filter(name__icontains=q).values("id")
+    return (qs.filter(Q(matches) | Q(category_id__in=in_category))
+              .annotate(search_rank=rank)
+              .order_by("-search_rank", "title"))
+
+
+def reindex_products(ids) -> None:
+    """Пересобирает записи индекса для товаров ids (только SQLite)."""
+    ids = list(ids)
+    if connection.vendor != "sqlite" or not ids:
+        return
+    marks = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", ids)
+        cur.execute(f"{_FTS_SELECT} WHERE p.id IN ({marks})", ids)
+
+
+def reindex_category(category_id: int) -> None:
+    if connection.vendor != "sqlite":
+        return
+    from .models import Product
+
+    ids = list(Product.objects.filter(category_id=category_id).values_list("id", flat=True))
+    for start in range(0, len(ids), 500):
+        reindex_products(ids[start:start + 500])
+
+
+def remove_products(ids) -> None:
+    ids = list(ids)
+    if connection.vendor != "sqlite" or not ids:
+        return
+    marks = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", ids)
+
+
+def rebuild_index() -> None:
+    """Полная перестройка индекса."""
+    with connection.cursor() as cur:
+        if connection.vendor == "sqlite":
+            cur.execute(f"DELETE FROM {FTS_TABLE}")
+            cur.execute(_FTS_SELECT)
+            cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        elif connection.vendor == "postgresql":
+            cur.execute("REINDEX INDEX catalog_product_search_idx")
+            cur.execute("REINDEX INDEX catalog_product_title_trgm_idx")
@@ -1,42 +1,303 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import transaction
+from django.db import IntegrityError, connection, connections, transaction
 from django.utils import timezone
-from django.db.models import F
+from django.db.models import Count, F, Max, Min, Sum
+import math
+import os
 import random
+import time
 
 from django.conf import settings
-from .models import Product, PriceHistory
+from . import candles, events, search, snapshot
+from .cache import CATEGORIES, bump_version
+from .models import SLUG_SAVE_RETRIES, Category, Product, PriceHistory
+from .slugs import assign_slugs
 
 Q = Decimal
 
+# поля, которых достаточно для расчёта новой цены
+TICK_FIELDS = ("id", "category_id", "price", "stock", "is_approved", "min_price", "max_price", "next_change_at")
+
+
 def clamp(val: Decimal, lo: Decimal, hi: Decimal) -> Decimal:
     return max(lo, min(hi, val))
 
+
+def next_price(price: Decimal, lo: Decimal, hi: Decimal, rng=random) -> Decimal:
+    """
+    Новая цена: случайно вверх/вниз на [PRICE_CHANGE_MIN..PRICE_CHANGE_MAX] %,
+    с зажимом в пределах lo..hi. Порядок вызовов rng одинаков для всех движков тика.
+    """
+    direction = Q(rng.choice([-1, 1]))                      # -1 или +1
+    pct = Q(rng.randint(settings.PRICE_CHANGE_MIN, settings.PRICE_CHANGE_MAX)) / Q(100)
+    new_price = (price * (Q(1) + direction * pct)).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
+    return clamp(new_price, lo, hi)
+
+
 @transaction.atomic
-def run_price_tick(now=None) -> int:
+def run_price_tick(now=None, rng=random) -> int:
     """
     Меняет цену у товаров, у кого наступил срок next_change_at.
     Случайно вверх/вниз на [PRICE_CHANGE_MIN..PRICE_CHANGE_MAX] %, с зажимом в пределах min_price..max_price.
     Возвращает количество обновлённых товаров.
     """
     now = now or timezone.now()
-    qs = Product.objects.select_for_update().filter(next_change_at__lte=now)
+    qs = Product.objects.select_for_update().filter(next_change_at__lte=now).order_by("id")
 
     changed = 0
+    history, repriced = [], []
     for p in qs:
-        direction = Q(random.choice([-1, 1]))                      # -1 или +1
-        pct = Q(random.randint(settings.PRICE_CHANGE_MIN, settings.PRICE_CHANGE_MAX)) / Q(100)
-        new_price = (p.price * (Q(1) + direction * pct)).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
-        new_price = clamp(new_price, p.min_price, p.max_price)
+        new_price = next_price(p.price, p.min_price, p.max_price, rng)
 
         if new_price != p.price:
-            PriceHistory.objects.create(
+            history.append(PriceHistory.objects.create(
                 product=p, old_price=p.price, new_price=new_price, reason="tick"
-            )
+            ))
             p.price = new_price
+            repriced.append(p)
             changed += 1
 
         # следующее разрешённое изменение через 2 дня
         p.next_change_at = now + timezone.timedelta(days=2)
         p.save(update_fields=["price", "next_change_at"])
+    candles.apply_changes(history)
+    events.publish_prices(repriced)
+    snapshot.rebuild_on_commit()
+    return changed
+
+
+@dataclass
+class TickChunkStats:
+    """Итог одной пачки пакетного тика."""
+    number: int
+    processed: int
+    changed: int
+    seconds: float
+
+    @property
+    def per_second(self) -> float:
+        return self.processed / self.seconds if self.seconds else float(self.processed)
+
+
+def run_price_tick_bulk(now=None, chunk_size: int | None = None, rng=random, on_chunk=None,
+                        filters: dict | None = None, skip_locked: bool = False, stop=None) -> int:
+    """
+    Пакетный тик цен: тот же результат, что у run_price_tick (при том же rng),
+    но товары обрабатываются пачками по chunk_size, каждая в своей короткой транзакции:
+    - грузим только нужные колонки;
+    - новые цены пишем одним bulk_update, историю — одним bulk_create;
+    - next_change_at сдвигаем одним UPDATE на всю пачку.
+    on_chunk(TickChunkStats) вызывается после каждой пачки (например, для вывода скорости).
+    filters ограничивает тик частью товаров (см. due_partitions), skip_locked пропускает
+    строки, заблокированные другими транзакциями (они останутся до следующего тика).
+    stop (threading.Event) проверяется между пачками: если он установлен, тик
+    заканчивается после текущей пачки, необработанные товары ждут следующего тика.
+    Возвращает количество обновлённых товаров.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.PRICE_TICK_CHUNK_SIZE
+    next_change = now + timezone.timedelta(days=2)
+
+    changed = 0
+    last_id = 0
+    number = 0
+    touched_categories = set()
+    while True:
+        started = time.perf_counter()
+        with transaction.atomic():
+            batch = list(
+                Product.objects.select_for_update(skip_locked=skip_locked)
+                .filter(next_change_at__lte=now, id__gt=last_id, **(filters or {}))
+                .order_by("id")
+                .only(*TICK_FIELDS)[:chunk_size]
+            )
+            if not batch:
+                break
+
+            to_update, history = [], []
+            for p in batch:
+                new_price = next_price(p.price, p.min_price, p.max_price, rng)
+                if new_price != p.price:
+                    history.append(PriceHistory(
+                        product_id=p.id, old_price=p.price, new_price=new_price, reason="tick"
+                    ))
+                    p.price = new_price
+                    to_update.append(p)
+                    touched_categories.add(p.category_id)
+
+            if to_update:
+                Product.objects.bulk_update(to_update, ["price"])
+                PriceHistory.objects.bulk_create(history)
+                candles.apply_changes(history)
+                events.publish_prices(to_update)
+                snapshot.patch_on_commit((p.id, p.price, p.stock, p.is_approved) for p in to_update)
+            Product.objects.filter(id__in=[p.id for p in batch]).update(next_change_at=next_change)
+
+        last_id = batch[-1].id
+        number += 1
+        changed += len(to_update)
+        if on_chunk:
+            on_chunk(TickChunkStats(
+                number=number,
+                processed=len(batch),
+                changed=len(to_update),
+                seconds=time.perf_counter() - started,
+            ))
+        if stop is not None and stop.is_set():
+            break
+    if changed:
+        # bulk-обновления не шлют сигналов — сбрасываем кэш листинга и счётчики сами
+        bump_version()
+        refresh_category_stats(touched_categories)
+        if filters is None:  # тик всего рынка — снимок цен переписываем целиком
+            snapshot.rebuild_on_commit()
+    return changed
+
+
+STATS_FIELDS = ("approved_count", "total_stock", "min_price", "max_price")
+
+
+def refresh_category_stats(category_ids=None) -> int:
+    """
+    Пересчитывает счётчики категорий (кол-во одобренных товаров, суммарный остаток,
+    мин./макс. цена) одним агрегирующим запросом — только для переданных category_ids,
+    None — для всех. Возвращает число обновлённых категорий.
+    """
+    cats = Category.objects.only("id")
+    products = Product.objects.filter(is_approved=True)
+    if category_ids is not None:
+        category_ids = set(category_ids)
+        if not category_ids:
+            return 0
+        cats = cats.filter(id__in=category_ids)
+        products = products.filter(category_id__in=category_ids)
+
+    stats = {
+        row["category_id"]: row
+        for row in products.order_by().values("category_id").annotate(
+            n=Count("id"), stock=Sum("stock"), lo=Min("price"), hi=Max("price")
+        )
+    }
+    cats = list(cats)
+    for c in cats:
+        row = stats.get(c.id, {})
+        c.approved_count = row.get("n") or 0
+        c.total_stock = row.get("stock") or 0
+        c.min_price = row.get("lo")
+        c.max_price = row.get("hi")
+    Category.objects.bulk_update(cats, STATS_FIELDS, batch_size=500)
+    bump_version(CATEGORIES)
+    return len(cats)
+
+
+def due_partitions(now, count: int, by: str = "id") -> list[dict]:
+    """
+    Делит наступившие товары на части для параллельного тика.
+    by="id" — примерно равные диапазоны id, by="category" — по одной категории на часть.
+    Каждая часть — словарь фильтров для run_price_tick_bulk.
+    """
+    due = Product.objects.filter(next_change_at__lte=now)
+    if by == "category":
+        cats = due.order_by("category_id").values_list("category_id", flat=True).distinct()
+        return [{"category_id": c} for c in cats]
+
+    bounds = due.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return []
+    lo, hi = bounds["lo"], bounds["hi"]
+    step = max(1, math.ceil((hi - lo + 1) / max(count, 1)))
+    return [{"id__gte": start, "id__lt": start + step} for start in range(lo, hi + 1, step)]
+
+
+def _init_tick_worker():
+    import django
+    django.setup()
+
+
+def _tick_partition(now, filters: dict, chunk_size, seed, index: int, skip_locked: bool):
+    """Тик одной части (выполняется в процессе пула или последовательно)."""
+    rng = random.Random(f"{seed}:{index}") if seed is not None else random.Random()
+    started = time.perf_counter()
+    changed = run_price_tick_bulk(
+        now=now, chunk_size=chunk_size, rng=rng, filters=filters, skip_locked=skip_locked
+    )
+    return changed, time.perf_counter() - started
+
+
+def run_price_tick_parallel(now=None, workers: int | None = None, partition_by: str = "id",
+                            chunk_size: int | None = None, seed=None, on_partition=None) -> int:
+    """
+    Параллельный тик: наступившие товары делятся на части (due_partitions), каждая часть
+    тикается в отдельном процессе короткими транзакциями; где СУБД умеет SKIP LOCKED,
+    занятые строки пропускаются, а не ждут.
+    На SQLite (одна запись за раз) и при workers=1 части обрабатываются последовательно.
+    on_partition(index, changed, seconds) вызывается по завершении каждой части.
+    Возвращает количество обновлённых товаров.
+    """
+    now = now or timezone.now()
+    workers = workers or os.cpu_count() or 1
+    partitions = due_partitions(now, workers, partition_by)
+
+    results = []
+    if workers <= 1 or len(partitions) <= 1 or connection.vendor == "sqlite":
+        for i, f in enumerate(partitions):
+            results.append(_tick_partition(now, f, chunk_size, seed, i, False))
+            if on_partition:
+                on_partition(i, *results[-1])
+    else:
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        # дочерние процессы не должны унаследовать открытые соединения
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(partitions)),
+                                 initializer=_init_tick_worker) as pool:
+            futures = [
+                pool.submit(_tick_partition, now, f, chunk_size, seed, i, skip_locked)
+                for i, f in enumerate(partitions)
+            ]
+            for i, fut in enumerate(futures):
+                results.append(fut.result())
+                if on_partition:
+                    on_partition(i, *results[-1])
+    changed = sum(changed for changed, _ in results)
+    if changed:
+        snapshot.rebuild_on_commit()
     return changed
+
+
+def sync_after_bulk_write(product_ids, category_ids) -> None:
+    """
+    bulk_create/bulk_update не шлют сигналов: обновляем поисковый индекс,
+    счётчики категорий и версию кэша каталога сами — один раз на пачку.
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 500):
+        search.reindex_products(product_ids[start:start + 500])
+    refresh_category_stats(category_ids)
+    bump_version()
+    snapshot.rebuild_on_commit()
+
+
+def bulk_create_products(products, batch_size: int = 500) -> list:
+    """
+    Создаёт много товаров сразу: slug выдаются пакетно (assign_slugs),
+    вставка — bulk_create. Если параллельная вставка заняла чей-то slug,
+    автоматически выданные slug пересчитываются и пачка вставляется заново.
+    """
+    products = list(products)
+    auto = [p for p in products if not p.slug]
+    for attempt in range(SLUG_SAVE_RETRIES):
+        assign_slugs(products)
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products, batch_size=batch_size)
+            break
+        except IntegrityError:
+            for p in auto:
+                p.slug = ""
+                p.pk = None
+            if attempt == SLUG_SAVE_RETRIES - 1:
+                raise
+    sync_after_bulk_write([p.pk for p in products], {p.category_id for p in products})
+    return products
@@ -0,0 +1,105 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, images, search, snapshot
+from .models import Category, Product
+from .services import refresh_category_stats
+
+# поля товара, которые попадают в поисковый индекс
+SEARCH_FIELDS = {"title", "description", "category", "category_id"}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # тик цен и сделки сохраняют только price/stock — индекс не трогаем
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    search.reindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.reindex_category(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_listing_on_product_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # сделки меняют только stock — в листинге его нет
+    if update_fields is not None and not cache.LISTING_FIELDS & set(update_fields):
+        return
+    cache.bump_version()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def invalidate_listing_on_delete(sender, instance, **kwargs):
+    cache.bump_version()
+
+
+@receiver(post_save, sender=Category)
+def invalidate_listing_on_category_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.bump_version()
+        cache.bump_version(cache.CATEGORIES)
+
+
+# поля товара, от которых зависят счётчики категории (stock — только при полном save:
+# сделки обновляют его точечно и счётчик догоняет на тике/пересчёте)
+STATS_FIELDS = {"is_approved", "price", "category", "category_id"}
+
+
+@receiver(post_save, sender=Product)
+def refresh_stats_on_product_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not STATS_FIELDS & set(update_fields):
+        return
+    ids = {instance.category_id, getattr(instance, "_loaded_category_id", None)} - {None}
+    refresh_category_stats(ids)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Product)
+def refresh_stats_on_product_delete(sender, instance, **kwargs):
+    refresh_category_stats([instance.category_id])
+
+
+@receiver(post_save, sender=Product)
+def build_image_variants_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    images.schedule_product_variants(instance)
+
+
+# поля товара в снимке цен (сделки правят снимок сами: их stock — F-выражение)
+SNAPSHOT_FIELDS = {"price", "stock", "is_approved"}
+
+
+@receiver(post_save, sender=Product)
+def patch_snapshot_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not SNAPSHOT_FIELDS & set(update_fields):
+        return
+    values = (instance.price, instance.stock)
+    if any(hasattr(v, "resolve_expression") for v in values):
+        return
+    snapshot.patch_on_commit([(instance.pk, *values, instance.is_approved)])
+
+
+@receiver(post_delete, sender=Product)
+def patch_snapshot_on_delete(sender, instance, **kwargs):
+    snapshot.patch_on_commit([(instance.pk, None, None, False)])
@@ -0,0 +1,98 @@
+"""
+Выдача уникальных slug товаров.
+
+Вместо цикла «exists() на каждый кандидат» одним запросом берём у каждой базы
+наибольший занятый номер (base — 1, base-N — N) и выдаём следующий. Запрос
+возвращает одну строку, сколько бы base-N ни было в каталоге (русские названия
+slugify превращает в общую базу «item»). Дыры после удалений не заполняются.
+"""
+import re
+
+from django.db.models import BigIntegerField, Case, Max, Q, Value, When
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+SLUG_BASE_MAX = 170  # 180 в модели минус место под суффикс «-NNNN»
+PREFIX_QUERY_BATCH = 100  # баз в одном запросе при пакетной выдаче
+
+
+def slug_base(title: str) -> str:
+    return slugify(title)[:SLUG_BASE_MAX] or "item"
+
+
+def _suffix_q(base: str) -> Q:
+    return Q(slug__startswith=f"{base}-", slug__regex=rf"^{re.escape(base)}-[0-9]+$")
+
+
+def _max_suffixes(bases, exclude_pk=None) -> dict[str, int]:
+    """{база: наибольший занятый номер}; базы без занятых slug в ответ не попадают."""
+    from .models import Product
+
+    found = {}
+    bases = list(bases)
+    for start in range(0, len(bases), PREFIX_QUERY_BATCH):
+        chunk = bases[start:start + PREFIX_QUERY_BATCH]
+        cond = Q()
+        aggregates = {}
+        for i, base in enumerate(chunk):
+            cond |= Q(slug=base) | _suffix_q(base)
+            aggregates[f"b{i}"] = Max(Case(
+                When(slug=base, then=Value(1)),
+                When(_suffix_q(base), then=Cast(Substr("slug", len(base) + 2), BigIntegerField())),
+                output_field=BigIntegerField(),
+            ))
+        qs = Product.objects.filter(cond)
+        if exclude_pk is not None:
+            qs = qs.exclude(pk=exclude_pk)
+        row = qs.aggregate(**aggregates)
+        found.update({base: row[f"b{i}"] for i, base in enumerate(chunk) if row[f"b{i}"]})
+    return found
+
+
+class _SlugPool:
+    """Следующий свободный slug каждой базы: base, base-2, base-3…"""
+
+    def __init__(self, bases, last: dict[str, int]):
+        self.bases = frozenset(bases)
+        self.last = last
+
+    def register(self, slug: str) -> None:
+        # slug, выданный одной базе, может оказаться base или base-N другой («ball-2»)
+        if slug in self.bases:
+            self.last[slug] = max(self.last.get(slug, 0), 1)
+        head, _, tail = slug.rpartition("-")
+        if tail.isdigit() and head in self.bases:
+            self.last[head] = max(self.last.get(head, 0), int(tail))
+
+    def take(self, base: str) -> str:
+        n = self.last.get(base, 0) + 1
+        slug = base if n == 1 else f"{base}-{n}"
+        self.register(slug)
+        return slug
+
+
+def allocate_slug(title: str, exclude_pk=None) -> str:
+    """Уникальный slug для одного товара — один запрос к БД."""
+    base = slug_base(title)
+    return _SlugPool([base], _max_suffixes([base], exclude_pk)).take(base)
+
+
+def assign_slugs(products) -> list:
+    """
+    Проставляет slug всем товарам без slug (для bulk_create): номера читаются
+    одним агрегатным запросом на каждые PREFIX_QUERY_BATCH баз. Учитывает и slug,
+    уже заданные внутри той же пачки. Возвращает products.
+    """
+    products = list(products)
+    pending = [p for p in products if not p.slug]
+    if not pending:
+        return products
+    bases = [slug_base(p.title) for p in pending]
+    pool = _SlugPool(bases, _max_suffixes(set(bases)))
+    for p in products:
+        if p.slug:
+            pool.register(p.slug)
+
+    for p, base in zip(pending, bases):
+        p.slug = pool.take(base)
+    return products
@@ -0,0 +1,221 @@
+"""
+Снимок цен и остатков в файле, отображённом в память (mmap) всеми процессами.
+
+Формат: заголовок 32 байта и записи по 16 байт, запись товара — по смещению
+HEADER + id * RECORD (цена в копейках int64, остаток int32, флаги uint32).
+Чтение — struct.unpack_from прямо из отображения: ни запросов, ни копий файла.
+
+- Тик переписывает файл целиком: новый файл рядом + os.replace (атомарно),
+  старый помечается retired — читатели видят флаг и переоткрывают снимок.
+- Сделки и сохранения товара правят записи на месте под seqlock: счётчик seq
+  нечётный, пока идёт запись; читатель повторяет чтение, если seq изменился.
+- Писатели из разных процессов сериализуются flock на <путь>.lock.
+- generation растёт с каждой перезаписью: по нему видно, что снимок сменился.
+
+Снимок — кэш: нет файла, товара или снимок выключен (PRICE_SNAPSHOT_PATH пуст) —
+вызывающий берёт значения из БД.
+"""
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: писатель один (тик), блокировка не нужна
+    fcntl = None
+
+MAGIC = b"PSNP"
+FORMAT = 1
+HEADER = struct.Struct("<4sIIIQQ")  # magic, format, retired, capacity, seq, generation
+RECORD = struct.Struct("<qiI")  # копейки, остаток, флаги
+SEQ_OFFSET = 16
+RETIRED_OFFSET = 8
+PRESENT, APPROVED = 1, 2
+HEADROOM = 1024  # запас id под новые товары без перезаписи файла
+READ_RETRIES = 100
+
+
+def enabled() -> bool:
+    return bool(settings.PRICE_SNAPSHOT_PATH)
+
+
+def _cents(price) -> int:
+    return int((Decimal(price) * 100).to_integral_value())
+
+
+def _record(price, stock: int, approved: bool) -> bytes:
+    return RECORD.pack(_cents(price), stock, PRESENT | (APPROVED if approved else 0))
+
+
+@contextmanager
+def _writer_lock(path):
+    with open(f"{path}.lock", "a+b") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# --- запись ---
+
+def rebuild() -> int:
+    """
+    Переписывает снимок из БД: новый файл рядом и атомарная подмена.
+    Возвращает число товаров в снимке.
+    """
+    from .models import Product
+
+    if not enabled():
+        return 0
+    path = str(settings.PRICE_SNAPSHOT_PATH)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _writer_lock(path):
+        # читаем БД под блокировкой: правки, закоммиченные позже, дождутся её и лягут в новый файл
+        rows = Product.objects.order_by("id").values_list("id", "price", "stock", "is_approved")
+        max_id = Product.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        capacity = max_id + 1 + HEADROOM
+        old = _open_for_write(path)
+        generation = (HEADER.unpack_from(old, 0)[5] + 1) if old is not None else 1
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "w+b") as f:
+            f.truncate(HEADER.size + capacity * RECORD.size)
+            with mmap.mmap(f.fileno(), 0) as mm:
+                HEADER.pack_into(mm, 0, MAGIC, FORMAT, 0, capacity, 0, generation)
+                count = 0
+                for pk, price, stock, approved in rows.iterator(chunk_size=2000):
+                    mm[HEADER.size + pk * RECORD.size:HEADER.size + (pk + 1) * RECORD.size] = \
+                        _record(price, stock, approved)
+                    count += 1
+                mm.flush()
+        os.replace(tmp, path)
+        if old is not None:
+            struct.pack_into("<I", old, RETIRED_OFFSET, 1)
+            old.close()
+    return count
+
+
+def _open_for_write(path):
+    try:
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+    except (FileNotFoundError, ValueError):
+        return None
+    if mm[:4] != MAGIC:
+        mm.close()
+        return None
+    return mm
+
+
+def patch(rows) -> bool:
+    """
+    Правит записи на месте: rows — [(id, цена, остаток, одобрен)], для удалённого
+    товара — (id, None, None, False). Если файла нет или id не помещается —
+    снимок перестраивается целиком. Возвращает True, если правка легла на месте.
+    """
+    if not enabled():
+        return False
+    rows = list(rows)
+    path = str(settings.PRICE_SNAPSHOT_PATH)
+    with _writer_lock(path):
+        mm = _open_for_write(path)
+        if mm is not None:
+            capacity = HEADER.unpack_from(mm, 0)[3]
+            if all(pk < capacity for pk, *_ in rows):
+                seq = struct.unpack_from("<Q", mm, SEQ_OFFSET)[0]
+                struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 1)  # нечётный — идёт запись
+                for pk, price, stock, approved in rows:
+                    offset = HEADER.size + pk * RECORD.size
+                    if price is None:
+                        RECORD.pack_into(mm, offset, 0, 0, 0)
+                    else:
+                        mm[offset:offset + RECORD.size] = _record(price, stock, approved)
+                struct.pack_into("<Q", mm, SEQ_OFFSET, seq + 2)
+                mm.close()
+                return True
+            mm.close()
+    rebuild()
+    return False
+
+
+def patch_on_commit(rows) -> None:
+    """Правка после коммита: незакоммиченные цены и остатки в снимок не попадают."""
+    if enabled():
+        rows = list(rows)
+        transaction.on_commit(lambda: patch(rows))
+
+
+def rebuild_on_commit() -> None:
+    if enabled():
+        transaction.on_commit(rebuild)
+
+
+# --- чтение ---
+
+class _Mapping:
+    """Отображение снимка в этом процессе; переоткрывается, когда файл подменили."""
+
+    def __init__(self):
+        self.path = None
+        self.mm = None
+
+    def get(self):
+        path = str(settings.PRICE_SNAPSHOT_PATH)
+        mm = self.mm
+        if mm is not None and self.path == path and not struct.unpack_from("<I", mm, RETIRED_OFFSET)[0]:
+            return mm
+        if mm is not None:
+            mm.close()
+            self.mm = None
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        if mm[:4] != MAGIC or HEADER.unpack_from(mm, 0)[1] != FORMAT:
+            mm.close()
+            return None
+        self.path, self.mm = path, mm
+        return mm
+
+
+_mapping = _Mapping()
+
+
+def generation() -> int | None:
+    """Номер перезаписи снимка (None — снимка нет)."""
+    mm = _mapping.get() if enabled() else None
+    return HEADER.unpack_from(mm, 0)[5] if mm is not None else None
+
+
+def read(ids) -> dict:
+    """
+    {id: (цена, остаток, одобрен)} для товаров из снимка; отсутствующих в ответе нет.
+    Пустой словарь — снимок выключен или не собран.
+    """
+    mm = _mapping.get() if enabled() else None
+    if mm is None:
+        return {}
+    capacity = HEADER.unpack_from(mm, 0)[3]
+    ids = [pk for pk in ids if 0 <= pk < capacity]
+    for _ in range(READ_RETRIES):
+        seq = struct.unpack_from("<Q", mm, SEQ_OFFSET)[0]
+        if seq & 1:
+            continue
+        raw = [(pk, RECORD.unpack_from(mm, HEADER.size + pk * RECORD.size)) for pk in ids]
+        if struct.unpack_from("<Q", mm, SEQ_OFFSET)[0] == seq:
+            break
+    else:
+        return {}  # писатель не успел за READ_RETRIES — берём из БД
+    return {
+        pk: (Decimal(cents).scaleb(-2), stock, bool(flags & APPROVED))
+        for pk, (cents, stock, flags) in raw if flags & PRESENT
+    }
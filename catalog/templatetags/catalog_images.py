@@ -0,0 +1,33 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from mini_market.images import pick_variant, srcset
+
+register = template.Library()
+
+PLACEHOLDER = "products/product_placeholder.svg"
+
+
+@register.simple_tag
+def product_image(product, size: int, css_class: str = ""):
+    """
+    <img> картинки товара шириной около size px: готовые варианты (WebP с JPEG
+    в запасе), пока их нет — оригинал, без картинки — плейсхолдер.
+    """
+    alt = product.title
+    if not product.image:
+        return format_html('<img src="{}" alt="{}" class="{}">', settings.MEDIA_URL + PLACEHOLDER, alt, css_class)
+
+    variants = product.image_variants
+    fallback = pick_variant(variants, product.image.name, size)
+    if fallback is None:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', product.image.url, alt, css_class)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}" srcset="{}" sizes="{}px" alt="{}" class="{}" loading="lazy"></picture>',
+        srcset(variants, "webp"), size,
+        default_storage.url(fallback["jpeg"]), srcset(variants, "jpeg"), size, alt, css_class,
+    )
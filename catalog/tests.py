@@ -1,3 +1,760 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from catalog.candles import apply_changes, rebuild_candles
+from catalog.importer import iter_json_array
+from catalog.models import Category, PriceCandle, PriceHistory, Product
+from catalog.retention import prune_price_history
+from catalog.scheduler import acquire_lease, next_due_at, release_lease
+from catalog.services import due_partitions, run_price_tick, run_price_tick_bulk, run_price_tick_parallel
+
+
+class PriceTickTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.now = timezone.now()
+        past = self.now - timedelta(minutes=1)
+        for i in range(25):
+            Product.objects.create(
+                title=f"Юла {i}", slug=f"yula-{i}", category=cat,
+                price=Decimal("100.00") + i, next_change_at=past,
+                # часть товаров упирается в границы — цена может не измениться
+                max_price=Decimal("100.00") if i % 5 == 0 else Decimal("10000.00"),
+            )
+        self.initial = {p.id: p.price for p in Product.objects.all()}
+        self.past = past
+
+    def _snapshot(self):
+        prices = dict(Product.objects.values_list("id", "price"))
+        history = sorted(PriceHistory.objects.values_list("product_id", "old_price", "new_price"))
+        return prices, history
+
+    def _reset(self):
+        PriceHistory.objects.all().delete()
+        for pk, price in self.initial.items():
+            Product.objects.filter(pk=pk).update(price=price, next_change_at=self.past)
+
+    def test_bulk_tick_matches_per_row_tick(self):
+        changed = run_price_tick(now=self.now, rng=random.Random(42))
+        expected = self._snapshot()
+        self._reset()
+
+        chunks = []
+        bulk_changed = run_price_tick_bulk(
+            now=self.now, chunk_size=7, rng=random.Random(42), on_chunk=chunks.append
+        )
+
+        self.assertEqual(bulk_changed, changed)
+        self.assertEqual(self._snapshot(), expected)
+        self.assertEqual([c.processed for c in chunks], [7, 7, 7, 4])
+        self.assertFalse(Product.objects.filter(next_change_at__lte=self.now).exists())
+
+    def test_bulk_tick_stops_between_chunks(self):
+        import threading
+
+        stop = threading.Event()
+        chunks = []
+
+        def on_chunk(stats):
+            chunks.append(stats)
+            stop.set()  # сигнал пришёл во время первой пачки
+
+        run_price_tick_bulk(now=self.now, chunk_size=7, on_chunk=on_chunk, stop=stop)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(Product.objects.filter(next_change_at__lte=self.now).count(), 18)
+
+    def test_parallel_tick_covers_every_partition(self):
+        parts = due_partitions(self.now, 4)
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(sum(Product.objects.filter(**f).count() for f in parts), 25)
+        self.assertEqual(len(due_partitions(self.now, 4, by="category")), 1)
+
+        done = []
+        changed = run_price_tick_parallel(
+            now=self.now, workers=4, seed=1, on_partition=lambda i, c, s: done.append(i)
+        )
+        self.assertEqual(done, [0, 1, 2, 3])
+        self.assertEqual(PriceHistory.objects.count(), changed)
+        self.assertFalse(Product.objects.filter(next_change_at__lte=self.now).exists())
+
+
+class PriceSchedulerTests(TestCase):
+    def test_next_due_at_and_single_lease(self):
+        self.assertIsNone(next_due_at())
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        soon = timezone.now() + timedelta(minutes=5)
+        Product.objects.create(title="Юла", slug="yula", category=cat, next_change_at=soon)
+        Product.objects.create(title="Мяч", slug="ball", category=cat)
+        self.assertEqual(next_due_at(), soon)
+
+        ttl = timedelta(minutes=1)
+        self.assertTrue(acquire_lease("tick", "a", ttl))
+        self.assertTrue(acquire_lease("tick", "a", ttl))  # продление своей аренды
+        self.assertFalse(acquire_lease("tick", "b", ttl))
+        # просроченную аренду можно перехватить
+        self.assertTrue(acquire_lease("tick", "b", ttl, now=timezone.now() + timedelta(minutes=2)))
+        release_lease("tick", "b")
+        self.assertTrue(acquire_lease("tick", "a", ttl))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.toys = Category.objects.create(name="Игрушки", slug="toy")
+        books = Category.objects.create(name="Книги", slug="books")
+        self.yula = Product.objects.create(title="Юла деревянная", category=self.toys, is_approved=True)
+        self.book = Product.objects.create(
+            title="Сказки", description="Книга про деревянную юлу", category=books, is_approved=True
+        )
+
+    def _search(self, q):
+        from catalog.search import search_products
+        return list(search_products(Product.objects.all(), q))
+
+    def test_ranks_title_above_description_and_stems(self):
+        self.assertEqual(self._search("деревянные"), [self.yula, self.book])
+        self.assertEqual(self._search("игрушка"), [self.yula])  # по названию категории
+        self.assertEqual(self._search("робот"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.yula.title = "Волчок"
+        self.yula.save()
+        self.assertEqual(self._search("волчок"), [self.yula])
+        self.toys.name = "Сувениры"
+        self.toys.save()
+        self.assertEqual(self._search("сувенир"), [self.yula])
+        self.book.delete()
+        self.assertEqual(self._search("сказки"), [])
+
+    def test_catalog_view_uses_search(self):
+        resp = self.client.get("/catalog/", {"q": "юла"})
+        self.assertEqual(list(resp.context["object_list"]), [self.yula, self.book])
+
+    def test_result_limit_applies_after_visibility_and_category(self):
+        for i in range(3):  # черновики с совпадением в названии — выше по релевантности
+            Product.objects.create(title=f"Сказки {i}", category=self.toys)
+            Product.objects.create(title=f"Сказки и книги {i}", category=self.book.category)
+        with self.settings(SEARCH_MAX_RESULTS=2):
+            resp = self.client.get("/catalog/", {"q": "сказки"})
+            self.assertEqual(list(resp.context["object_list"]), [self.book])
+            resp = self.client.get("/catalog/", {"q": "сказки", "category": "books"})
+            self.assertEqual(list(resp.context["object_list"]), [self.book])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        # одинаковые названия проверяют тай-брейк по id
+        for i in range(7):
+            Product.objects.create(title=f"Юла {i // 2}", category=cat, is_approved=True)
+
+    def test_forward_and_backward_pages(self):
+        from mini_market.pagination import CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.all(), 3, ("title", "id"), count_cap=5)
+        expected = list(Product.objects.order_by("title", "id"))
+
+        first = paginator.page(None)
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(first.object_list + second.object_list + third.object_list, expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(back.object_list, second.object_list)
+        self.assertEqual(paginator.page(back.previous_cursor).object_list, first.object_list)
+        self.assertEqual((paginator.count, paginator.count_truncated), (5, True))
+
+    def test_catalog_view_with_cursor(self):
+        cat = Category.objects.get()
+        for i in range(5):
+            Product.objects.create(title=f"Мяч {i}", category=cat, is_approved=True)
+        with self.settings(CURSOR_PAGINATION=True):
+            page = self.client.get("/catalog/").context["page_obj"]
+            self.assertEqual(len(page), 10)
+            resp = self.client.get("/catalog/", {"cursor": page.next_cursor})
+            self.assertEqual(len(resp.context["page_obj"]), 2)
+            self.assertContains(resp, "?cursor=")
+            self.assertEqual(self.client.get("/catalog/", {"cursor": "мусор"}).status_code, 404)
+
+
+class CatalogListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.author = get_user_model().objects.create_user("author", password="x")
+        self.yula = Product.objects.create(title="Юла", category=self.cat, is_approved=True)
+        self.draft = Product.objects.create(title="Черновик", category=self.cat, created_by=self.author)
+
+    def test_second_hit_is_served_from_cache(self):
+        self.assertContains(self.client.get("/catalog/"), "Юла")
+        with self.assertNumQueries(1):  # только чтение версии каталога
+            self.assertContains(self.client.get("/catalog/"), "Юла")
+
+    def test_invalidated_by_product_save_and_tick(self):
+        self.client.get("/catalog/")
+        self.yula.title = "Волчок"
+        self.yula.save()
+        self.assertContains(self.client.get("/catalog/"), "Волчок")
+
+        Product.objects.filter(pk=self.yula.pk).update(next_change_at=timezone.now())
+        run_price_tick_bulk(rng=random.Random(1))
+        self.yula.refresh_from_db()
+        self.assertContains(self.client.get("/catalog/"), f"{self.yula.price} мон.".replace(".", ",", 1))
+
+    def test_drafts_stay_in_owner_cache(self):
+        self.assertNotContains(self.client.get("/catalog/"), "Черновик")
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get("/catalog/"), "Черновик")
+        self.client.logout()
+        self.assertNotContains(self.client.get("/catalog/"), "Черновик")
+
+
+class CategoryStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.toys = Category.objects.create(name="Игрушки", slug="toy")
+        self.books = Category.objects.create(name="Книги", slug="books")
+
+    def _stats(self, cat):
+        cat.refresh_from_db()
+        return cat.approved_count, cat.total_stock, cat.min_price, cat.max_price
+
+    def test_counters_follow_saves_moves_and_ticks(self):
+        p = Product.objects.create(title="Юла", category=self.toys, price=Decimal("5.00"), stock=3)
+        self.assertEqual(self._stats(self.toys), (0, 0, None, None))
+
+        p.is_approved = True
+        p.save()
+        Product.objects.create(title="Мяч", category=self.toys, price=Decimal("9.00"), stock=4, is_approved=True)
+        self.assertEqual(self._stats(self.toys), (2, 7, Decimal("5.00"), Decimal("9.00")))
+
+        p.category = self.books
+        p.save()
+        self.assertEqual(self._stats(self.toys), (1, 4, Decimal("9.00"), Decimal("9.00")))
+        self.assertEqual(self._stats(self.books), (1, 3, Decimal("5.00"), Decimal("5.00")))
+
+        Product.objects.filter(pk=p.pk).update(next_change_at=timezone.now(), price=Decimal("50.00"))
+        run_price_tick_bulk(rng=random.Random(3))
+        p.refresh_from_db()
+        self.assertEqual(self._stats(self.books), (1, 3, p.price, p.price))
+
+    def test_navigation_is_cached(self):
+        Product.objects.create(title="Юла", category=self.toys, is_approved=True)
+        self.client.get("/catalog/")
+        with self.assertNumQueries(1):
+            resp = self.client.get("/catalog/")
+        self.assertContains(resp, "Игрушки (1)")
+        self.assertContains(resp, "Книги (0)")
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+
+    def test_single_query_from_max_suffix(self):
+        from catalog.slugs import _max_suffixes, allocate_slug
+
+        for _ in range(5):
+            Product.objects.create(title="Юла", category=self.cat)
+        self.assertEqual(
+            sorted(Product.objects.values_list("slug", flat=True)),
+            ["item", "item-2", "item-3", "item-4", "item-5"],
+        )
+        Product.objects.filter(slug="item-3").delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_slug("Юла"), "item-6")  # дыры не заполняем
+        # slug с тем же префиксом, но другой базой, не считаются
+        Product.objects.filter(slug="item-5").update(slug="items-5")
+        Product.objects.filter(slug="item-4").update(slug="item-4-toy")
+        self.assertEqual(_max_suffixes(["item"]), {"item": 2})
+
+    def test_bulk_create_assigns_unique_slugs(self):
+        from catalog.services import bulk_create_products
+
+        Product.objects.create(title="Ball", category=self.cat)
+        created = bulk_create_products(
+            [Product(title="Ball", category=self.cat, is_approved=True) for _ in range(3)]
+            + [Product(title="Ball 2", category=self.cat)]
+        )
+        self.assertEqual([p.slug for p in created], ["ball-2", "ball-3", "ball-4", "ball-2-2"])
+        self.assertEqual(Product.objects.count(), 5)
+        self.cat.refresh_from_db()
+        self.assertEqual(self.cat.approved_count, 3)
+
+    def test_save_retries_on_slug_race(self):
+        from unittest import mock
+
+        Product.objects.create(title="Ball", category=self.cat)
+        # имитируем гонку: аллокатор сначала выдаёт уже занятый slug
+        with mock.patch("catalog.slugs.allocate_slug", side_effect=["ball", "ball-2"]):
+            p = Product.objects.create(title="Ball", category=self.cat)
+        self.assertEqual(p.slug, "ball-2")
+
+
+class CatalogImportTests(TestCase):
+    def _write(self, name, text):
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d, ignore_errors=True)
+        path = os.path.join(d, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _records(self, price="10.00"):
+        return [
+            {"model": "catalog.category", "pk": 7, "fields": {"name": "Игрушки", "slug": "toys"}},
+            {"model": "catalog.product", "pk": 70,
+             "fields": {"title": "Юла", "slug": "yula", "category": 7, "price": price, "stock": 3}},
+            {"model": "catalog.product", "pk": 71,
+             "fields": {"title": "Ball", "category": 7, "price": "5.00", "stock": 1}},
+        ]
+
+    def test_json_stream_upserts_in_batches(self):
+        # мелкий буфер: значения режутся на границах чтения
+        path = self._write("seed.json", json.dumps(self._records(), ensure_ascii=False, indent=2))
+        with open(path, encoding="utf-8") as fp:
+            self.assertEqual(list(iter_json_array(fp, read_size=7)), self._records())
+
+        call_command("import_catalog", path, "--batch-size", "2", stdout=io.StringIO())
+        self.assertEqual(Product.objects.get(pk=70).price, Decimal("10.00"))
+        self.assertEqual(Product.objects.get(pk=71).slug, "ball")
+        self.assertEqual(Category.objects.get(pk=7).approved_count, 0)
+
+        # повторный импорт обновляет, а не дублирует; slug без указания сохраняется
+        path = self._write("seed.jsonl", "\n".join(
+            json.dumps(r, ensure_ascii=False) for r in self._records(price="12.50")
+        ))
+        call_command("import_catalog", path, stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Product.objects.get(pk=70).price, Decimal("12.50"))
+        self.assertEqual(Product.objects.get(pk=71).slug, "ball")
+
+    def test_dry_run_and_bad_reference(self):
+        path = self._write("seed.json", json.dumps(self._records()))
+        out = io.StringIO()
+        call_command("import_catalog", path, "--dry-run", stdout=out)
+        self.assertIn("товаров 2", out.getvalue())
+        self.assertFalse(Product.objects.exists())
+
+        bad = self._records()[1:]
+        path = self._write("bad.json", json.dumps(bad))
+        with self.assertRaisesMessage(CommandError, "Запись №1"):
+            call_command("import_catalog", path, stdout=io.StringIO())
+
+
+class PriceCandleTests(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.p = Product.objects.create(
+            title="Юла", slug="yula", category=self.cat, price=Decimal("100.00"), is_approved=True,
+        )
+
+    def _history(self, moment, old, new):
+        h = PriceHistory.objects.create(product=self.p, old_price=Decimal(old), new_price=Decimal(new))
+        PriceHistory.objects.filter(pk=h.pk).update(changed_at=moment)
+        h.changed_at = moment
+        return h
+
+    def test_incremental_matches_rebuild(self):
+        base = timezone.make_aware(timezone.datetime(2026, 3, 1, 10, 5))
+        steps = [(0, "100", "110"), (20, "110", "90"), (70, "90", "95"), (60 * 24, "95", "120")]
+        for minutes, old, new in steps:
+            apply_changes([self._history(base + timedelta(minutes=minutes), old, new)])
+
+        def dump():
+            return list(PriceCandle.objects.order_by("resolution", "bucket").values_list(
+                "resolution", "open", "high", "low", "close", "changes"))
+
+        incremental = dump()
+        self.assertIn(("day", Decimal("100"), Decimal("110"), Decimal("90"), Decimal("95"), 3), incremental)
+        self.assertIn(("hour", Decimal("100"), Decimal("110"), Decimal("90"), Decimal("90"), 2), incremental)
+        self.assertEqual(rebuild_candles(chunk_size=2), 5)
+        self.assertEqual(dump(), incremental)
+
+    def test_tick_writes_candles_and_endpoint_respects_visibility(self):
+        Product.objects.filter(pk=self.p.pk).update(next_change_at=timezone.now() - timedelta(minutes=1))
+        run_price_tick_bulk(rng=random.Random(1))
+        candle = PriceCandle.objects.get(product=self.p, resolution="hour")
+        self.assertEqual(candle.close, Product.objects.get(pk=self.p.pk).price)
+
+        data = self.client.get(f"/catalog/{self.p.slug}/candles/").json()
+        self.assertEqual(data["candles"][0]["c"], str(candle.close))
+        self.assertEqual(self.client.get(f"/catalog/{self.p.slug}/candles/?resolution=week").status_code, 400)
+
+        Product.objects.filter(pk=self.p.pk).update(is_approved=False)
+        self.assertEqual(self.client.get(f"/catalog/{self.p.slug}/candles/").status_code, 404)
+
+    def test_prune_keeps_daily_summary(self):
+        now = timezone.now()
+        old_day = now - timedelta(days=40)
+        # «старая» история без свечей и одна свежая запись со свечами
+        for minutes, old, new in [(0, "100", "80"), (5, "80", "130"), (10, "130", "120")]:
+            self._history(old_day + timedelta(minutes=minutes), old, new)
+        apply_changes([self._history(now, "120", "121")])
+        apply_changes([self._history(old_day, "1", "2")])  # часовая свеча за старый день
+        PriceHistory.objects.filter(old_price=Decimal("1")).delete()
+
+        stats = prune_price_history(days=30, batch_size=2)
+        self.assertEqual(stats.history_deleted, 3)
+        self.assertEqual(stats.candles_deleted, 1)
+        self.assertEqual(list(PriceHistory.objects.values_list("new_price", flat=True)), [Decimal("121")])
+        day = PriceCandle.objects.get(resolution="day", bucket__lt=stats.cutoff)
+        self.assertEqual(
+            (day.open, day.high, day.low, day.close, day.changes),
+            (Decimal("100"), Decimal("130"), Decimal("80"), Decimal("120"), 3),
+        )
+        # повторный запуск ничего не меняет
+        self.assertEqual(prune_price_history(days=30).history_deleted, 0)
+        self.assertEqual(PriceCandle.objects.get(pk=day.pk).changes, 3)
+
+    def test_rebuild_after_prune_keeps_compacted_days(self):
+        now = timezone.now()
+        for days in (50, 45, 40):
+            apply_changes([self._history(now - timedelta(days=days), "100", str(100 + days))])
+        apply_changes([self._history(now, "140", "141")])
+        prune_price_history(days=30)
+
+        rebuild_candles()
+        daily = PriceCandle.objects.filter(product=self.p, resolution="day").order_by("bucket")
+        self.assertEqual([c.close for c in daily], [Decimal("150"), Decimal("145"), Decimal("140"), Decimal("141")])
+        self.assertEqual(PriceCandle.objects.filter(resolution="hour").count(), 1)
+
+
+class ProductImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media, BACKGROUND_TASKS_SYNC=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+
+    def _png(self, color="red"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("RGBA", (600, 300), color).save(buf, format="PNG")
+        return SimpleUploadedFile("ball.png", buf.getvalue(), content_type="image/png")
+
+    def test_variants_built_after_commit_and_used_by_tag(self):
+        from django.template import Context, Template
+
+        tag = Template("{% load catalog_images %}{% product_image p 128 'x' %}")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            p = Product.objects.create(title="Ball", category=self.cat, image=self._png())
+        # пока варианты не собраны — отдаём оригинал
+        self.assertIn(p.image.url, tag.render(Context({"p": p})))
+
+        for callback in callbacks:
+            callback()
+        p.refresh_from_db()
+        self.assertEqual(sorted(p.image_variants["sizes"]), ["128", "40", "480"])
+        self.assertEqual(p.image_variants["sizes"]["128"]["width"], 128)
+        html = tag.render(Context({"p": p}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-128.jpg"', html)
+        self.assertIn("480w", html)
+
+        # та же картинка — те же файлы; сохранение без image вариантов не трогает
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            p.save(update_fields=["price"])
+        self.assertEqual(callbacks, [])
+        call_command("build_image_variants", "--force", stdout=io.StringIO())
+        p2 = Product.objects.get(pk=p.pk)
+        self.assertEqual(p2.image_variants["sizes"], p.image_variants["sizes"])
+
+
+class QRCodeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.products = [
+            Product.objects.create(title=f"Ball {i}", category=self.cat, is_approved=True) for i in range(3)
+        ]
+
+    def test_batch_generation_is_incremental(self):
+        from unittest import mock
+
+        from catalog import qr
+
+        self.assertEqual(qr.generate_qrcodes(workers=2, chunk_size=2), 3)
+        names = set(Product.objects.values_list("qrcode", flat=True))
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(n.startswith("qrcodes/") for n in names))
+
+        with mock.patch("catalog.qr.encode_png") as encode:
+            self.assertEqual(qr.generate_qrcodes(), 0)
+            p = self.products[0]
+            p.slug = "renamed"
+            p.save(update_fields=["slug"])
+            encode.return_value = b"png"
+            self.assertEqual(qr.generate_qrcodes(), 1)
+        self.assertEqual(encode.call_count, 1)
+
+        out = os.path.join(tempfile.mkdtemp(), "labels.html")
+        self.addCleanup(shutil.rmtree, os.path.dirname(out), ignore_errors=True)
+        call_command("generate_qrcodes", "--category", "toy", "--labels", out, stdout=io.StringIO())
+        with open(out, encoding="utf-8") as f:
+            self.assertEqual(f.read().count("data:image/png;base64,"), 3)
+
+    def test_svg_view_is_cacheable(self):
+        url = f"/catalog/{self.products[0].slug}/qr.svg"
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(b"<svg", r.content)
+        self.assertIn("immutable", r["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=r["ETag"]).status_code, 304)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.p = Product.objects.create(title="Юла", slug="yula", category=cat, is_approved=True,
+                                        next_change_at=timezone.now() - timedelta(minutes=1))
+        self.user = get_user_model().objects.create_user("ann", password="x")
+
+    def _revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_unchanged_pages_get_304(self):
+        for url in ("/catalog/", "/catalog/yula/"):
+            first, again = self._revalidate(url)
+            self.assertEqual(again.status_code, 304, url)
+            self.assertIn("no-cache", again["Cache-Control"])
+
+            # тик меняет цену без updated_at — валидатор всё равно меняется
+            Product.objects.filter(pk=self.p.pk).update(next_change_at=timezone.now() - timedelta(minutes=1))
+            run_price_tick_bulk(rng=random.Random(3))
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200, url)
+
+    def test_validators_are_per_viewer(self):
+        anon, _ = self._revalidate("/catalog/yula/")
+        self.client.force_login(self.user)
+        mine = self.client.get("/catalog/yula/", HTTP_IF_NONE_MATCH=anon["ETag"])
+        self.assertEqual(mine.status_code, 200)
+        self.assertIn("private", mine["Cache-Control"])
+
+        # черновик: чужим — 404 даже с валидатором автора
+        draft = Product.objects.create(title="Мяч", slug="ball", category=self.p.category, created_by=self.user)
+        etag = self.client.get(draft.get_absolute_url())["ETag"]
+        self.client.logout()
+        self.assertEqual(self.client.get(draft.get_absolute_url(), HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Игрушки", slug="toy")
+        self.items = [
+            Product.objects.create(title=f"Юла {i}", slug=f"yula-{i}", category=self.cat, is_approved=True)
+            for i in range(5)
+        ]
+        owner = get_user_model().objects.create_user("ann", password="x")
+        self.draft = Product.objects.create(title="Черновик", slug="draft", category=self.cat, created_by=owner)
+
+    def test_ids_fields_and_visibility(self):
+        ids = f"{self.items[1].id},{self.draft.id},999"
+        data = self.client.get(f"/api/v1/products/?ids={ids}&fields=id,price").json()
+        self.assertEqual(data["results"], [{"id": self.items[1].id, "price": "10.00"}])
+        self.assertEqual(data["missing"], [self.draft.id, 999])
+        self.assertEqual(self.client.get("/api/v1/products/?fields=secret").status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/products/?ids=99999999999999999999999").status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/products/?ids=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/products/draft/").status_code, 404)
+
+    def test_cursor_etag_and_changed_since(self):
+        page = self.client.get("/api/v1/products/?limit=3&fields=id").json()
+        rest = self.client.get(f"/api/v1/products/?limit=3&fields=id&cursor={page['next']}").json()
+        self.assertEqual([r["id"] for r in page["results"] + rest["results"]], [p.id for p in self.items])
+        self.assertIsNone(rest["next"])
+
+        first = self.client.get("/api/v1/products/?fields=id,price")
+        self.assertEqual(self.client.get("/api/v1/products/?fields=id,price",
+                                         HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        since = first.json()["server_time"]
+        Product.objects.filter(pk=self.items[2].pk).update(next_change_at=timezone.now())
+        run_price_tick_bulk(rng=random.Random(5))
+        delta = self.client.get("/api/v1/products/", {"changed_since": since, "fields": "id"}).json()
+        self.assertEqual(delta["results"], [{"id": self.items[2].id}])
+        bad = self.client.get("/api/v1/products/", {"changed_since": "2024-13-45T00:00:00"})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_admin_approval_shows_up_in_changed_since(self):
+        from catalog.admin import approve_products
+
+        since = self.client.get("/api/v1/products/?fields=id").json()["server_time"]
+        approve_products(None, None, Product.objects.filter(pk=self.draft.pk))
+        delta = self.client.get("/api/v1/products/", {"changed_since": since, "fields": "id"}).json()
+        self.assertEqual(delta["results"], [{"id": self.draft.id}])
+
+
+class ExportTests(TestCase):
+    def test_export_command_streams_jsonl_with_filters(self):
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        Product.objects.create(title="Юла", slug="yula", category=cat, price=Decimal("9.50"))
+        Product.objects.create(title="Мяч", slug="ball", category=cat)
+        Product.objects.filter(slug="ball").update(updated_at=timezone.now() - timedelta(days=30))
+
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d, ignore_errors=True)
+        out = os.path.join(d, "products.jsonl")
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        call_command("export_data", "products", "--format", "jsonl", "--from", since, "-o", out)
+        with open(out, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([(r["slug"], r["price"], r["category"]) for r in rows], [("yula", "9.50", "toy")])
+
+        with self.assertRaises(CommandError):
+            call_command("export_data", "secrets", "-o", out)
+
+
+class ModerationTests(TestCase):
+    def test_claim_diff_and_set_based_actions(self):
+        User = get_user_model()
+        staff = User.objects.create_superuser("boss", password="pw")
+        student = User.objects.create_user("kid", password="pw")
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        claimed = Product.objects.create(title="Юла", category=cat, description="старое", is_approved=True)
+        fresh = [Product.objects.create(title=f"Мяч {i}", category=cat) for i in range(3)]
+
+        self.client.force_login(student)
+        self.client.post(f"/catalog/products/{claimed.pk}/claim/", {"description": "новое"})
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.pending_changes, {"description": {"old": "старое", "new": "новое"}})
+
+        self.client.force_login(staff)
+        resp = self.client.get("/catalog/moderation/")
+        self.assertContains(resp, "старое")
+        self.assertEqual(len(resp.context["object_list"]), 4)
+
+        # сессия и пользователь, затем один UPDATE товаров и один сброс кэша/счётчиков — не зависит от числа товаров
+        with self.assertNumQueries(11):
+            self.client.post("/catalog/moderation/", {"action": "approve", "ids": [claimed.pk, fresh[0].pk]})
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.created_by, claimed.pending_owner, claimed.is_approved), (student, None, True))
+        self.assertEqual(claimed.pending_changes, {})
+        cat.refresh_from_db()
+        self.assertEqual(cat.approved_count, 2)
+
+        # «вся очередь» — только ожидающие: одобренные выше не трогаются
+        self.client.post("/catalog/moderation/", {"action": "reject", "all": "1"})
+        self.assertEqual(set(Product.objects.filter(is_approved=True)), {claimed, fresh[0]})
+
+
+class MarketEventTests(TestCase):
+    def test_tick_and_trades_feed_the_outbox_and_stream_resumes(self):
+        from asgiref.sync import async_to_sync
+
+        from catalog import events
+        from catalog.models import MarketEvent
+        from trade.services import buy_product
+
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        other = Category.objects.create(name="Книги", slug="books")
+        p = Product.objects.create(title="Юла", category=cat, is_approved=True, price=Decimal("50.00"), stock=5)
+        book = Product.objects.create(title="Книга", category=other, is_approved=True, stock=5)
+        Product.objects.create(title="Черновик", category=cat, stock=5)  # черновики в ленту не попадают
+        Product.objects.update(next_change_at=timezone.now())
+        run_price_tick_bulk(rng=random.Random(1))
+        user = get_user_model().objects.create_user("ann", password="x")
+        buy_product(user, p.id, 2)
+
+        kinds = list(MarketEvent.objects.values_list("product_id", "kind", "stock"))
+        self.assertEqual(kinds, [(p.id, "price", 5), (book.id, "price", 5), (p.id, "stock", 3)])
+        first = MarketEvent.objects.first()
+
+        async def resume():
+            stream = events.hub.stream(category_ids=[cat.id], last_event_id=first.id)
+            chunks = [await stream.__anext__() for _ in range(2)]
+            await stream.aclose()
+            await events.hub._task
+            return chunks
+
+        with self.settings(MARKET_EVENTS_POLL_SECONDS=0.01):
+            retry, missed = async_to_sync(resume)()
+        self.assertTrue(retry.startswith("retry:"))
+        self.assertIn("event: stock", missed)
+        self.assertIn('"stock": 3', missed)
+
+        MarketEvent.objects.filter(id=first.id).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(events.prune_events(), 1)
+        call_command("prune_market_events", minutes=0, stdout=io.StringIO())
+        self.assertFalse(MarketEvent.objects.exists())
+
+    def test_stream_is_off_under_wsgi_and_by_default(self):
+        cache.clear()
+        self.assertNotContains(self.client.get("/catalog/"), "live_prices.js")
+        self.assertEqual(self.client.get("/catalog/events/").status_code, 204)
+        with self.settings(LIVE_EVENTS_ENABLED=True):
+            cache.clear()
+            self.assertContains(self.client.get("/catalog/"), "live_prices.js")
+            # тестовый клиент — WSGI: бесконечный поток здесь не отдаём
+            self.assertEqual(self.client.get("/catalog/events/").status_code, 204)
+
+
+class PriceSnapshotTests(TestCase):
+    def setUp(self):
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d, ignore_errors=True)
+        override = self.settings(PRICE_SNAPSHOT_PATH=os.path.join(d, "prices.bin"))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_rebuilt_by_tick_patched_by_trades_and_read_without_queries(self):
+        from catalog import snapshot
+        from trade.services import buy_product
+
+        cat = Category.objects.create(name="Игрушки", slug="toy")
+        p = Product.objects.create(title="Юла", category=cat, is_approved=True, price=Decimal("12.50"), stock=5)
+        draft = Product.objects.create(title="Черновик", category=cat, stock=5)
+        self.assertEqual(snapshot.read([p.id]), {})  # ещё не собран
+
+        Product.objects.update(next_change_at=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            run_price_tick_bulk(rng=random.Random(1))
+        p.refresh_from_db()
+        draft.refresh_from_db()
+        generation = snapshot.generation()
+        with self.assertNumQueries(0):
+            self.assertEqual(snapshot.read([p.id, draft.id, 10_000]),
+                             {p.id: (p.price, 5, True), draft.id: (draft.price, 5, False)})
+
+        user = get_user_model().objects.create_user("ann", password="x")
+        with self.captureOnCommitCallbacks(execute=True):
+            buy_product(user, p.id, 2)
+        self.assertEqual(snapshot.read([p.id])[p.id][1], 3)
+        self.assertEqual(snapshot.generation(), generation)  # правка на месте
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(f"/api/v1/products/?ids={p.id}&fields=id,price,stock")
+        self.assertEqual(resp.json()["results"], [{"id": p.id, "price": str(p.price), "stock": 3}])
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("build_price_snapshot", stdout=io.StringIO())
+        self.assertEqual(snapshot.generation(), generation + 1)
+        self.assertEqual(snapshot.read([p.id])[p.id][1], 3)
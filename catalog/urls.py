@@ -8,10 +8,14 @@ urlpatterns = [
     path("", CatalogListView.as_view(), name="list"),
     path("new/", ProductCreateView.as_view(), name="create"),
     path("mine/", MyProductsView.as_view(), name="my"),
-    path("<slug:slug>/", ProductDetailView.as_view(), name="detail"),
     path("tick/", price_tick_view, name="tick"),
+    path("events/", views.market_events_view, name="events"),
+    path("moderation/", views.moderation_queue_view, name="moderation"),
+    path("submitted/", views.SubmittedView.as_view(), name="submitted"),  # до <slug>/, иначе 404
+    path("<slug:slug>/candles/", views.product_candles_view, name="candles"),
+    path("<slug:slug>/qr.svg", views.product_qr_svg_view, name="qr_svg"),
+    path("<slug:slug>/", ProductDetailView.as_view(), name="detail"),
     path("products/<int:pk>/claim/", claim_product, name="claim"),
-path("submitted/", views.SubmittedView.as_view(), name="submitted"),
 ]
 
 
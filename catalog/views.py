@@ -1,28 +1,76 @@
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView, DetailView, CreateView
 
+from mini_market.conditional import conditional_page, page_etag
+from mini_market.pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+
+from . import cache as catalog_cache, events, moderation, qr
 from .forms import ProductStudentForm
-from .models import Product, Category
-from .services import run_price_tick
+from .models import Category, PriceCandle, Product
+from .search import search_products
+from .services import run_price_tick_bulk
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from .models import Product
 from .forms import ProductClaimForm
 
 
-class CatalogListView(ListView):
+def _catalog_versions(request) -> dict:
+    # один запрос на запрос: нужен и для ETag, и для ключа кэша
+    if not hasattr(request, "_catalog_versions"):
+        request._catalog_versions = catalog_cache.get_versions(catalog_cache.CATALOG, catalog_cache.CATEGORIES)
+    return request._catalog_versions
+
+
+def _listing_etag(request, *args, **kwargs):
+    versions = _catalog_versions(request)
+    return page_etag(request, "list", versions, sorted(request.GET.lists()))
+
+
+def _detail_etag(request, slug):
+    # тик и сделки пишут price/stock без updated_at — берём их напрямую
+    meta = (Product.objects.visible_to(request.user)
+            .filter(slug=slug)
+            .values_list("id", "updated_at", "last_edited_at", "price", "stock", "pending_owner_id")
+            .first())
+    if meta is None:
+        return None  # 404 отдаст сама view
+    return page_etag(request, "detail", meta, _catalog_versions(request)[catalog_cache.CATALOG])
+
+
+@method_decorator(conditional_page(_listing_etag), name="get")
+class CatalogListView(CursorPaginationMixin, ListView):
     template_name = "catalog/list.html"
+    listing_template_name = "catalog/_listing.html"
     model = Product
     paginate_by = 10
+    cursor_ordering = ("title", "id")
+
+    def use_cursor_pagination(self):
+        # результаты поиска отсортированы по релевантности — листаем их обычными страницами
+        return super().use_cursor_pagination() and not self.request.GET.get("q")
 
     def get_queryset(self):
-        qs = Product.objects.select_related("category")
+        # правила видимости (staff видит всё) — до поиска: лимит лучших совпадений
+        # (SEARCH_MAX_RESULTS) не должны занимать чужие черновики
+        qs = Product.objects.select_related("category").visible_to(self.request.user)
 
         # фильтры по категории и поиску
         cat = self.request.GET.get("category")
@@ -30,45 +78,190 @@ class CatalogListView(ListView):
         if cat:
             qs = qs.filter(category__slug=cat)
         if q:
-            qs = qs.filter(title__icontains=q)
-
-        # правила видимости:
-        u = self.request.user
-        if not u.is_authenticated:
-            qs = qs.filter(is_approved=True)
-        elif not u.is_staff:
-            qs = qs.filter(Q(is_approved=True) | Q(created_by=u))
-        # staff видит всё
+            # полнотекстовый поиск; результаты упорядочены по релевантности
+            qs = search_products(qs, q)
         return qs
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx["categories"] = Category.objects.all()
-        ctx["curr_category"] = self.request.GET.get("category") or ""
-        ctx["q"] = self.request.GET.get("q") or ""
-        return ctx
+    def get_template_names(self):
+        # при попадании в кэш object_list не вычисляется — шаблон задан явно
+        return [self.template_name]
+
+    def get(self, request, *args, **kwargs):
+        # сетка товаров + пагинация кэшируются целиком по (версия, видимость, параметры)
+        versions = _catalog_versions(request)
+        key = catalog_cache.listing_cache_key(request, versions[catalog_cache.CATALOG])
+        listing = cache.get(key)
+        if listing is None:
+            self.object_list = self.get_queryset()
+            listing = render_to_string(self.listing_template_name, self.get_context_data(), request=request)
+            cache.set(key, listing, settings.CATALOG_CACHE_TIMEOUT)
+
+        # навигация со счётчиками — из кэша своей версии, без запросов к Category
+        categories = catalog_cache.category_nav(versions[catalog_cache.CATEGORIES])
 
+        return self.render_to_response({
+            "view": self,
+            "listing_html": mark_safe(listing),
+            "categories": categories,
+            "curr_category": request.GET.get("category") or "",
+            "q": request.GET.get("q") or "",
+            "live_events": settings.LIVE_EVENTS_ENABLED,
+        })
 
+
+@method_decorator(conditional_page(_detail_etag), name="get")
 class ProductDetailView(DetailView):
     template_name = "catalog/detail.html"
     model = Product
     slug_field = "slug"
     slug_url_kwarg = "slug"
 
-    # не даём смотреть чужие не-одобренные карточки
     def get_queryset(self):
-        qs = Product.objects.select_related("category")
-        u = self.request.user
-        if not u.is_authenticated:
-            return qs.filter(is_approved=True)
-        if u.is_staff:
-            return qs
-        return qs.filter(Q(is_approved=True) | Q(created_by=u))
+        # не даём смотреть чужие не-одобренные карточки
+        return Product.objects.visible_to(self.request.user).select_related("category")
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["live_events"] = settings.LIVE_EVENTS_ENABLED and self.object.is_approved
+        return ctx
+
+
+CANDLES_DEFAULT_RANGE = {PriceCandle.HOUR: timedelta(days=7), PriceCandle.DAY: timedelta(days=365)}
+CANDLES_MAX = 1000
+
+
+def _parse_moment(value):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def product_candles_view(request, slug):
+    """
+    Свечи цены товара в JSON: ?resolution=hour|day&from=...&to=... (ISO-дата или время).
+    По умолчанию — последние 7 дней часовых или 365 дней суточных свечей.
+    """
+    product = get_object_or_404(Product.objects.visible_to(request.user).only("id", "slug"), slug=slug)
+    resolution = request.GET.get("resolution", PriceCandle.HOUR)
+    if resolution not in CANDLES_DEFAULT_RANGE:
+        return JsonResponse({"error": "resolution: hour или day"}, status=400)
+    try:
+        end = _parse_moment(request.GET.get("to")) or timezone.now()
+        start = _parse_moment(request.GET.get("from")) or end - CANDLES_DEFAULT_RANGE[resolution]
+    except ValueError:
+        return JsonResponse({"error": "from/to: ожидается ISO-дата или время"}, status=400)
+
+    # последние CANDLES_MAX свечей диапазона, по возрастанию времени
+    rows = list(
+        PriceCandle.objects
+        .filter(product=product, resolution=resolution, bucket__gte=start, bucket__lte=end)
+        .order_by("-bucket")
+        .values_list("bucket", "open", "high", "low", "close", "changes")[:CANDLES_MAX]
+    )
+    rows.reverse()
+    return JsonResponse({
+        "product": product.slug,
+        "resolution": resolution,
+        "candles": [
+            {"t": bucket.isoformat(), "o": str(o), "h": str(h), "l": str(l), "c": str(c), "n": n}
+            for bucket, o, h, l, c, n in rows
+        ],
+    })
+
+
+QR_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def product_qr_svg_view(request, slug):
+    """
+    QR-код ссылки на товар в SVG. Содержимое зависит только от slug (он же в адресе),
+    поэтому ответ можно кэшировать «навсегда»; кодируется один раз (кэш Django).
+    """
+    product = get_object_or_404(Product.objects.visible_to(request.user).only("id", "slug", "is_approved"), slug=slug)
+    data = qr.product_url(product.slug)
+    etag = f'"{qr.qr_hash(data)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(qr.cached_svg(data), content_type="image/svg+xml")
+    response["ETag"] = etag
+    # черновики видны не всем — такие ответы не кладём в общие кэши
+    privacy = "public" if product.is_approved else "private"
+    response["Cache-Control"] = f"{privacy}, max-age={QR_MAX_AGE}, immutable"
+    return response
+
+
+EVENTS_MAX_IDS = 200
+
+
+def _event_scope(request):
+    """id товаров (?ids=1,2) и категорий (?category=slug) для подписки; видимость — как в каталоге."""
+    ids = [int(i) for i in request.GET.get("ids", "").split(",") if i.strip().isdigit()][:EVENTS_MAX_IDS]
+    product_ids = list(Product.objects.visible_to(request.user).filter(id__in=ids).values_list("id", flat=True))
+    slugs = [s for s in request.GET.get("category", "").split(",") if s]
+    category_ids = list(Category.objects.filter(slug__in=slugs).values_list("id", flat=True))
+    return product_ids, category_ids
+
+
+async def market_events_view(request):
+    """
+    SSE-поток изменений цены и остатка: ?ids=1,2,3 и/или ?category=slug,
+    без параметров — весь рынок. Переподключение с Last-Event-ID досылает пропущенное.
+    Только под ASGI и при LIVE_EVENTS_ENABLED: под WSGI бесконечный поток занял бы
+    рабочий поток навсегда — там 204, и EventSource больше не переподключается.
+    """
+    if not settings.LIVE_EVENTS_ENABLED or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    product_ids, category_ids = await sync_to_async(_event_scope)(request)
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    response = StreamingHttpResponse(
+        events.hub.stream(product_ids, category_ids, last_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx не должен копить поток
+    return response
+
+
+MODERATION_PAGE_SIZE = 50
+
+
+@permission_required("catalog.change_product")
+def moderation_queue_view(request):
+    """
+    Очередь модерации с правками заявок. POST action=approve|reject одобряет или
+    отклоняет выбранные товары (ids) либо всю очередь (all=1) одним UPDATE.
+    """
+    queue = moderation.moderation_queue()
+    if request.method == "POST":
+        action = {"approve": moderation.approve_pending, "reject": moderation.reject_pending}.get(
+            request.POST.get("action")
+        )
+        if action is None:
+            messages.error(request, "Неизвестное действие.")
+        else:
+            if request.POST.get("all") != "1":
+                queue = queue.filter(id__in=[i for i in request.POST.getlist("ids") if i.isdigit()])
+            n = action(queue)
+            messages.success(request, f"Обработано товаров: {n}.")
+        return redirect("catalog:moderation")
+
+    paginator = CursorPaginator(queue, MODERATION_PAGE_SIZE, ("-last_edited_at", "-id"), count_cap=1000)
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Неверный курсор страницы.")
+    return render(request, "catalog/moderation.html", {"page_obj": page, "object_list": page.object_list})
 
 
 @permission_required("catalog.can_tick_prices")
 def price_tick_view(request):
-    count = run_price_tick(now=timezone.now())
+    count = run_price_tick_bulk(now=timezone.now())
     messages.success(request, f"Цены обновлены у {count} товаров.")
     return redirect("catalog:list")
 
@@ -88,16 +281,17 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class MyProductsView(LoginRequiredMixin, ListView):
+class MyProductsView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = "catalog/my_products.html"
     model = Product
     paginate_by = 20
+    cursor_ordering = ("-updated_at", "-id")
 
     def get_queryset(self):
         return (Product.objects
                 .filter(created_by=self.request.user)
                 .select_related("category")
-                .order_by("-updated_at"))
+                .order_by("-updated_at", "-id"))
 
 
 
@@ -120,6 +314,7 @@ def claim_product(request, pk: int):
         form = ProductClaimForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
             p = form.save(commit=False)
+            moderation.record_pending_changes(p, form)
             p.is_approved = False
             p.pending_owner = request.user
             p.last_edited_by = request.user
@@ -0,0 +1,51 @@
+"""
+Фоновые задачи внутри процесса: задача ставится после коммита транзакции
+и выполняется в пуле потоков, не задерживая ответ пользователю.
+
+Очередь живёт в памяти процесса: при перезапуске недоделанные задачи теряются,
+поэтому у каждой задачи должна быть команда-«догонялка» (backfill).
+BACKGROUND_TASKS_SYNC=True выполняет задачи сразу после коммита (тесты, отладка).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix="background"
+            )
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Фоновая задача %s упала", getattr(fn, "__name__", fn))
+    finally:
+        # у потока пула своё соединение с БД — не оставляем его висеть
+        connection.close()
+
+
+def run_after_commit(fn, *args, **kwargs) -> None:
+    """Выполнить fn(*args, **kwargs) в фоне после успешного коммита текущей транзакции."""
+    def submit():
+        if settings.BACKGROUND_TASKS_SYNC:
+            fn(*args, **kwargs)
+        else:
+            _get_executor().submit(_run, fn, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,67 @@
+"""
+Условные GET-запросы (ETag) для страниц, собранных из данных и «шапки» пользователя.
+
+ETag страницы = хэш от переданных частей (метаданные из дешёвого запроса, версии
+кэша) и отпечатка зрителя: кто он и что видит (аноним / staff / id, права на тик),
+его баланс в шапке и CSRF-cookie, из которой собираются токены форм. Поэтому
+чужие черновики не «просачиваются» через общий валидатор, а после входа, сделки
+или смены cookie страница рендерится заново. Пока у пользователя есть
+непоказанные сообщения (messages), валидатор не выдаётся — страницу нужно отрисовать.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def has_pending_messages(request) -> bool:
+    # len() не помечает сообщения прочитанными
+    return bool(len(get_messages(request)))
+
+
+def viewer_fingerprint(request) -> list:
+    user = request.user
+    if not user.is_authenticated:
+        return ["anon"]
+    profile = getattr(user, "profile", None)
+    return [
+        f"user:{user.pk}",
+        user.is_staff,
+        user.has_perm("catalog.can_tick_prices"),
+        profile.balance if profile else None,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+    ]
+
+
+def page_etag(request, *parts) -> str | None:
+    """ETag страницы для зрителя request.user; None — отдать страницу целиком."""
+    if has_pending_messages(request):
+        return None
+    raw = repr([*parts, *viewer_fingerprint(request)])
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def conditional_page(etag_func):
+    """
+    Декоратор view: 304 без рендеринга, если ETag клиента совпал с etag_func(request, ...).
+    Ответ всегда перепроверяется (no-cache), для вошедших — только в браузере (private).
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ["Cookie"])
+            return response
+
+        return wrapper
+
+    return decorator
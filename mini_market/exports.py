@@ -0,0 +1,178 @@
+"""
+Потоковая выгрузка таблиц в CSV/JSONL (с gzip по желанию).
+
+Набор данных (Dataset) описывает queryset, колонки и поля для фильтров по датам
+и категории; приложения регистрируют свои наборы в exports.py (импортируется
+в AppConfig.ready). Строки читаются .iterator(chunk_size=...) — на PostgreSQL это
+серверный курсор — и сразу уходят клиенту пачками, так что память не зависит
+от размера таблицы, а первый байт отдаётся сразу.
+"""
+import csv
+import io
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_CHUNK_SIZE = 2000  # строк за одно чтение из БД и в одном куске ответа
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+DATASETS: dict = {}
+
+
+class ExportError(ValueError):
+    pass
+
+
+@dataclass
+class Dataset:
+    name: str
+    get_queryset: object  # () -> QuerySet
+    columns: list  # [(заголовок, путь для values_list)]
+    date_field: str | None = None
+    category_field: str | None = None  # путь до slug категории
+    description: str = ""
+    headers: list = field(init=False)
+
+    def __post_init__(self):
+        self.headers = [h for h, _ in self.columns]
+
+    def rows(self, date_from=None, date_to=None, category=None):
+        qs = self.get_queryset()
+        if date_from is not None:
+            qs = qs.filter(**{f"{self.date_field}__gte": date_from})
+        if date_to is not None:
+            qs = qs.filter(**{f"{self.date_field}__lt": date_to})
+        if category:
+            if not self.category_field:
+                raise ExportError(f"Набор {self.name} не фильтруется по категории.")
+            qs = qs.filter(**{self.category_field: category})
+        return (qs.order_by("pk")
+                .values_list(*[path for _, path in self.columns])
+                .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+
+
+def register(dataset: Dataset) -> Dataset:
+    DATASETS[dataset.name] = dataset
+    return dataset
+
+
+def get_dataset(name: str) -> Dataset:
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ExportError(f"Неизвестный набор {name!r}. Доступны: {', '.join(sorted(DATASETS))}")
+
+
+def parse_bound(value, end: bool = False):
+    """
+    Граница диапазона из ISO-даты или времени. Дата в конце диапазона включается
+    целиком (to=2026-01-31 — до начала 1 февраля).
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ExportError(f"Ожидается ISO-дата или время, получено {value!r}")
+            if end:
+                day = date.fromordinal(day.toordinal() + 1)
+            moment = datetime.combine(day, time.min)
+    except ExportError:
+        raise
+    except (ValueError, OverflowError) as e:
+        # формат верный, но дата несуществующая: 2026-13-01, 2026-02-30
+        raise ExportError(f"Несуществующая дата: {value!r}") from e
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(headers, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(headers)
+    yield buf.getvalue()  # заголовок — сразу, не дожидаясь первой пачки
+    buf.seek(0)
+    buf.truncate()
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(v) for v in row])
+        if n % EXPORT_CHUNK_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_jsonl(headers, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(headers, row))))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def iter_gzip(chunks):
+    """Сжимает поток байтов в gzip на лету."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset: Dataset, fmt: str = "csv", gzip: bool = False, **filters):
+    """Итератор байтов выгрузки: CSV (с заголовком) или JSONL, при gzip=True — сжатый."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Формат {fmt!r} не поддерживается: {', '.join(FORMATS)}")
+    rows = dataset.rows(**filters)
+    text = iter_csv(dataset.headers, rows) if fmt == "csv" else iter_jsonl(dataset.headers, rows)
+    chunks = (part.encode("utf-8") for part in text)
+    return iter_gzip(chunks) if gzip else chunks
+
+
+def export_filename(dataset: Dataset, fmt: str, gzip: bool) -> str:
+    return f"{dataset.name}-{timezone.localdate():%Y%m%d}.{fmt}" + (".gz" if gzip else "")
+
+
+@staff_member_required
+def export_view(request, name):
+    """
+    /exports/<набор>/?format=csv|jsonl&gzip=1&from=...&to=...&category=slug —
+    потоковая выгрузка для staff.
+    """
+    fmt = request.GET.get("format", "csv")
+    gzip = request.GET.get("gzip") in ("1", "true", "yes")
+    try:
+        dataset = get_dataset(name)
+        stream = export_stream(
+            dataset, fmt, gzip,
+            date_from=parse_bound(request.GET.get("from")),
+            date_to=parse_bound(request.GET.get("to"), end=True),
+            category=request.GET.get("category") or None,
+        )
+    except ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = StreamingHttpResponse(
+        stream, content_type="application/gzip" if gzip else f"{FORMATS[fmt]}; charset=utf-8"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(dataset, fmt, gzip)}"'
+    response["Cache-Control"] = "no-store"
+    return response
@@ -0,0 +1,93 @@
+"""
+Уменьшенные копии загруженных картинок (варианты) для отдачи в браузер.
+
+Имя варианта строится из хэша содержимого оригинала: одинаковый файл даёт те же
+имена, повторная сборка ничего не пересчитывает, а сами файлы можно кэшировать
+навсегда. Описание вариантов хранится в JSON-поле модели:
+
+    {"source": "products/ball.png", "hash": "3f2a…",
+     "sizes": {"128": {"width": 128, "webp": "variants/products/3f2a…-128.webp",
+                       "jpeg": "variants/products/3f2a…-128.jpg"}, …}}
+"""
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+QUALITY = {"webp": 80, "jpeg": 85}
+
+
+def content_hash(field_file) -> str:
+    h = hashlib.sha256()
+    field_file.open("rb")
+    try:
+        for chunk in field_file.chunks():
+            h.update(chunk)
+    finally:
+        field_file.close()
+    return h.hexdigest()[:20]
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """JPEG не умеет прозрачность — кладём картинку на белый фон."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        bg = Image.new("RGB", img.size, "white")
+        bg.paste(img, mask=img.getchannel("A"))
+        return bg
+    return img.convert("RGB")
+
+
+def build_variants(field_file, folder: str, sizes, storage=default_storage) -> dict:
+    """
+    Собирает варианты картинки field_file: для каждого размера (px по длинной
+    стороне, без увеличения) — WebP и JPEG в variants/<folder>/. Уже существующие
+    файлы не перезаписываются. Возвращает описание для JSON-поля.
+    """
+    digest = content_hash(field_file)
+    field_file.open("rb")
+    try:
+        with Image.open(field_file) as src:
+            src = _flatten(ImageOps.exif_transpose(src))
+    finally:
+        field_file.close()
+
+    variants = {}
+    for size in sorted(sizes):
+        img = None
+        scale = min(1, size / max(src.size))
+        variants[str(size)] = {"width": max(1, round(src.width * scale))}
+        for key, (fmt, ext) in FORMATS.items():
+            name = f"variants/{folder}/{digest}-{size}.{ext}"
+            if not storage.exists(name):
+                if img is None:
+                    img = src.copy()
+                    img.thumbnail((size, size), Image.LANCZOS)
+                buf = BytesIO()
+                img.save(buf, format=fmt, quality=QUALITY[key], optimize=True)
+                name = storage.save(name, ContentFile(buf.getvalue()))
+            variants[str(size)][key] = name
+    return {"source": field_file.name, "hash": digest, "sizes": variants}
+
+
+def pick_variant(variants: dict, source_name: str, size: int):
+    """
+    Описание варианта не меньше size px (или самого крупного) — либо None,
+    если варианты ещё не собраны для текущего файла source_name.
+    """
+    if not variants or variants.get("source") != source_name or not variants.get("sizes"):
+        return None
+    available = sorted(int(s) for s in variants["sizes"])
+    fit = next((s for s in available if s >= size), available[-1])
+    return variants["sizes"][str(fit)]
+
+
+def srcset(variants: dict, fmt: str, storage=default_storage) -> str:
+    """Все варианты формата fmt с их шириной — браузер сам выберет под экран."""
+    return ", ".join(
+        f"{storage.url(v[fmt])} {v['width']}w"
+        for _, v in sorted(variants["sizes"].items(), key=lambda kv: int(kv[0]))
+    )
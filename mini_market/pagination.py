@@ -0,0 +1,181 @@
+"""
+Курсорная (keyset) пагинация: вместо OFFSET страница ищется по значениям
+полей сортировки последней/первой строки, без COUNT(*) на каждый запрос.
+Подключается к ListView через CursorPaginationMixin и включается настройкой
+CURSOR_PAGINATION; шаблон _includes/_pagination.html понимает оба вида страниц.
+"""
+import base64
+import binascii
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _json_value(value):
+    # DjangoJSONEncoder обрезает микросекунды — для курсора нужна точная граница
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Не сериализуется в курсор: {value!r}")
+
+
+def _parse_ordering(ordering):
+    return [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    ordering — поля сортировки, последнее обязано быть уникальным (обычно id),
+    например ("title", "id") или ("-created_at", "-id").
+    count_cap — если задан, count считает не больше count_cap строк
+    (приблизительное число «N+» вместо полного COUNT(*)).
+    """
+
+    def __init__(self, queryset, per_page: int, ordering, count_cap: int | None = None):
+        self.fields = _parse_ordering(ordering)
+        self.ordering = list(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        self.count_cap = count_cap
+        self._count = None
+
+    # --- курсоры ---
+
+    def encode_cursor(self, obj, forward: bool) -> str:
+        values = [getattr(obj, name) for name, _ in self.fields]
+        raw = json.dumps({"v": values, "f": forward}, default=_json_value, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data = json.loads(raw)
+            values = data["v"]
+            if len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            opts = self.queryset.model._meta
+            values = [
+                opts.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+            return values, bool(data["f"])
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+
+    def _keyset(self, values, forward: bool) -> Q:
+        cond = Q()
+        equal = Q()
+        for (name, desc), value in zip(self.fields, values):
+            lookup = "lt" if desc == forward else "gt"
+            cond |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return cond
+
+    # --- страницы ---
+
+    def page(self, cursor: str | None) -> CursorPage:
+        forward = True
+        qs = self.queryset
+        if cursor:
+            values, forward = self.decode_cursor(cursor)
+            qs = qs.filter(self._keyset(values, forward))
+        if not forward:
+            qs = qs.order_by(*[name if desc else f"-{name}" for name, desc in self.fields])
+
+        rows = list(qs[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if forward:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        return CursorPage(
+            rows, self,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self.encode_cursor(rows[-1], True) if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0], False) if has_previous and rows else None,
+        )
+
+    def _counted(self) -> int:
+        # при count_cap считаем максимум count_cap + 1 строк, чтобы знать, что их «больше»
+        if self._count is None:
+            qs = self.queryset.order_by()
+            self._count = qs[: self.count_cap + 1].count() if self.count_cap else qs.count()
+        return self._count
+
+    @property
+    def count(self) -> int:
+        n = self._counted()
+        return min(n, self.count_cap) if self.count_cap else n
+
+    @property
+    def count_truncated(self) -> bool:
+        return bool(self.count_cap) and self._counted() > self.count_cap
+
+
+class CursorPaginationMixin:
+    """
+    Миксин для ListView: при CURSOR_PAGINATION=True страницы листаются курсором
+    (?cursor=...) по полям cursor_ordering вместо ?page=N.
+    """
+    cursor_ordering = None
+    cursor_param = "cursor"
+    cursor_count_cap = None
+
+    def use_cursor_pagination(self) -> bool:
+        return bool(settings.CURSOR_PAGINATION and self.cursor_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(
+            queryset, page_size, self.cursor_ordering, count_cap=self.cursor_count_cap
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidCursor:
+            raise Http404("Неверный курсор страницы.")
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -38,6 +38,11 @@ LOGOUT_REDIRECT_URL = "login"      # после выхода — на форму
 
 PRICE_CHANGE_MIN = env.int("PRICE_CHANGE_MIN", default=5)
 PRICE_CHANGE_MAX = env.int("PRICE_CHANGE_MAX", default=20)
+PRICE_TICK_CHUNK_SIZE = env.int("PRICE_TICK_CHUNK_SIZE", default=500)  # товаров в одной пачке тика
+PRICE_HISTORY_RETENTION_DAYS = env.int("PRICE_HISTORY_RETENTION_DAYS", default=90)  # дней сырой истории цен
+SEARCH_MAX_RESULTS = env.int("SEARCH_MAX_RESULTS", default=1000)  # сколько лучших совпадений берёт поиск
+CURSOR_PAGINATION = env.bool("CURSOR_PAGINATION", default=False)  # курсорные страницы вместо ?page=N
+LATENCY_BUDGET_FACTOR = env.float("LATENCY_BUDGET_FACTOR", default=1.0)  # запас к потолкам времени в тестах
 DEBUG = env("DEBUG")
 SERVE_MEDIA = env("SERVE_MEDIA")
 SECRET_KEY = env("SECRET_KEY")
@@ -46,6 +51,8 @@ CSRF_TRUSTED_ORIGINS = env.list("CSRF_TRUSTED_ORIGINS", default=[])
 
 # Проектная «лейбла» — можно показывать в шаблонах
 PROJECT_TITLE = env("PROJECT_TITLE")
+# адрес сайта для ссылок вне запроса (QR-коды, печать этикеток)
+SITE_URL = env.str("SITE_URL", default="http://127.0.0.1:8000")
 
 # -------------------------------------------------------------------
 # ПРИЛОЖЕНИЯ
@@ -109,6 +116,42 @@ DATABASES = {
     "default": env.db(default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
 }
 
+# -------------------------------------------------------------------
+# КЭШ
+# -------------------------------------------------------------------
+# По умолчанию — память процесса; для нескольких воркеров на одной машине
+# подойдёт файловый кэш: CACHE_URL=filecache:///var/tmp/mini_market_cache
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=300)  # секунд
+
+# -------------------------------------------------------------------
+# ФОНОВЫЕ ЗАДАЧИ И КАРТИНКИ
+# -------------------------------------------------------------------
+BACKGROUND_WORKERS = env.int("BACKGROUND_WORKERS", default=2)  # потоков пула фоновых задач
+BACKGROUND_TASKS_SYNC = env.bool("BACKGROUND_TASKS_SYNC", default=False)  # выполнять сразу (тесты)
+PRODUCT_IMAGE_SIZES = (40, 128, 480)  # px по длинной стороне; варианты в WebP и JPEG
+AVATAR_SIZES = (48, 96, 192)
+
+# живая лента цен/остатков (SSE): включать только под ASGI-сервером (uvicorn, daphne) —
+# под WSGI/runserver каждый поток занимал бы рабочий поток навсегда
+LIVE_EVENTS_ENABLED = env.bool("LIVE_EVENTS_ENABLED", default=False)
+# как часто процесс читает outbox и сколько хранить события (prune_market_events)
+MARKET_EVENTS_POLL_SECONDS = env.float("MARKET_EVENTS_POLL_SECONDS", default=0.5)
+MARKET_EVENTS_RETENTION_MINUTES = env.int("MARKET_EVENTS_RETENTION_MINUTES", default=60)
+# групповой коммит сделок по одному товару (trade/batching.py)
+TRADE_BATCHING = env.bool("TRADE_BATCHING", default=False)
+TRADE_BATCH_WINDOW_MS = env.int("TRADE_BATCH_WINDOW_MS", default=5)  # сколько ждать попутные заявки
+TRADE_BATCH_MAX = env.int("TRADE_BATCH_MAX", default=100)  # заявок в одной транзакции
+# "locking" — select_for_update (trade/services.py), "optimistic" — условные UPDATE без блокировок
+TRADE_ENGINE = env.str("TRADE_ENGINE", default="locking")
+TRADE_RETRIES = env.int("TRADE_RETRIES", default=3)  # повторы optimistic, если цена сменилась
+# ключи повтора POST-запросов сделок (trade/idempotency.py): сколько часов хранить
+IDEMPOTENCY_KEY_TTL_HOURS = env.int("IDEMPOTENCY_KEY_TTL_HOURS", default=24)
+# снимок цен/остатков в mmap-файле для всех процессов (catalog/snapshot.py); пусто — выключен
+PRICE_SNAPSHOT_PATH = env.str("PRICE_SNAPSHOT_PATH", default="")
+
 # -------------------------------------------------------------------
 # ПАРОЛИ
 # -------------------------------------------------------------------
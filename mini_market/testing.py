@@ -0,0 +1,93 @@
+"""
+Помощники для тестов: наполнение базы «как в жизни» и бюджеты запросов/времени.
+
+    class Views(BudgetTestCase):
+        def test_catalog(self):
+            with self.assertBudget(queries=4, ms=300):
+                self.client.get("/catalog/")
+
+Бюджет запросов — точный: больше — регрессия (N+1), меньше — повод уменьшить
+число в тесте. При провале печатается весь SQL запроса. Потолок времени умножается
+на LATENCY_BUDGET_FACTOR (медленная CI-машина — поставьте 2–3).
+"""
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+
+@dataclass
+class Market:
+    categories: list = field(default_factory=list)
+    products: list = field(default_factory=list)
+    users: list = field(default_factory=list)
+    staff: object = None
+
+
+def seed_market(categories: int = 5, products_per_category: int = 20, users: int = 3,
+                holdings_per_user: int = 10, history_per_product: int = 3) -> Market:
+    """
+    Каталог с одобренными и неодобренными товарами, историей цен, пользователями
+    с владениями и сделками, один staff. Всё — bulk-вставками, без сигналов.
+    """
+    from catalog.models import Category, PriceHistory, Product
+    from catalog.services import sync_after_bulk_write
+    from trade.models import Holding, Transaction
+
+    User = get_user_model()
+    market = Market()
+    market.categories = Category.objects.bulk_create(
+        Category(name=f"Категория {i}", slug=f"cat-{i}") for i in range(categories)
+    )
+    market.products = Product.objects.bulk_create(
+        Product(
+            title=f"Product {c.pk}-{i}", slug=f"product-{c.pk}-{i}", category=c,
+            description=f"Описание товара {i}", price=Decimal(10 + i), stock=100,
+            is_approved=i % 5 != 0,  # каждый пятый ждёт модерации
+        )
+        for c in market.categories for i in range(products_per_category)
+    )
+    PriceHistory.objects.bulk_create(
+        PriceHistory(product=p, old_price=p.price, new_price=p.price + k)
+        for p in market.products for k in range(history_per_product)
+    )
+
+    approved = [p for p in market.products if p.is_approved]
+    for n in range(users):
+        user = User.objects.create_user(f"user{n}", password="pw")
+        market.users.append(user)
+        owned = approved[n * holdings_per_user:(n + 1) * holdings_per_user]
+        Holding.objects.bulk_create(Holding(user=user, product=p, quantity=2) for p in owned)
+        Transaction.objects.bulk_create(
+            Transaction(user=user, product=p, type=Transaction.BUY, quantity=2, price_at_trade=p.price)
+            for p in owned
+        )
+    if approved and users:
+        Product.objects.filter(pk__in=[p.pk for p in approved[::7]]).update(created_by=market.users[0])
+    market.staff = User.objects.create_superuser("staff", password="pw")
+
+    sync_after_bulk_write([p.pk for p in market.products], [c.pk for c in market.categories])
+    return market
+
+
+class BudgetTestCase(TestCase):
+    """TestCase с assertBudget: точное число SQL-запросов и потолок времени блока."""
+
+    @contextmanager
+    def assertBudget(self, queries: int, ms: float):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            yield ctx
+            elapsed = (time.perf_counter() - start) * 1000
+        limit = ms * settings.LATENCY_BUDGET_FACTOR
+        if len(ctx.captured_queries) != queries:
+            sql = "\n".join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+            self.fail(f"{len(ctx.captured_queries)} SQL-запросов вместо {queries}:\n{sql}")
+        if elapsed > limit:
+            self.fail(f"{elapsed:.0f} мс при бюджете {limit:.0f} мс")
@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Product
+
+from mini_market.testing import BudgetTestCase, seed_market
+
+
+class ViewBudgetTests(BudgetTestCase):
+    """
+    Число SQL-запросов и время каждой страницы на заполненной базе. Число не должно
+    зависеть от количества товаров, владений и групп: рост — это N+1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.market = seed_market()
+        cls.product = next(p for p in cls.market.products if p.is_approved)
+        cls.unowned = Product.objects.filter(is_approved=True, created_by__isnull=True).first()
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, url, queries, ms=500):
+        with self.subTest(url=url), self.assertBudget(queries=queries, ms=ms):
+            resp = self.client.get(url)
+            if resp.streaming:
+                b"".join(resp.streaming_content)
+        self.assertLess(resp.status_code, 400, url)
+        return resp
+
+    def test_public_pages(self):
+        slug = self.product.slug
+        self._get("/catalog/", 4)
+        self._get("/catalog/", 1)  # из кэша листинга
+        self._get("/catalog/?q=Product", 4)
+        self._get(f"/catalog/{slug}/", 3)
+        self._get(f"/catalog/{slug}/candles/", 2)
+        self._get(f"/catalog/{slug}/qr.svg", 1)
+        self._get("/accounts/login/", 0)
+
+    def test_api(self):
+        self._get("/api/v1/products/", 1)
+        self._get("/api/v1/products/?ids=1,2,3&fields=id,price,category", 1)
+        self._get(f"/api/v1/products/{self.product.slug}/", 1)
+        self._get("/api/v1/categories/", 2)  # версия + навигация (кэш пуст)
+
+    def test_authenticated_pages(self):
+        user = self.market.users[0]
+        user.groups.create(name="5A")
+        user.groups.create(name="4A")
+        self.client.force_login(user)
+        # сессия, пользователь, профиль, права (2), группы, владения с товаром и категорией, свои товары
+        self._get("/", 8)
+        self._get("/catalog/", 9)
+        self._get(f"/catalog/{self.product.slug}/", 8)
+        self._get("/catalog/mine/", 7)
+        self._get("/catalog/new/", 6)
+        self._get("/catalog/submitted/", 5)
+        self._get("/trade/history/", 7)
+        self._get(f"/catalog/products/{self.unowned.pk}/claim/", 6)  # + товар
+
+    def test_staff_pages(self):
+        self.client.force_login(self.market.staff)
+        self._get("/catalog/moderation/", 4)
+        self._get("/exports/products/", 3)
+        self._get("/admin/catalog/product/", 6, ms=2000)
+
+    def test_price_tick(self):
+        Product.objects.update(next_change_at=timezone.now())
+        self.client.force_login(self.market.staff)
+        # все 100 товаров — одна пачка: число запросов не зависит от размера рынка
+        self._get("/catalog/tick/", 22, ms=2000)
+
+    def test_trade(self):
+        self.client.force_login(self.market.users[1])
+        # новое владение (get_or_create), событие для живой ленты и доход автору товара
+        with self.assertBudget(queries=18, ms=500):
+            resp = self.client.post(f"/trade/buy/{self.product.pk}/", {"quantity": 1})
+        self.assertEqual(resp.status_code, 302)
+        # владение уже есть: UPDATE вместо вставки, дохода автору нет
+        with self.assertBudget(queries=13, ms=500):
+            resp = self.client.post(f"/trade/sell/{self.product.pk}/", {"quantity": 1})
+        self.assertEqual(resp.status_code, 302)
+
+    def test_cart(self):
+        self.client.force_login(self.market.users[1])
+        products = [p for p in self.market.products if p.is_approved][:3]
+        for p in products:
+            self.client.post(f"/trade/cart/add/{p.pk}/", {"quantity": 1})
+        # товары корзины одним запросом, независимо от числа позиций
+        self._get("/trade/cart/", 6)
+        # оплата пачкой: по одному UPDATE/INSERT на таблицу на всю корзину
+        with self.assertBudget(queries=16, ms=1000):
+            resp = self.client.post("/trade/cart/", {"checkout": "1"})
+        self.assertRedirects(resp, reverse("portfolio"), fetch_redirect_response=False)
+
+    def test_claim(self):
+        self.client.force_login(self.market.users[2])
+        # сохранение товара, индекс поиска, кэш каталога и счётчики категорий
+        with self.assertBudget(queries=11, ms=500):
+            resp = self.client.post(f"/catalog/products/{self.unowned.pk}/claim/", {"description": "правка"})
+        self.assertEqual(resp.status_code, 302)
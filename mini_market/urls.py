@@ -4,12 +4,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from mini_market.exports import export_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("accounts/", include("django.contrib.auth.urls")),
     path("", include("users.urls")),
     path("catalog/", include(("catalog.urls", "catalog"), namespace="catalog")),
     path("trade/", include(("trade.urls", "trade"), namespace="trade")),
+    path("exports/<slug:name>/", export_view, name="export"),
+    path("api/v1/", include(("catalog.api_urls", "api"), namespace="api")),
 ]
 
 if settings.DEBUG or settings.SERVE_MEDIA:
@@ -0,0 +1,13 @@
+// Ключ повтора для форм сделок: новый при каждом показе страницы (в том числе из 304
+// и bfcache), общий для двойного клика внутри одного показа. Поле — {% idempotency_field %}.
+(function () {
+  function newKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+  }
+  window.addEventListener("pageshow", function () {
+    document.querySelectorAll("input[data-idempotency-key]").forEach(function (input) {
+      input.value = newKey();
+    });
+  });
+})();
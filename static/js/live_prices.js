@@ -0,0 +1,21 @@
+// Живые цены и остатки: подписка на /catalog/events/ для товаров на странице.
+// Элементы: data-live-product="<id>" и внутри data-live="price" / data-live="stock".
+// EventSource сам переподключается и присылает Last-Event-ID.
+(function () {
+  var nodes = document.querySelectorAll("[data-live-product]");
+  if (!nodes.length || !window.EventSource) return;
+
+  var ids = [];
+  nodes.forEach(function (n) { ids.push(n.dataset.liveProduct); });
+  var source = new EventSource("/catalog/events/?ids=" + ids.join(","));
+
+  function update(e, field, suffix) {
+    var data = JSON.parse(e.data);
+    document.querySelectorAll('[data-live-product="' + data.product + '"] [data-live="' + field + '"]')
+      .forEach(function (el) { el.textContent = data[field] + suffix; });
+  }
+  source.addEventListener("price", function (e) { update(e, "price", " мон."); });
+  source.addEventListener("stock", function (e) { update(e, "stock", ""); });
+  // пропущено слишком много — проще перерисовать страницу
+  source.addEventListener("reset", function () { source.close(); window.location.reload(); });
+})();
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TradeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trade'
+
+    def ready(self):
+        from . import exports  # noqa: F401
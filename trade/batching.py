@@ -0,0 +1,190 @@
+"""
+Групповой коммит заявок на покупку/продажу (TRADE_BATCHING=True).
+
+Когда весь класс покупает один товар, каждая сделка берёт блокировку той же
+строки Product и ждёт предыдущую (на SQLite — «database is locked»). Здесь
+заявки на один товар копятся TRADE_BATCH_WINDOW_MS миллисекунд (или до
+TRADE_BATCH_MAX штук) и применяются одной транзакцией: одна блокировка товара,
+один UPDATE остатка, bulk_update балансов и владений, bulk_create сделок.
+Первый пришедший поток — «ведущий»: он ждёт окно и выполняет пачку, остальные
+ждут свой результат. Каждая заявка проверяется отдельно, в порядке поступления:
+отказ одной (нет денег, нет товара) не мешает остальным.
+
+Пачки собираются внутри процесса; разные процессы по-прежнему сериализуются
+на блокировке строки, но уже пачками, а не по одной сделке.
+"""
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from catalog import events, snapshot
+from catalog.models import Product
+from users.models import Profile
+
+from . import optimistic, services
+from .models import Holding, Transaction
+
+BUY = Transaction.BUY
+SELL = Transaction.SELL
+CENT = Decimal("0.01")
+
+
+@dataclass
+class Order:
+    side: str  # BUY / SELL
+    user_id: int
+    product_id: int
+    quantity: int
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@transaction.atomic
+def apply_batch(product_id: int, orders: list) -> list:
+    """
+    Применяет заявки на один товар одной транзакцией. Возвращает список той же
+    длины: None — заявка исполнена, ValidationError — отказ. Правила те же, что
+    у services.buy_product / sell_product.
+    """
+    product = Product.objects.select_for_update().get(id=product_id)
+    seller_id = product.created_by_id
+    user_ids = {o.user_id for o in orders}
+    locked = sorted(user_ids | ({seller_id} if seller_id and any(o.side == BUY for o in orders) else set()))
+    profiles = {p.user_id: p for p in Profile.objects.select_for_update().filter(user_id__in=locked).order_by("user_id")}
+    holdings = {h.user_id: h for h in Holding.objects.select_for_update().filter(product=product, user_id__in=user_ids)}
+
+    fee_rate = Decimal(str(services.FEE_RATE))
+    price = Decimal(product.price)
+    stock = product.stock
+    results, tx_rows, revenue = [], [], []
+    touched_profiles, new_holdings = set(), {}
+
+    for o in orders:
+        gross = _money(price * o.quantity)
+        profile = profiles[o.user_id]
+        holding = holdings.get(o.user_id)
+        if o.side == BUY:
+            if o.quantity > stock:
+                results.append(ValidationError("Недостаточно товара на складе"))
+                continue
+            if gross > profile.balance:
+                results.append(ValidationError("Недостаточно монет для покупки"))
+                continue
+            if holding is None:
+                holding = holdings[o.user_id] = new_holdings[o.user_id] = Holding(
+                    user_id=o.user_id, product=product, quantity=0
+                )
+            profile.balance -= gross
+            stock -= o.quantity
+            holding.quantity += o.quantity
+            buy_tx = Transaction(user_id=o.user_id, product=product, type=BUY, quantity=o.quantity,
+                                 price_at_trade=price, fee_amount=Decimal("0.00"))
+            tx_rows.append(buy_tx)
+            if seller_id and seller_id != o.user_id:
+                fee = _money(gross * fee_rate)
+                profiles[seller_id].balance += gross - fee
+                touched_profiles.add(seller_id)
+                revenue.append((buy_tx, Transaction(
+                    user_id=seller_id, product=product, type=Transaction.SELL_REVENUE,
+                    quantity=o.quantity, price_at_trade=price, fee_amount=fee,
+                )))
+        else:
+            if holding is None or o.quantity > holding.quantity:
+                results.append(ValidationError("Нельзя продать больше, чем есть во владении"))
+                continue
+            fee = _money(gross * fee_rate)
+            profile.balance += gross - fee
+            stock += o.quantity
+            holding.quantity -= o.quantity
+            tx_rows.append(Transaction(user_id=o.user_id, product=product, type=SELL, quantity=o.quantity,
+                                       price_at_trade=price, fee_amount=fee))
+        touched_profiles.add(o.user_id)
+        results.append(None)
+
+    if not tx_rows:
+        return results
+    Product.objects.filter(id=product_id).update(stock=stock)
+    Profile.objects.bulk_update([profiles[u] for u in sorted(touched_profiles)], ["balance"])
+    Holding.objects.bulk_create(new_holdings.values())
+    Holding.objects.bulk_update([h for u, h in holdings.items() if u not in new_holdings], ["quantity"])
+    Transaction.objects.bulk_create(tx_rows)  # id нужны для original_tx доходов автора
+    for buy_tx, revenue_tx in revenue:
+        revenue_tx.original_tx = buy_tx
+    Transaction.objects.bulk_create([tx for _, tx in revenue])
+
+    product.stock = stock
+    events.publish_stock(product, stock)
+    snapshot.patch_on_commit([(product.id, product.price, stock, product.is_approved)])
+    return results
+
+
+@dataclass(eq=False)
+class _Batch:
+    orders: list = field(default_factory=list)
+    futures: list = field(default_factory=list)
+    full: threading.Event = field(default_factory=threading.Event)
+
+
+class OrderBatcher:
+    """Собирает заявки по товарам и исполняет пачки через execute(product_id, orders)."""
+
+    def __init__(self, execute=apply_batch):
+        self.execute = execute
+        self._lock = threading.Lock()
+        self._open: dict[int, _Batch] = {}
+
+    def submit(self, order: Order) -> None:
+        """Исполняет заявку в составе пачки; отказ — ValidationError, как у services."""
+        future = Future()
+        with self._lock:
+            batch = self._open.get(order.product_id)
+            leader = batch is None
+            if leader:
+                batch = self._open[order.product_id] = _Batch()
+            batch.orders.append(order)
+            batch.futures.append(future)
+            if len(batch.orders) >= settings.TRADE_BATCH_MAX:
+                del self._open[order.product_id]  # следующие заявки откроют новую пачку
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(settings.TRADE_BATCH_WINDOW_MS / 1000)
+            with self._lock:
+                if self._open.get(order.product_id) is batch:
+                    del self._open[order.product_id]
+            try:
+                results = self.execute(order.product_id, batch.orders)
+            except Exception as e:  # сбой БД — отказ всей пачке
+                for f in batch.futures:
+                    f.set_exception(e)
+            else:
+                for f, result in zip(batch.futures, results):
+                    f.set_result(result)
+
+        error = future.result()
+        if error is not None:
+            raise error
+
+
+batcher = OrderBatcher()
+
+
+def place_order(side: str, user, product_id: int, qty: int) -> None:
+    """
+    Покупка или продажа: через пачки при TRADE_BATCHING, иначе — по одной сделке
+    движком TRADE_ENGINE (services с блокировками или optimistic).
+    """
+    if qty < 1:
+        raise ValidationError("Количество должно быть ≥ 1")
+    if not settings.TRADE_BATCHING:
+        engine = optimistic if settings.TRADE_ENGINE == "optimistic" else services
+        run = engine.buy_product if side == BUY else engine.sell_product
+        return run(user, product_id, qty)
+    batcher.submit(Order(side, user.id, product_id, qty))
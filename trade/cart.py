@@ -0,0 +1,36 @@
+"""Корзина в сессии: {product_id: количество}. Оплата — services.checkout."""
+
+CART_SESSION_KEY = "cart"
+CART_MAX_ITEMS = 50
+
+
+class Cart:
+    def __init__(self, session):
+        self.session = session
+        # ключи JSON-сессии — строки
+        self.items = {int(pid): qty for pid, qty in session.get(CART_SESSION_KEY, {}).items()}
+
+    def __len__(self):
+        return len(self.items)
+
+    def _save(self):
+        self.session[CART_SESSION_KEY] = {str(pid): qty for pid, qty in self.items.items()}
+
+    def add(self, product_id: int, qty: int) -> bool:
+        """Добавляет qty к позиции; False — в корзине уже CART_MAX_ITEMS разных товаров."""
+        if product_id not in self.items and len(self.items) >= CART_MAX_ITEMS:
+            return False
+        self.items[product_id] = self.items.get(product_id, 0) + qty
+        self._save()
+        return True
+
+    def set(self, product_id: int, qty: int) -> None:
+        if qty > 0:
+            self.items[product_id] = qty
+        else:
+            self.items.pop(product_id, None)
+        self._save()
+
+    def clear(self) -> None:
+        self.items = {}
+        self.session.pop(CART_SESSION_KEY, None)
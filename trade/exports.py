@@ -0,0 +1,16 @@
+from mini_market.exports import Dataset, register
+
+from .models import Transaction
+
+register(Dataset(
+    name="transactions",
+    description="Сделки",
+    get_queryset=lambda: Transaction.objects.all(),
+    columns=[
+        ("id", "id"), ("created_at", "created_at"), ("user", "user__username"),
+        ("product_id", "product_id"), ("product", "product__slug"), ("type", "type"),
+        ("quantity", "quantity"), ("price_at_trade", "price_at_trade"), ("fee_amount", "fee_amount"),
+    ],
+    date_field="created_at",
+    category_field="product__category__slug",
+))
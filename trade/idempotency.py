@@ -0,0 +1,71 @@
+"""
+Защита сделок от повторной отправки формы (двойной клик, F5 на медленном ответе).
+
+Форма несёт скрытый токен ({% idempotency_field %}, значение ставит
+js/idempotency.js при каждом показе страницы), API-клиент — заголовок
+Idempotency-Key. Первый запрос с ключом вставляет строку IdempotencyKey и
+выполняет сделку, затем сохраняет результат (уровень и текст сообщения).
+Повтор находит строку по уникальному индексу (user, key) и получает сохранённый
+результат — без блокировок Product и Profile и без второй сделки. Пока первый
+запрос ещё выполняется, повтор получает «уже выполняется». scope включает данные
+запроса (товар и количество): тот же ключ с другими данными — отказ, а не чужой
+успех. Без ключа — как раньше.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+KEY_FIELD = "idempotency_key"
+
+
+def request_key(request) -> str:
+    return (request.META.get(KEY_HEADER) or request.POST.get(KEY_FIELD) or "").strip()[:64]
+
+
+def run_once(request, scope: str, action) -> tuple[int, str]:
+    """
+    Выполняет action() не больше одного раза на ключ запроса.
+    action возвращает (уровень messages, текст); он же возвращается повтору.
+    """
+    key = request_key(request)
+    if not key:
+        return action()
+    # повтор — обычно один SELECT по уникальному индексу; вставка — только для нового ключа
+    record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if record is None:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=request.user, key=key, scope=scope)
+        except IntegrityError:  # параллельный повтор успел вставить ключ первым
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        else:
+            return _run(record, action)
+    if record is not None and record.scope != scope:
+        return messages.ERROR, "Этот ключ запроса уже использован для другой операции."
+    if record is None or record.level is None:
+        return messages.INFO, "Запрос уже выполняется — обновите страницу чуть позже."
+    return record.level, record.message
+
+
+def _run(record: IdempotencyKey, action) -> tuple[int, str]:
+    try:
+        level, text = action()
+    except Exception:
+        record.delete()  # сбой, а не отказ — пусть повтор выполнится заново
+        raise
+    IdempotencyKey.objects.filter(id=record.id).update(level=level, message=text[:255])
+    return level, text
+
+
+def prune_keys(hours: int | None = None, now=None) -> int:
+    """Удаляет ключи старше hours (по умолчанию IDEMPOTENCY_KEY_TTL_HOURS)."""
+    hours = settings.IDEMPOTENCY_KEY_TTL_HOURS if hours is None else hours
+    cutoff = (now or timezone.now()) - timedelta(hours=hours)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trade.idempotency import prune_keys
+
+
+class Command(BaseCommand):
+    help = "Удаляет ключи повтора сделок старше срока хранения."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=None,
+                            help="Сколько часов хранить ключи (по умолчанию IDEMPOTENCY_KEY_TTL_HOURS).")
+
+    def handle(self, *args, **opts):
+        if opts["hours"] is not None and opts["hours"] < 0:
+            raise CommandError("--hours не может быть отрицательным.")
+        deleted = prune_keys(opts["hours"])
+        self.stdout.write(self.style.SUCCESS(f"Удалено ключей: {deleted}"))
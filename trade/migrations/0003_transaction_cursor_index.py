@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_product_cursor_indexes'),
+        ('trade', '0002_transaction_original_tx_alter_transaction_type_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='tx_user_created_idx'),
+        ),
+    ]
@@ -46,6 +46,10 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # история операций пользователя (курсорная пагинация)
+            models.Index(fields=["user", "-created_at", "-id"], name="tx_user_created_idx"),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["type", "original_tx"],
@@ -57,3 +61,24 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"{self.type} {self.product} x{self.quantity} @ {self.price_at_trade}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ повтора POST-запроса сделки (trade/idempotency.py): повтор с тем же ключом
+    получает сохранённый результат, а не вторую сделку. Чистка — prune_idempotency_keys.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=64)
+    scope = models.CharField(max_length=64)  # операция и её данные: "buy:12:2", "checkout:<хеш корзины>"
+    level = models.PositiveSmallIntegerField(null=True, blank=True)  # уровень messages; None — ещё выполняется
+    message = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="uniq_idempotency_key_per_user"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.scope} {self.key}"
@@ -0,0 +1,171 @@
+"""
+Сделки без блокировок строк (TRADE_ENGINE="optimistic").
+
+Вместо select_for_update и записи каждой строки отдельно — условные UPDATE:
+«остаток ≥ qty и цена та же», «баланс ≥ стоимости», «владение ≥ qty»; успех
+решает число изменённых строк. Строки берутся в том же порядке, что и у
+services.checkout (товар, профили по user_id, владение). Если цена успела
+смениться тиком или СУБД разорвала взаимную блокировку, попытка откатывается и
+повторяется (до TRADE_RETRIES раз, с растущей паузой). Инварианты те же, что у
+services: остаток, баланс и владение не уходят в минус, комиссия FEE_RATE та же,
+сделка и доход автора записываются вместе с изменениями.
+"""
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+
+from catalog import events, snapshot
+from catalog.models import Product
+from users.models import Profile
+
+from . import services
+from .models import Holding, Transaction
+
+CENT = Decimal("0.01")
+PRODUCT_FIELDS = ("id", "price", "created_by_id", "category_id", "is_approved")
+RETRY_PGCODES = {"40P01", "40001"}  # deadlock_detected, serialization_failure
+
+
+class PriceChanged(Exception):
+    """Цена изменилась между чтением и записью — попытку нужно повторить."""
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _read_product(product_id: int) -> Product:
+    return Product.objects.only(*PRODUCT_FIELDS).get(id=product_id)
+
+
+def _retryable(exc: OperationalError) -> bool:
+    # взаимная блокировка / сбой сериализации (PostgreSQL), занятая база (SQLite)
+    code = getattr(exc.__cause__, "pgcode", None)
+    return code in RETRY_PGCODES or "database is locked" in str(exc)
+
+
+def _with_retries(attempt, *args):
+    retries = settings.TRADE_RETRIES
+    for n in range(retries + 1):
+        try:
+            return attempt(*args)
+        except PriceChanged:
+            if n == retries:
+                raise ValidationError("Цена меняется слишком часто, попробуйте ещё раз")
+        except OperationalError as e:
+            if n == retries or not _retryable(e):
+                raise
+        time.sleep(0.002 * 2 ** n * (1 + random.random()))
+
+
+def _move_stock(product_id: int, price, delta: int):
+    """
+    Условный UPDATE остатка: только по прочитанной цене и, при списании, если
+    хватает товара. Возвращает новый остаток или None, если условие не выполнено.
+    UPDATE ... RETURNING — без отдельного SELECT остатка для ленты и снимка.
+    """
+    table = Product._meta.db_table
+    guard = " AND stock >= %s" if delta < 0 else ""
+    params = [delta, product_id, price] + ([-delta] if delta < 0 else [])
+    with connection.cursor() as cur:
+        cur.execute(
+            f"UPDATE {table} SET stock = stock + %s WHERE id = %s AND price = %s{guard} RETURNING stock",
+            params,
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _publish_stock(product: Product, stock: int) -> None:
+    product.stock = stock
+    events.publish_stock(product, stock)
+    snapshot.patch_on_commit([(product.id, product.price, stock, product.is_approved)])
+
+
+def _add_holding(user, product, qty: int) -> None:
+    if Holding.objects.filter(user=user, product=product).update(quantity=F("quantity") + qty):
+        return
+    try:
+        with transaction.atomic():
+            Holding.objects.create(user=user, product=product, quantity=qty)
+    except IntegrityError:  # параллельная покупка успела создать владение
+        Holding.objects.filter(user=user, product=product).update(quantity=F("quantity") + qty)
+
+
+@transaction.atomic
+def _try_buy(user, product_id: int, qty: int) -> None:
+    product = _read_product(product_id)
+    price = product.price
+    cost = _money(price * qty)
+    seller_id = product.created_by_id
+    if seller_id == user.id:
+        seller_id = None
+    fee = _money(cost * Decimal(str(services.FEE_RATE)))
+
+    # строки блокируются UPDATE в глобальном порядке services/checkout:
+    # товар, затем профили по user_id, затем владение — без взаимных блокировок
+    stock = _move_stock(product_id, price, -qty)
+    if stock is None:
+        if Product.objects.filter(id=product_id, price=price).exists():
+            raise ValidationError("Недостаточно товара на складе")
+        raise PriceChanged
+    for uid in sorted({user.id, seller_id} - {None}):
+        if uid == user.id:
+            if not Profile.objects.filter(user=user, balance__gte=cost).update(balance=F("balance") - cost):
+                raise ValidationError("Недостаточно монет для покупки")  # откат вернёт и остаток
+        else:
+            Profile.objects.filter(user_id=uid).update(balance=F("balance") + (cost - fee))
+    _add_holding(user, product, qty)
+
+    buy_tx = Transaction.objects.create(
+        user=user, product=product, type=Transaction.BUY, quantity=qty,
+        price_at_trade=price, fee_amount=Decimal("0.00"),
+    )
+    if seller_id:
+        Transaction.objects.create(
+            user_id=seller_id, product=product, type=Transaction.SELL_REVENUE, quantity=qty,
+            price_at_trade=price, fee_amount=fee, original_tx=buy_tx,
+        )
+    _publish_stock(product, stock)
+
+
+@transaction.atomic
+def _try_sell(user, product_id: int, qty: int) -> None:
+    product = _read_product(product_id)
+    price = product.price
+    gross = _money(price * qty)
+    fee = _money(gross * Decimal(str(services.FEE_RATE)))
+
+    # порядок блокировок тот же: товар, профиль, владение
+    stock = _move_stock(product_id, price, qty)
+    if stock is None:
+        raise PriceChanged
+    Profile.objects.filter(user=user).update(balance=F("balance") + (gross - fee))
+    if not Holding.objects.filter(user=user, product=product, quantity__gte=qty).update(
+        quantity=F("quantity") - qty
+    ):
+        raise ValidationError("Нельзя продать больше, чем есть во владении")
+    Transaction.objects.create(
+        user=user, product=product, type=Transaction.SELL, quantity=qty,
+        price_at_trade=price, fee_amount=fee,
+    )
+    _publish_stock(product, stock)
+
+
+def buy_product(user, product_id: int, qty: int) -> None:
+    """То же, что services.buy_product, на условных UPDATE без блокировок."""
+    if qty < 1:
+        raise ValidationError("Количество должно быть ≥ 1")
+    _with_retries(_try_buy, user, product_id, qty)
+
+
+def sell_product(user, product_id: int, qty: int) -> None:
+    """То же, что services.sell_product, на условных UPDATE без блокировок."""
+    if qty < 1:
+        raise ValidationError("Количество должно быть ≥ 1")
+    _with_retries(_try_sell, user, product_id, qty)
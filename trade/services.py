@@ -4,17 +4,22 @@ from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import F
 
-from catalog.models import Product
+from catalog import events, snapshot
+from catalog.models import MarketEvent, Product
 from .models import Holding, Transaction
-from . import FEE_RATE  # комиссия платформы, например Decimal("0.10") = 10%
-from decimal import Decimal
-from django.db import transaction
+from . import FEE_RATE  # комиссия платформы (trade/__init__.py), например 0.10 = 10%
 from users.models import Profile
 
 
 Q = Decimal  # сокращение
 
 
+def _lock_profiles(user_ids) -> dict:
+    """Блокирует профили в порядке user_id (глобальный порядок блокировок: товары по id, затем профили)."""
+    qs = Profile.objects.select_for_update().filter(user_id__in=sorted(u for u in user_ids if u)).order_by("user_id")
+    return {p.user_id: p for p in qs}
+
+
 @transaction.atomic
 def buy_product(user, product_id: int, qty: int) -> None:
     """
@@ -28,9 +33,11 @@ def buy_product(user, product_id: int, qty: int) -> None:
     if qty < 1:
         raise ValidationError("Количество должно быть ≥ 1")
 
-    # блокируем записи на время операции
+    # блокируем записи на время операции: товар, затем профили покупателя и автора
+    # одним запросом в порядке user_id — тот же порядок, что у checkout, без взаимных блокировок
     product = Product.objects.select_for_update().get(id=product_id)
-    profile = Profile.objects.select_for_update().get(user=user)
+    profiles = _lock_profiles({user.id, product.created_by_id})
+    profile = profiles[user.id]
 
     if qty > product.stock:
         raise ValidationError("Недостаточно товара на складе")
@@ -50,8 +57,11 @@ def buy_product(user, product_id: int, qty: int) -> None:
     profile.save(update_fields=["balance"])
 
     # 2) уменьшаем склад
+    stock_after = product.stock - qty
     product.stock = F("stock") - qty
     product.save(update_fields=["stock"])
+    events.publish_stock(product, stock_after)
+    snapshot.patch_on_commit([(product.id, product.price, stock_after, product.is_approved)])
 
     # 3) увеличиваем владение
     holding.quantity = F("quantity") + qty
@@ -68,9 +78,9 @@ def buy_product(user, product_id: int, qty: int) -> None:
     )
 
     # 5) начисление автору товара (если есть и не сам покупатель)
-    seller = getattr(product, "created_by", None)
-    if seller and seller.id != user.id:
-        seller_profile = Profile.objects.select_for_update().get(user=seller)
+    seller_id = product.created_by_id  # только id — сам автор не нужен
+    if seller_id and seller_id != user.id:
+        seller_profile = profiles[seller_id]
 
         gross = total_cost
         fee = (gross * Q(str(FEE_RATE))).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
@@ -80,7 +90,7 @@ def buy_product(user, product_id: int, qty: int) -> None:
         seller_profile.save(update_fields=["balance"])
 
         Transaction.objects.create(
-            user=seller,
+            user_id=seller_id,
             product=product,
             type=Transaction.SELL_REVENUE,
             quantity=qty,
@@ -123,8 +133,11 @@ def sell_product(user, product_id: int, qty: int) -> None:
     profile.save(update_fields=["balance"])
 
     # 3) возвращаем товар на склад
+    stock_after = product.stock + qty
     product.stock = F("stock") + qty
     product.save(update_fields=["stock"])
+    events.publish_stock(product, stock_after)
+    snapshot.patch_on_commit([(product.id, product.price, stock_after, product.is_approved)])
 
     # 4) транзакция продажи
     Transaction.objects.create(
@@ -136,12 +149,77 @@ def sell_product(user, product_id: int, qty: int) -> None:
         fee_amount=fee,
     )
 
-# trade/services.py
 
+@transaction.atomic
+def checkout(user, items: dict) -> list:
+    """
+    Покупка нескольких товаров одной транзакцией (корзина): items — {product_id: qty}.
+    Всё или ничего: не хватает товара или монет на всю корзину — ValidationError.
+    Блокировки берутся в глобальном порядке — товары по id, затем профили по user_id, —
+    поэтому встречные покупки не блокируют друг друга намертво. Запись — пакетная:
+    остатки и балансы одним bulk_update, сделки и доходы авторов одним bulk_create.
+    Возвращает созданные Transaction(BUY).
+    """
+    items = {int(pid): int(qty) for pid, qty in items.items()}
+    if not items:
+        raise ValidationError("Корзина пуста")
+    if any(qty < 1 for qty in items.values()):
+        raise ValidationError("Количество должно быть ≥ 1")
 
-# можно менять комиссию тут (0.00 = без комиссии)
-FEE_RATE = Decimal("0.00")
+    products = list(Product.objects.select_for_update().filter(id__in=sorted(items)).order_by("id"))
+    if len(products) != len(items):
+        raise ValidationError("Товар из корзины больше не продаётся")
+    sellers = {p.created_by_id for p in products if p.created_by_id and p.created_by_id != user.id}
+    profiles = _lock_profiles({user.id} | sellers)
+    profile = profiles[user.id]
+
+    total = Q("0.00")
+    for p in products:
+        if items[p.id] > p.stock:
+            raise ValidationError(f"Недостаточно товара на складе: {p.title}")
+        total += (Q(p.price) * Q(items[p.id])).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
+    if total > profile.balance:
+        raise ValidationError("Недостаточно монет для покупки")
 
+    holdings = {
+        h.product_id: h
+        for h in Holding.objects.select_for_update().filter(user=user, product_id__in=items)
+    }
+    new_holdings, buys, revenue = [], [], []
+    for p in products:
+        qty = items[p.id]
+        price = Q(p.price)
+        cost = (price * Q(qty)).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
+        p.stock -= qty
+        profile.balance -= cost
+        holding = holdings.get(p.id)
+        if holding is None:
+            new_holdings.append(Holding(user=user, product=p, quantity=qty))
+        else:
+            holding.quantity += qty
+        buy_tx = Transaction(user=user, product=p, type=Transaction.BUY, quantity=qty,
+                             price_at_trade=price, fee_amount=Q("0.00"))
+        buys.append(buy_tx)
+        if p.created_by_id in sellers:
+            fee = (cost * Q(str(FEE_RATE))).quantize(Q("0.01"), rounding=ROUND_HALF_UP)
+            profiles[p.created_by_id].balance += cost - fee
+            revenue.append((buy_tx, Transaction(
+                user_id=p.created_by_id, product=p, type=Transaction.SELL_REVENUE,
+                quantity=qty, price_at_trade=price, fee_amount=fee,
+            )))
+
+    Product.objects.bulk_update(products, ["stock"])
+    Profile.objects.bulk_update(list(profiles.values()), ["balance"])
+    Holding.objects.bulk_create(new_holdings)
+    Holding.objects.bulk_update(list(holdings.values()), ["quantity"])
+    Transaction.objects.bulk_create(buys)  # id нужны доходам авторов (original_tx)
+    for buy_tx, revenue_tx in revenue:
+        revenue_tx.original_tx = buy_tx
+    Transaction.objects.bulk_create([tx for _, tx in revenue])
+
+    events.publish(MarketEvent.STOCK, products)
+    snapshot.patch_on_commit((p.id, p.price, p.stock, p.is_approved) for p in products)
+    return buys
 
 def backfill_seller_revenue(dry_run: bool = False, limit: int | None = None) -> tuple[int, int]:
     """
@@ -179,7 +257,7 @@ def backfill_seller_revenue(dry_run: bool = False, limit: int | None = None) ->
                 continue
 
             gross = (t.price_at_trade * t.quantity).quantize(Decimal("0.01"))
-            fee = (gross * FEE_RATE).quantize(Decimal("0.01"))
+            fee = (gross * Decimal(str(FEE_RATE))).quantize(Decimal("0.01"))
             gain = gross - fee
 
             if not dry_run:
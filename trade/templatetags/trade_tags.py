@@ -0,0 +1,16 @@
+from django import template
+from django.utils.html import format_html
+
+from trade.idempotency import KEY_FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_field():
+    """
+    Скрытое поле ключа повтора; значение ставит js/idempotency.js при показе
+    страницы (подключите его на странице). Ключ прямо в HTML попал бы в ответы 304
+    и повторился бы при следующей покупке.
+    """
+    return format_html('<input type="hidden" name="{}" value="" data-idempotency-key>', KEY_FIELD)
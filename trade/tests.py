@@ -1,9 +1,14 @@
+import csv
+import gzip
+import io
 from decimal import Decimal
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from users.models import Profile
 from catalog.models import Category, Product
 from trade.models import Holding, Transaction
+from trade import services
 from trade.services import buy_product, sell_product
 
 class TradeTests(TestCase):
@@ -14,6 +19,14 @@ class TradeTests(TestCase):
         self.product = Product.objects.create(title="Юла", slug="yula", category=cat, price=Decimal("100.00"), stock=10)
 
     def test_buy_and_sell_with_fee(self):
+        self._assert_buy_and_sell_with_fee(buy_product, sell_product)
+
+    def test_optimistic_engine_buy_and_sell_with_fee(self):
+        from trade import optimistic
+
+        self._assert_buy_and_sell_with_fee(optimistic.buy_product, optimistic.sell_product)
+
+    def _assert_buy_and_sell_with_fee(self, buy_product, sell_product):
         buy_product(self.user, self.product.id, 2)
         self.user.refresh_from_db()
         self.product.refresh_from_db()
@@ -28,3 +41,232 @@ class TradeTests(TestCase):
         self.assertEqual(Holding.objects.get(user=self.user, product=self.product).quantity, 1)
         self.assertEqual(self.product.stock, 9)
         self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_matches_sequential_trades(self):
+        from trade.batching import Order, apply_batch
+
+        U = get_user_model()
+        author = U.objects.create_user("author", password="x")
+        poor = U.objects.create_user("poor", password="x")
+        Profile.objects.filter(user=poor).update(balance=Decimal("50.00"))
+        self.product.created_by = author
+        self.product.save()
+
+        orders = [
+            Order(Transaction.BUY, self.user.id, self.product.id, 3),
+            Order(Transaction.BUY, poor.id, self.product.id, 1),      # не хватает монет
+            Order(Transaction.SELL, self.user.id, self.product.id, 1),
+            Order(Transaction.BUY, self.user.id, self.product.id, 20),  # не хватает товара
+            Order(Transaction.SELL, poor.id, self.product.id, 1),     # нечего продавать
+        ]
+        with self.assertNumQueries(10):  # не зависит от числа заявок
+            results = apply_batch(self.product.id, orders)
+        self.assertEqual([r is None for r in results], [True, False, True, False, False])
+        self.assertEqual(results[1].message, "Недостаточно монет для покупки")
+        batched = {
+            "stock": Product.objects.get(pk=self.product.pk).stock,
+            "balances": dict(Profile.objects.values_list("user__username", "balance")),
+            "holding": Holding.objects.get(user=self.user).quantity,
+            "tx": sorted(Transaction.objects.values_list("type", "quantity", "fee_amount")),
+        }
+
+        # те же заявки по одной через services на свежих данных дают тот же итог
+        Transaction.objects.all().delete()
+        Holding.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(stock=10)
+        Profile.objects.filter(user=self.user).update(balance=Decimal("1000.00"))
+        Profile.objects.filter(user=author).update(balance=Decimal("1000.00"))
+        buy_product(self.user, self.product.id, 3)
+        sell_product(self.user, self.product.id, 1)
+        self.assertEqual(batched, {
+            "stock": Product.objects.get(pk=self.product.pk).stock,
+            "balances": dict(Profile.objects.values_list("user__username", "balance")),
+            "holding": Holding.objects.get(user=self.user).quantity,
+            "tx": sorted(Transaction.objects.values_list("type", "quantity", "fee_amount")),
+        })
+        revenue = Transaction.objects.get(type=Transaction.SELL_REVENUE)
+        self.assertEqual(revenue.original_tx.type, Transaction.BUY)
+
+    def test_concurrent_orders_share_one_batch(self):
+        import threading
+
+        from trade.batching import Order, OrderBatcher
+
+        executed = []
+
+        def execute(product_id, orders):
+            executed.append(len(orders))
+            return [None if o.quantity < 5 else ValidationError("нет") for o in orders]
+
+        batcher = OrderBatcher(execute)
+        errors = []
+
+        def place(qty):
+            try:
+                batcher.submit(Order(Transaction.BUY, 1, self.product.id, qty))
+            except ValidationError as e:
+                errors.append(e.message)
+
+        with self.settings(TRADE_BATCH_WINDOW_MS=200, TRADE_BATCH_MAX=4):
+            threads = [threading.Thread(target=place, args=(q,)) for q in (1, 2, 3, 9)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(executed, [4])
+        self.assertEqual(errors, ["нет"])
+
+    def test_cart_checkout_buys_everything_in_one_transaction(self):
+        from trade.services import checkout
+
+        author = get_user_model().objects.create_user("author", password="x")
+        cat = self.product.category
+        goods = [
+            Product.objects.create(title=f"Item {i}", slug=f"item-{i}", category=cat, price=Decimal("10.00"),
+                                   stock=5, is_approved=True, created_by=author if i % 2 else None)
+            for i in range(10)
+        ]
+        Holding.objects.create(user=self.user, product=goods[0], quantity=1)
+
+        # не хватает одного товара — не куплено ничего
+        with self.assertRaises(ValidationError):
+            checkout(self.user, {goods[0].id: 1, goods[1].id: 6})
+        self.assertEqual(Transaction.objects.count(), 0)
+
+        # блокировки товаров, профилей и владений, bulk-записи, сделки, доходы и события ленты —
+        # не зависит от числа позиций
+        with self.assertNumQueries(12):
+            checkout(self.user, {p.id: 2 for p in goods})
+        self.assertEqual(Profile.objects.get(user=self.user).balance, Decimal("800.00"))
+        fee = (Decimal("20.00") * Decimal(str(services.FEE_RATE))).quantize(Decimal("0.01"))
+        self.assertEqual(Profile.objects.get(user=author).balance, Decimal("1100.00") - 5 * fee)
+        self.assertEqual(Holding.objects.get(user=self.user, product=goods[0]).quantity, 3)
+        self.assertEqual(set(Product.objects.filter(id__in=[p.id for p in goods]).values_list("stock", flat=True)), {3})
+        self.assertEqual(Transaction.objects.filter(type=Transaction.SELL_REVENUE, original_tx__isnull=False).count(), 5)
+
+        self.client.login(username="u", password="x")
+        self.client.post(f"/trade/cart/add/{goods[2].id}/", {"quantity": 1})
+        self.assertContains(self.client.get("/trade/cart/"), "Item 2")
+        self.client.post("/trade/cart/", {"checkout": "1"})
+        self.assertEqual(Holding.objects.get(user=self.user, product=goods[2]).quantity, 3)
+        self.assertNotIn("cart", self.client.session)
+
+    def test_optimistic_engine_matches_locking(self):
+        from unittest import mock
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from trade import optimistic
+
+        U = get_user_model()
+        author = U.objects.create_user("author", password="x")
+        self.product.created_by = author
+        self.product.is_approved = True
+        self.product.save()
+
+        def run(engine):
+            Transaction.objects.all().delete()
+            Holding.objects.all().delete()
+            Profile.objects.filter(user=self.user).update(balance=Decimal("900.00"))
+            Profile.objects.filter(user=author).update(balance=Decimal("1000.00"))
+            Product.objects.filter(id=self.product.id).update(stock=10, price=Decimal("100.00"))
+            with CaptureQueriesContext(connection) as queries:
+                engine.buy_product(self.user, self.product.id, 3)
+                engine.sell_product(self.user, self.product.id, 1)
+            for qty in (8, 11):  # не хватит монет / товара
+                with self.assertRaises(ValidationError):
+                    engine.buy_product(self.user, self.product.id, qty)
+            with self.assertRaises((ValidationError, Holding.DoesNotExist)):
+                engine.sell_product(author, self.product.id, 1)
+            state = {
+                "balances": list(Profile.objects.filter(user__in=[self.user, author])
+                                 .order_by("user_id").values_list("balance", flat=True)),
+                "stock": Product.objects.get(id=self.product.id).stock,
+                "holding": Holding.objects.get(user=self.user).quantity,
+                "tx": sorted(Transaction.objects.values_list("type", "quantity", "price_at_trade", "fee_amount")),
+            }
+            return state, len(queries)
+
+        locking, locking_queries = run(services)
+        optimistic_state, optimistic_queries = run(optimistic)
+        self.assertEqual(optimistic_state, locking)
+        fee = (Decimal("300.00") * Decimal(str(services.FEE_RATE))).quantize(Decimal("0.01"))
+        self.assertEqual(locking["balances"][1], Decimal("1300.00") - fee)
+        self.assertLess(optimistic_queries, locking_queries)
+
+        # цена сменилась между чтением и записью — попытка повторяется с новой ценой
+        stale = optimistic._read_product(self.product.id)
+        Product.objects.filter(id=self.product.id).update(price=Decimal("50.00"))
+        real = optimistic._read_product
+        with mock.patch.object(optimistic, "_read_product", side_effect=[stale, real(self.product.id)]):
+            optimistic.buy_product(self.user, self.product.id, 1)
+        self.assertEqual(Transaction.objects.filter(type=Transaction.BUY).latest("id").price_at_trade,
+                         Decimal("50.00"))
+
+        # взаимная блокировка / занятая база — тоже повтор, а не 500
+        from django.db import OperationalError
+
+        attempts = mock.Mock(side_effect=[OperationalError("database is locked"), None])
+        optimistic._with_retries(attempts)
+        self.assertEqual(attempts.call_count, 2)
+
+    def test_repeated_trade_post_with_same_key_runs_once(self):
+        from django.core.management import call_command
+
+        from trade.models import IdempotencyKey
+
+        Product.objects.filter(id=self.product.id).update(is_approved=True)
+        self.client.login(username="u", password="x")
+        page = self.client.get(self.product.get_absolute_url())
+        # ключ ставит скрипт при показе страницы: в HTML (и в ответах 304) его нет
+        self.assertContains(page, 'name="idempotency_key" value=""', count=2)
+
+        url = f"/trade/buy/{self.product.id}/"
+        for _ in range(2):  # двойной клик
+            r = self.client.post(url, {"quantity": 2, "idempotency_key": "k1"}, follow=True)
+            self.assertContains(r, "Куплено: Юла × 2")
+        self.assertEqual(Transaction.objects.filter(type=Transaction.BUY).count(), 1)
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 8)
+
+        # повтор читает только ключ — ни блокировок, ни записи товара и профиля
+        with self.assertNumQueries(4):  # сессия, пользователь, товар и сохранённый результат
+            self.client.post(url, {"quantity": 2}, HTTP_IDEMPOTENCY_KEY="k1")
+        self.client.post(f"/trade/sell/{self.product.id}/", {"quantity": 1, "idempotency_key": "k1"})
+        r = self.client.post(url, {"quantity": 3, "idempotency_key": "k1"}, follow=True)
+        self.assertContains(r, "уже использован")  # другие данные — не повтор
+        self.assertEqual(Holding.objects.get(user=self.user).quantity, 2)
+        self.client.post(url, {"quantity": 1}, HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(Holding.objects.get(user=self.user).quantity, 3)
+
+        IdempotencyKey.objects.filter(key="k1").update(created_at="2000-01-01T00:00Z")
+        call_command("prune_idempotency_keys", stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["k2"])
+
+
+class TransactionExportTests(TestCase):
+    """Набор «transactions» в /exports/ (trade/exports.py)."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("u", password="x")
+        toys = Category.objects.create(name="Игрушки", slug="toy")
+        self.books = Category.objects.create(name="Книги", slug="books")
+        self.product = Product.objects.create(title="Юла", slug="yula", category=toys, price=Decimal("100.00"), stock=10)
+
+    def test_streaming_csv_gzip_filtered_by_category(self):
+        book = Product.objects.create(title="Книга", slug="book", category=self.books, price=Decimal("5.00"))
+        buy_product(self.user, self.product.id, 2)
+        buy_product(self.user, book.id, 1)
+
+        url = "/exports/transactions/?category=toy&gzip=1"
+        self.assertEqual(self.client.get(url).status_code, 302)  # только staff
+        get_user_model().objects.create_user("boss", password="x", is_staff=True)
+        self.client.login(username="boss", password="x")
+
+        r = self.client.get(url)
+        self.assertTrue(r.streaming)
+        self.assertIn("transactions-", r["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(b"".join(r.streaming_content)).decode())))
+        self.assertEqual([(row["product"], row["quantity"]) for row in rows], [("yula", "2")])
+        self.assertEqual(self.client.get("/exports/transactions/?format=xml").status_code, 400)
+        self.assertEqual(self.client.get("/exports/transactions/?from=2026-13-01").status_code, 400)
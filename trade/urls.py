@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import buy_view, sell_view
-from .views import transactions_view
+from .views import transactions_view, cart_add_view, cart_view
 
 
 app_name = "trade"
@@ -8,4 +8,6 @@ urlpatterns = [
     path("buy/<int:product_id>/", buy_view, name="buy"),
     path("sell/<int:product_id>/", sell_view, name="sell"),
     path("history/", transactions_view, name="history"),
+    path("cart/", cart_view, name="cart"),
+    path("cart/add/<int:product_id>/", cart_add_view, name="cart_add"),
 ]
@@ -1,21 +1,39 @@
 # trade/views.py
+import hashlib
+from decimal import Decimal
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
-from django.shortcuts import redirect, get_object_or_404
+from django.shortcuts import redirect, get_object_or_404, render
 from django.views.generic import ListView
 
 from catalog.models import Product
+from mini_market.pagination import CursorPaginationMixin
 from .forms import BuyForm  # добавь SellForm в forms.py по аналогии с BuyForm
 from .models import Transaction
-from .services import buy_product, sell_product
+from .batching import place_order
+from .cart import Cart
+from .idempotency import run_once
+from .services import checkout
+
+
+def _trade(side: str, user, product, qty: int, done: str):
+    """Сделка для run_once: (уровень, текст) для messages."""
+    try:
+        place_order(side, user, product.id, qty)
+    except ValidationError as e:
+        return messages.ERROR, e.message
+    return messages.SUCCESS, f"{done}: {product.title} × {qty}"
 
 
 @login_required
 def buy_view(request, product_id: int):
     """
-    POST: покупка товара (qty из BuyForm), вся логика и транзакции — в services.buy_product.
+    POST: покупка товара (qty из BuyForm), вся логика и транзакции — в services.buy_product
+    (или пачкой через batching при TRADE_BATCHING). Повтор с тем же ключом запроса
+    (idempotency) получает прежний результат без второй покупки.
     GET: редиректим на карточку товара.
     """
     product = get_object_or_404(Product, id=product_id)
@@ -23,12 +41,10 @@ def buy_view(request, product_id: int):
         form = BuyForm(request.POST)
         if form.is_valid():
             qty = form.cleaned_data["quantity"]
-            try:
-                buy_product(request.user, product.id, qty)
-            except ValidationError as e:
-                messages.error(request, e.message)
-            else:
-                messages.success(request, f"Куплено: {product.title} × {qty}")
+            level, text = run_once(request, f"buy:{product.id}:{qty}", lambda: _trade(
+                Transaction.BUY, request.user, product, qty, "Куплено"
+            ))
+            messages.add_message(request, level, text)
         else:
             messages.error(request, "Некорректное количество.")
         return redirect(product.get_absolute_url())
@@ -40,7 +56,8 @@ def buy_view(request, product_id: int):
 @login_required
 def sell_view(request, product_id: int):
     """
-    POST: продажа товара (qty из формы), бизнес-логика в services.sell_product.
+    POST: продажа товара (qty из формы), бизнес-логика в services.sell_product;
+    повтор с тем же ключом запроса не продаёт второй раз.
     GET: редирект на карточку товара.
     """
     product = get_object_or_404(Product, id=product_id)
@@ -58,32 +75,84 @@ def sell_view(request, product_id: int):
         form = BuyForm(request.POST)
         if form.is_valid():
             qty = form.cleaned_data["quantity"]
-            try:
-                sell_product(request.user, product.id, qty)
-            except ValidationError as e:
-                messages.error(request, e.message)
-            else:
-                messages.success(request, f"Продано: {product.title} × {qty}")
+            level, text = run_once(request, f"sell:{product.id}:{qty}", lambda: _trade(
+                Transaction.SELL, request.user, product, qty, "Продано"
+            ))
+            messages.add_message(request, level, text)
         else:
             messages.error(request, "Некорректное количество.")
 
     return redirect(product.get_absolute_url())
 
 
-class TransactionsView(LoginRequiredMixin, ListView):
+@login_required
+def cart_add_view(request, product_id: int):
+    """POST: положить товар в корзину (qty из BuyForm)."""
+    product = get_object_or_404(Product.objects.visible_to(request.user), id=product_id)
+    if request.method == "POST":
+        form = BuyForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "Некорректное количество.")
+        elif Cart(request.session).add(product.id, form.cleaned_data["quantity"]):
+            messages.success(request, f"В корзине: {product.title}")
+        else:
+            messages.error(request, "В корзине слишком много разных товаров.")
+    return redirect(product.get_absolute_url())
+
+
+@login_required
+def cart_view(request):
+    """
+    GET: корзина с ценами и итогом. POST: изменить количества (qty_<id>, 0 — убрать)
+    или оплатить всё разом (checkout=1) — services.checkout, один раз на ключ запроса.
+    """
+    cart = Cart(request.session)
+    if request.method == "POST":
+        for pid in list(cart.items):
+            raw = request.POST.get(f"qty_{pid}")
+            if raw is not None and raw.strip().isdigit():
+                cart.set(pid, int(raw))
+        if request.POST.get("checkout"):
+            def pay():
+                try:
+                    bought = checkout(request.user, cart.items)
+                except ValidationError as e:
+                    return messages.ERROR, e.message
+                cart.clear()
+                return messages.SUCCESS, f"Оплачено позиций: {len(bought)}."
+
+            items = ",".join(f"{pid}x{qty}" for pid, qty in sorted(cart.items.items()))
+            scope = "checkout:" + hashlib.sha1(items.encode()).hexdigest()[:16]
+            level, text = run_once(request, scope, pay)
+            messages.add_message(request, level, text)
+            if level == messages.SUCCESS:
+                return redirect("portfolio")
+        return redirect("trade:cart")
+
+    products = Product.objects.filter(id__in=cart.items).select_related("category").order_by("title", "id")
+    lines = [{"product": p, "quantity": cart.items[p.id], "total": p.price * cart.items[p.id]} for p in products]
+    return render(request, "trade/cart.html", {
+        "lines": lines,
+        "total": sum((line["total"] for line in lines), Decimal("0.00")),
+    })
+
+
+class TransactionsView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """
     История операций текущего пользователя.
     """
     template_name = "trade/transactions.html"
     model = Transaction
     paginate_by = 20
+    cursor_ordering = ("-created_at", "-id")
+    cursor_count_cap = 1000  # «Найдено: 1000+» вместо COUNT(*) по всей истории
 
     def get_queryset(self):
         return (
             Transaction.objects
             .filter(user=self.request.user)
             .select_related("product")
-            .order_by("-created_at")
+            .order_by("-created_at", "-id")
         )
 
 
@@ -14,6 +14,6 @@ class ProfileAdmin(admin.ModelAdmin):
     def avatar_preview(self, obj):
         if obj.avatar:
             return format_html('<img src="{}" style="height:48px;width:48px;'
-                               'object-fit:cover;border-radius:50%;">', obj.avatar.url)
+                               'object-fit:cover;border-radius:50%;">', obj.avatar_src(48))
         return "—"
     avatar_preview.short_description = "Превью"
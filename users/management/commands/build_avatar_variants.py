@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Profile, build_avatar_variants
+
+
+class Command(BaseCommand):
+    help = "Собирает уменьшенные копии аватарок, у которых их ещё нет."
+
+    def handle(self, *args, **opts):
+        ids = Profile.objects.exclude(avatar="").exclude(avatar__isnull=True).values_list("id", flat=True)
+        built = checked = 0
+        for pk in ids.order_by("id").iterator(chunk_size=500):
+            checked += 1
+            built += build_avatar_variants(pk)
+        self.stdout.write(self.style.SUCCESS(f"Готово: собрано {built} из {checked} аватарок."))
@@ -1,9 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.functional import cached_property
 from decimal import Decimal
-from io import BytesIO
-from PIL import Image
-from django.core.files.base import ContentFile
+
+from mini_market.background import run_after_commit
+from mini_market.images import build_variants, pick_variant
 
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
@@ -17,43 +19,75 @@ class Profile(models.Model):
     calc_url = models.URLField("Ссылка на практическую работа по теме 'Калькулятор'", blank=True, default="")
     robot_url = models.URLField("Ссылка на практическую работа по теме 'Среда программирования'", blank=True, default="")
     info_search_url = models.URLField("Ссылка на задание 'Поиск информации'", blank=True, default="")
+    # уменьшенные копии avatar (AVATAR_SIZES), собираются в фоне после смены файла
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
-
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        obj._loaded_avatar = obj.__dict__.get("avatar")
+        return obj
 
     def __str__(self):
         return f"Profile({self.user.username})"
 
+    def avatar_src(self, size: int = 96) -> str:
+        """URL аватарки около size px: готовый вариант, пока его нет — оригинал."""
+        if not self.avatar:
+            return "/static/img/avatar_default.png"  # положи такую картинку в static
+        variant = pick_variant(self.avatar_variants, self.avatar.name, size)
+        return default_storage.url(variant["jpeg"]) if variant else self.avatar.url
+
     @property
     def avatar_url(self):
         # вернёт путь к аватарке или дефолтную иконку из static
-        if self.avatar:
-            return self.avatar.url
-        return "/static/img/avatar_default.png"  # положи такую картинку в static
+        return self.avatar_src()
+
+    @cached_property
+    def group_names(self) -> frozenset:
+        # один запрос на все проверки can_see_task_* в шаблоне
+        return frozenset(self.user.groups.values_list("name", flat=True))
 
     @property
     def can_see_task_4(self):
-        return self.user.groups.filter(name__in=['4A', '4B']).exists()
+        return bool(self.group_names & {'4A', '4B'})
 
     @property
     def can_see_task_5(self):
-        return self.user.groups.filter(name__in=['5A']).exists()
+        return '5A' in self.group_names
 
     @property
     def can_see_task_6(self):
-        return self.user.groups.filter(name__in=['6A']).exists()
+        return '6A' in self.group_names
 
-    # лёгкое авто-сжатие (чтобы не грузили огромные фото при админ-загрузке)
+    # картинку не трогаем в самом save: сделки сохраняют профиль с update_fields=["balance"]
+    # внутри заблокированной транзакции. Варианты собираются в фоне и только при смене файла.
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        if self.avatar:
-            try:
-                img = Image.open(self.avatar).convert("RGB")
-                img.thumbnail((256, 256))
-                buf = BytesIO()
-                img.save(buf, format="JPEG", quality=85)
-                self.avatar.save(f"{self.user.username}_avatar.jpg",
-                                 ContentFile(buf.getvalue()), save=False)
-                super().save(update_fields=["avatar"])
-            except Exception:
-                pass
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "avatar" not in update_fields:
+            return
+        name = self.avatar.name if self.avatar else ""
+        if name != (getattr(self, "_loaded_avatar", None) or ""):
+            if name:
+                run_after_commit(build_avatar_variants, self.pk)
+            elif self.avatar_variants:
+                Profile.objects.filter(pk=self.pk).update(avatar_variants={})
+                self.avatar_variants = {}
+        self._loaded_avatar = name
+
 
+def build_avatar_variants(profile_id: int) -> bool:
+    """Собирает варианты аватарки; одинаковый файл даёт те же имена (хэш содержимого)."""
+    profile = Profile.objects.filter(pk=profile_id).only("id", "avatar", "avatar_variants").first()
+    if profile is None or not profile.avatar:
+        return False
+    if profile.avatar_variants.get("source") == profile.avatar.name:
+        return False
+    try:
+        variants = build_variants(profile.avatar, "avatars", settings.AVATAR_SIZES)
+    except (OSError, ValueError):
+        return False  # не картинка или файл пропал — показываем оригинал
+    # аватарку могли заменить, пока считали, — тогда описание уже не про неё
+    return bool(Profile.objects.filter(pk=profile_id, avatar=profile.avatar.name)
+                .update(avatar_variants=variants))
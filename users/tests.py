@@ -1,3 +1,42 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from PIL import Image
+
+from users.models import Profile
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media, BACKGROUND_TASKS_SYNC=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = get_user_model().objects.create_user("ann", password="x")
+
+    def _jpeg(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 400), "blue").save(buf, format="JPEG")
+        return SimpleUploadedFile("me.jpg", buf.getvalue(), content_type="image/jpeg")
+
+    def test_variants_built_only_when_avatar_changes(self):
+        profile = self.user.profile
+        profile.avatar = self._jpeg()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            profile.save()
+        self.assertEqual(len(callbacks), 1)
+        profile = Profile.objects.get(pk=profile.pk)
+        self.assertEqual(sorted(profile.avatar_variants["sizes"]), ["192", "48", "96"])
+        self.assertTrue(profile.avatar_url.endswith("-96.jpg"))
 
-# Create your tests here.
+        # сделки и прочие сохранения без смены файла картинку не трогают
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            profile.save(update_fields=["balance"])
+        with self.captureOnCommitCallbacks() as more:
+            profile.save()
+        self.assertEqual(callbacks + more, [])
@@ -3,7 +3,7 @@ from decimal import Decimal
 
 from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import F, Sum
+from django.db.models import F
 from django.shortcuts import redirect
 from django.views.generic import TemplateView
 
@@ -17,16 +17,14 @@ class PortfolioView(LoginRequiredMixin, TemplateView):
         ctx = super().get_context_data(**kwargs)
         u = self.request.user
 
-        # Позиции пользователя: подтягиваем товар одним запросом
-        holdings = (
+        # Позиции пользователя: товар и его категория — одним запросом, итог — по уже загруженным строкам
+        holdings = list(
             u.holdings
-             .select_related("product")
+             .select_related("product__category")
              .annotate(position_value=F("quantity") * F("product__price"))
+             .order_by("id")
         )
-        total_positions = (
-            holdings.aggregate(total=Sum("position_value"))["total"]
-            or Decimal("0.00")
-        )
+        total_positions = sum((h.position_value for h in holdings), Decimal("0.00"))
 
         # Правая колонка: товары, созданные пользователем (новые сверху)
         my_products = (